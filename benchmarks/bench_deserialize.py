@@ -0,0 +1,51 @@
+"""Compare `deserialize_toggl` against `decode_time_entry` on a synthetic page of time entries.
+
+Run with: python -m benchmarks.bench_deserialize [ENTRIES]
+"""
+import sys
+import timeit
+import tracemalloc
+
+from wwe.entry import decode_time_entry
+from wwe.toggl_api import deserialize_toggl
+
+
+def make_page(size: int) -> list:
+    """Return a page of time entries as returned by Toggl."""
+    return [{"at": "2018-05-23T15:04:45+00:00",
+             "billable": False,
+             "description": f"Task {i}",
+             "duration": 615,
+             "duronly": False,
+             "guid": "e6a5763ae8e13e4dac9afd460e7a085d",
+             "id": 880947808 + i,
+             "pid": 97990658,
+             "start": "2018-05-23T14:54:29+00:00",
+             "stop": "2018-05-23T15:04:44+00:00",
+             "tags": ["software imaging"],
+             "uid": 2626092,
+             "wid": 1819588} for i in range(size)]
+
+
+def measure(name: str, decode, page: list) -> None:
+    """Print the time and memory taken per entry to decode a page."""
+    repeat = 5
+    seconds = min(timeit.repeat(lambda: decode(page), number=1, repeat=repeat))
+    tracemalloc.start()
+    result = decode(page)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    print(f'{name:>20}: {seconds * 1e6 / len(page):8.2f} us/entry {size / len(page):8.0f} B/entry')
+
+
+def main(size: int = 10000) -> None:
+    """Run benchmark."""
+    page = make_page(size)
+    print(f'Decoding {size} time entries...')
+    measure('deserialize_toggl', deserialize_toggl, page)
+    measure('decode_time_entry', lambda p: [decode_time_entry(e) for e in p], page)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
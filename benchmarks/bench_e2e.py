@@ -0,0 +1,228 @@
+"""Measure `wwe` end to end against a local stand-in of Toggl and gov.uk, so no network is needed.
+
+For every history size, the balance is computed three times sharing one cache folder:
+
+- cold: empty cache, the whole history is downloaded
+- warm: the store is up to date, only the last days are downloaded again
+- fresh: ``--max-age`` is set, nothing is downloaded
+
+and the wall time, the number of requests (in total and for time entries), the bytes received, the peak memory
+allocated by Python and the time spent in every phase are reported.
+
+Run with: python -m benchmarks.bench_e2e [--sizes 1000 10000 ...] [--latency SECONDS] [--json PATH]
+"""
+import argparse
+import collections
+import contextlib
+import functools
+import importlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+
+from benchmarks.standin import CLIENT, TOKEN, TOGGL_PAGE_SIZE
+
+SIZES = (1000, 10000, 100000)
+SCENARIOS = (('cold', []), ('warm', []), ('fresh', ['--max-age', '3600']))
+ENTRIES_PATH = '/api/v8/time_entries'
+# (module, class or None, function, phase) of the functions whose time is reported
+PHASES = (
+    ('wwe.cli', None, 'get_project_ids', 'client projects'),
+    ('wwe.store', 'EntryStore', 'sync', 'sync'),
+    ('wwe.toggl_async', None, 'prefetch', 'sync'),  # with --asyncio, also downloads client projects and holidays
+    ('wwe.store', 'EntryStore', 'entries', 'read store'),
+    ('wwe.cli', None, 'get_holiday_index', 'holidays'),
+)
+
+
+@contextlib.contextmanager
+def standin_server(size: int, page_size: int, latency: float):
+    """Run the stand-in server in another process, so it does not compete with `wwe` for the GIL."""
+    command = [sys.executable, '-m', 'benchmarks.standin', '--size', str(size), '--page-size', str(page_size),
+               '--latency', str(latency)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    try:
+        yield process.stdout.readline().strip()
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def server_stats(url: str) -> dict:
+    """Return the request counters of the stand-in server."""
+    with urllib.request.urlopen(f'{url}/_stats') as response:
+        return json.load(response)
+
+
+def write_config(home: str) -> None:
+    """Write a configuration file for the client of the synthetic history."""
+    config_dir = os.path.join(home, '.config', 'wwe')
+    os.makedirs(config_dir, exist_ok=True)
+    config = {
+        'toggl_token': TOKEN,
+        'personal_holidays': [['2018-06-08', 0.5], ['2018-06-20', 1]],
+        'company_bonus_days': [['2018-12-24', 1], ['2018-12-31', 1]],
+        'client': {'name': CLIENT['name'], 'start_date': '2018-02-05'},
+        'working_day_hours': 7.5,
+    }
+    with open(os.path.join(config_dir, 'config.json'), 'w') as fd:
+        json.dump(config, fd)
+
+
+def timed(func, phase: str, timings: dict):
+    """Wrap a function to add the time spent in it, and in iterating its result if it is a generator."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        timings[phase] += time.perf_counter() - start
+        if hasattr(result, '__next__') and hasattr(result, 'send'):
+            return timed_iteration(result, phase, timings)
+        return result
+    return wrapper
+
+
+def timed_iteration(iterator, phase: str, timings: dict):
+    """Yield the items of an iterator, adding the time spent producing them."""
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            timings[phase] += time.perf_counter() - start
+        yield item
+
+
+@contextlib.contextmanager
+def patched(url: str, home: str, cache_dir: str, rate: float, page_size: int, timings: dict):
+    """Point `wwe` to the stand-in server and the benchmark folders, and time its phases."""
+    import wwe.gov
+    import wwe.pagination
+    import wwe.toggl_api
+    import wwe.toggl_async
+
+    targets = [
+        (wwe.toggl_api, 'TOGGL_API_URL', f'{url}/api/v8'),
+        (wwe.toggl_api, 'TOGGL_REPORTS_API_URL', f'{url}/reports/api/v2'),
+        (wwe.toggl_api, 'TOGGL_REQUESTS_PER_SECOND', rate),
+        (wwe.toggl_async, 'TOGGL_REQUESTS_PER_SECOND', rate),
+        (wwe.gov, 'UKGOV_BANK_HOLIDAYS_URL', f'{url}/bank-holidays.json'),
+        # a page shorter than this is taken as the last one
+        (wwe.pagination, 'TOGGL_PAGE_SIZE', page_size),
+    ]
+    for module_name, class_name, attribute, phase in PHASES:
+        owner = importlib.import_module(module_name)
+        if class_name is not None:
+            owner = getattr(owner, class_name)
+        targets.append((owner, attribute, timed(getattr(owner, attribute), phase, timings)))
+
+    originals = [(owner, attribute, getattr(owner, attribute)) for owner, attribute, _ in targets]
+    environ = {name: os.environ.get(name) for name in ('HOME', 'WWE_CACHE_DIR', 'WWE_MAX_AGE')}
+    try:
+        for owner, attribute, value in targets:
+            setattr(owner, attribute, value)
+        os.environ.update(HOME=home, WWE_CACHE_DIR=cache_dir)
+        os.environ.pop('WWE_MAX_AGE', None)
+        yield
+    finally:
+        for owner, attribute, value in originals:
+            setattr(owner, attribute, value)
+        for name, value in environ.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def run_main(arguments: list, trace_memory: bool) -> tuple:
+    """Run `wwe` in this process and return (wall time, peak traced memory, output)."""
+    from wwe.cli import main
+
+    output = io.StringIO()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(output):
+            main.main(arguments, prog_name='wwe', standalone_mode=False)
+    finally:
+        wall = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        tracemalloc.stop()
+    return wall, peak, output.getvalue()
+
+
+def run_size(size: int, args: argparse.Namespace) -> list:
+    """Run every scenario against a history of `size` entries and return one result per scenario."""
+    results = []
+    with standin_server(size, page_size=args.page_size, latency=args.latency) as url, \
+            tempfile.TemporaryDirectory() as home:
+        write_config(home)
+        cache_dir = os.path.join(home, 'cache')
+        for scenario, options in SCENARIOS:
+            timings = collections.defaultdict(float)
+            before = server_stats(url)
+            with patched(url, home, cache_dir, rate=args.rate, page_size=args.page_size, timings=timings):
+                wall, peak, output = run_main([*args.options, *options], trace_memory=not args.no_memory)
+            after = server_stats(url)
+            phases = {phase: round(timings[phase], 4) for *_, phase in PHASES}
+            phases['other'] = round(max(0.0, wall - sum(timings.values())), 4)
+            entry_requests = [stats['requests_by_path'].get(ENTRIES_PATH, 0) for stats in (before, after)]
+            results.append({
+                'size': size,
+                'scenario': scenario,
+                'wall': round(wall, 4),
+                'requests': after['requests'] - before['requests'],
+                'entry_requests': entry_requests[1] - entry_requests[0],
+                'bytes': after['bytes_sent'] - before['bytes_sent'],
+                'peak_memory': peak,
+                'phases': phases,
+                'output': output.strip(),
+            })
+    return results
+
+
+def print_results(results: list) -> None:
+    """Print results as a table."""
+    phase_names = list(dict.fromkeys(phase for *_, phase in PHASES)) + ['other']
+    header = (f'{"entries":>8} {"scenario":<8} {"wall s":>8} {"requests":>8} {"entry rq":>8} {"MB recv":>8} '
+              f'{"peak MiB":>8}')
+    print(header + ''.join(f' {name[:12]:>12}' for name in phase_names))
+    for result in results:
+        peak = f'{result["peak_memory"] / 2 ** 20:8.1f}' if result['peak_memory'] is not None else f'{"-":>8}'
+        row = (f'{result["size"]:>8} {result["scenario"]:<8} {result["wall"]:8.3f} {result["requests"]:>8} '
+               f'{result["entry_requests"]:>8} {result["bytes"] / 1e6:8.2f} {peak}')
+        print(row + ''.join(f' {result["phases"][name]:12.3f}' for name in phase_names))
+
+
+def main() -> int:
+    """Run benchmark and return the exit code."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='history sizes to benchmark')
+    parser.add_argument('--page-size', type=int, default=TOGGL_PAGE_SIZE, help='time entries per response')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds the server waits before answering')
+    parser.add_argument('--rate', type=float, default=1e6,
+                        help='client side request rate limit, per second (Toggl asks for 1)')
+    parser.add_argument('--no-memory', action='store_true', help='do not trace memory, it slows Python down')
+    parser.add_argument('--json', metavar='PATH', help='also write the results as JSON')
+    parser.add_argument('options', nargs='*', help='extra wwe options, after --, e.g. -- --asyncio')
+    args = parser.parse_args()
+
+    results = [result for size in args.sizes for result in run_size(size, args)]
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as fd:
+            json.dump(results, fd, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
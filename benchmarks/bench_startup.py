@@ -0,0 +1,65 @@
+"""Measure how long `wwe` takes to start, and fail if it gets slower than a budget.
+
+Run with: python -m benchmarks.bench_startup [BUDGET_MS]
+"""
+import statistics
+import subprocess
+import sys
+import time
+
+RUNS = 10
+# Modules that must not be imported just to start the command line interface
+LAZY_MODULES = ('requests', 'urllib3', 'colorama', 'tzlocal')
+
+
+def run_python(code: str, *options: str) -> subprocess.CompletedProcess:
+    """Run a snippet in a fresh interpreter."""
+    return subprocess.run([sys.executable, *options, '-c', code], capture_output=True, text=True, check=True)
+
+
+def wall_time(code: str) -> float:
+    """Return the median time in seconds to run a snippet in a fresh interpreter."""
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        run_python(code)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def slowest_imports(code: str, top: int = 10) -> list:
+    """Return the (cumulative microseconds, module) pairs of the slowest imports of a snippet."""
+    stderr = run_python(code, '-X', 'importtime').stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = (field.strip() for field in line[len('import time:'):].split('|'))
+        rows.append((int(cumulative), module.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main(budget_ms: float = 150) -> int:
+    """Run benchmark and return the exit code."""
+    interpreter = wall_time('pass')
+    cli = wall_time('import wwe.cli')
+    overhead_ms = (cli - interpreter) * 1000
+    print(f'interpreter startup: {interpreter * 1000:7.1f} ms')
+    print(f'import wwe.cli:      {cli * 1000:7.1f} ms ({overhead_ms:+.1f} ms, budget {budget_ms} ms)')
+    print('slowest imports (cumulative):')
+    for cumulative, module in slowest_imports('import wwe.cli'):
+        print(f'  {cumulative / 1000:7.1f} ms  {module}')
+
+    loaded = run_python(f'import sys, wwe.cli; print(*(m for m in {LAZY_MODULES!r} if m in sys.modules))').stdout
+    failures = []
+    if loaded.strip():
+        failures.append(f'modules that should be imported lazily were imported: {loaded.strip()}')
+    if overhead_ms > budget_ms:
+        failures.append(f'importing wwe.cli takes {overhead_ms:.1f} ms, over the {budget_ms} ms budget')
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*(float(arg) for arg in sys.argv[1:])))
@@ -0,0 +1,280 @@
+"""Local stand-in for the Toggl v8 API and the gov.uk bank holidays feed, serving a synthetic history.
+
+Run with: python -m benchmarks.standin [--size N] [--page-size N] [--latency SECONDS] [--port PORT]
+"""
+import argparse
+import array
+import bisect
+import collections
+import datetime
+import hashlib
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+TOKEN = '870738agd54db0e63qfd943380ahbe8f'
+WORKSPACE_ID = 1819588
+CREATED_AT = '2018-02-06T08:10:31+00:00'
+WORKSPACE = {'id': WORKSPACE_ID, 'name': 'Benchmark workspace', 'at': '2016-12-28T02:26:24+00:00'}
+CLIENT = {'id': 38084455, 'name': 'ACME', 'wid': WORKSPACE_ID, 'at': CREATED_AT}
+OTHER_CLIENT = {'id': 38084456, 'name': 'Side project', 'wid': WORKSPACE_ID, 'at': CREATED_AT}
+PROJECTS = [
+    {'id': 97990398, 'name': 'Software Imaging', 'cid': CLIENT['id'], 'wid': WORKSPACE_ID, 'at': CREATED_AT},
+    {'id': 97990399, 'name': 'Meetings', 'cid': CLIENT['id'], 'wid': WORKSPACE_ID, 'at': CREATED_AT},
+    {'id': 97990400, 'name': 'Hobby', 'cid': OTHER_CLIENT['id'], 'wid': WORKSPACE_ID, 'at': CREATED_AT},
+]
+TOGGL_PAGE_SIZE = 1000
+MAX_DURATION = 4 * 3600  # seconds
+
+
+def format_timestamp(epoch: int) -> str:
+    """Return a UNIX timestamp in Toggl format."""
+    return datetime.datetime.fromtimestamp(epoch, tz=datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S+00:00')
+
+
+class SyntheticHistory:
+    """Evenly spread, non overlapping time entries of up to `MAX_DURATION` from `start` until `end`.
+
+    Entries are kept as arrays of integers and only turned into JSON when served, so that histories of millions of
+    entries fit in memory. The last entry is still running if `running` is set.
+    """
+
+    def __init__(self, size: int, start: datetime.datetime, end: datetime.datetime, running: bool = True):
+        """Generate history."""
+        self.size = size
+        first, last = int(start.timestamp()), int(end.timestamp())
+        interval = (last - first) // max(size, 1)
+        self.starts = array.array('q', (first + i * interval for i in range(size)))
+        self.durations = array.array('q', (max(1, min(interval * 4 // 5, MAX_DURATION)) for _ in range(size)))
+        if running and size:
+            self.durations[-1] = -self.starts[-1]
+
+    def entry(self, index: int) -> dict:
+        """Return the time entry at a given position, as returned by Toggl."""
+        start, duration = self.starts[index], self.durations[index]
+        entry = {
+            'id': 1000000000 + index,
+            'guid': hashlib.md5(str(index).encode()).hexdigest(),
+            'wid': WORKSPACE_ID,
+            'pid': PROJECTS[index % len(PROJECTS)]['id'],
+            'billable': False,
+            'start': format_timestamp(start),
+            'duration': duration,
+            'description': f'Task {index}',
+            'tags': ['benchmark'],
+            'duronly': False,
+            'at': format_timestamp(start + max(duration, 0)),
+            'uid': 2626092,
+        }
+        if duration >= 0:
+            entry['stop'] = format_timestamp(start + duration)
+        return entry
+
+    def page(self, start_date: datetime.datetime, end_date: Optional[datetime.datetime], page_size: int) -> list:
+        """Return the entries started within [start_date, end_date], at most `page_size` of them."""
+        lo = bisect.bisect_left(self.starts, int(start_date.timestamp()))
+        hi = len(self.starts) if end_date is None else bisect.bisect_right(self.starts, int(end_date.timestamp()))
+        return [self.entry(i) for i in range(lo, min(hi, lo + page_size))]
+
+    def changed_since(self, since: int) -> list:
+        """Return the entries created or updated after the `since` UNIX timestamp, the most recent first."""
+        entries = []
+        # entries do not overlap, so they were updated in the order they started
+        for index in reversed(range(self.size)):
+            if self.starts[index] + max(self.durations[index], 0) <= since:
+                break
+            entries.append(self.entry(index))
+        return entries
+
+    def current(self) -> Optional[dict]:
+        """Return the running time entry, if any."""
+        if self.size and self.durations[-1] < 0:
+            return self.entry(self.size - 1)
+        return None
+
+    def summary(self, since: datetime.date, until: datetime.date) -> dict:
+        """Return a reports API summary of the stopped entries started within [since, until] (UTC days).
+
+        Times are grouped by client, then by project, in milliseconds.
+        """
+        first = datetime.datetime.combine(since, datetime.time(), tzinfo=datetime.timezone.utc)
+        last = datetime.datetime.combine(until + datetime.timedelta(days=1), datetime.time(),
+                                         tzinfo=datetime.timezone.utc)
+        lo = bisect.bisect_left(self.starts, int(first.timestamp()))
+        hi = bisect.bisect_left(self.starts, int(last.timestamp()))
+        by_project = collections.Counter()
+        for i in range(lo, hi):
+            if self.durations[i] >= 0:
+                by_project[PROJECTS[i % len(PROJECTS)]['id']] += self.durations[i] * 1000
+        groups = []
+        for client in (CLIENT, OTHER_CLIENT):
+            items = [{'title': {'project': p['name']}, 'time': by_project[p['id']]}
+                     for p in PROJECTS if p.get('cid') == client['id'] and by_project[p['id']]]
+            if items:
+                groups.append({'id': client['id'], 'title': {'client': client['name']},
+                               'time': sum(item['time'] for item in items), 'items': items})
+        return {'total_grand': sum(by_project.values()), 'data': groups}
+
+
+def bank_holidays_feed(first_year: int = 2015, last_year: int = 2030) -> dict:
+    """Return a gov.uk like bank holidays feed."""
+    events = []
+    for year in range(first_year, last_year + 1):
+        for month, day, title in ((1, 1, 'New Year’s Day'), (12, 25, 'Christmas Day'), (12, 26, 'Boxing Day')):
+            events.append({'title': title, 'date': f'{year}-{month:02}-{day:02}', 'notes': '', 'bunting': True})
+    return {'england-and-wales': {'division': 'england-and-wales', 'events': events}}
+
+
+class StandInServer:
+    """HTTP server answering like Toggl (under /api/v8) and gov.uk (/bank-holidays.json).
+
+    Every request waits `latency` seconds before being answered, and is counted in `requests`, `bytes_sent` and
+    `requests_by_path`.
+    The counters are also served as JSON under /_stats, which is not counted.
+    """
+
+    def __init__(self, history: SyntheticHistory, page_size: int = TOGGL_PAGE_SIZE, latency: float = 0.0,
+                 port: int = 0):
+        """Create server listening on a local port, a free one by default."""
+        self.history = history
+        self.page_size = page_size
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_sent = 0
+        self.requests_by_path = collections.Counter()
+        self.holidays = json.dumps(bank_holidays_feed()).encode()
+        self.holidays_etag = '"' + hashlib.md5(self.holidays).hexdigest() + '"'
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        """Return the base URL of the server."""
+        host, port = self.httpd.server_address
+        return f'http://{host}:{port}'
+
+    def reset_counters(self) -> None:
+        """Reset the request and byte counters."""
+        with self.lock:
+            self.requests = 0
+            self.bytes_sent = 0
+            self.requests_by_path.clear()
+
+    def __enter__(self) -> 'StandInServer':
+        """Start serving in a background thread."""
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Stop serving."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def route(self, path: str, query: dict, headers) -> tuple:
+        """Return the (status, headers, body) answer to a GET request."""
+        if path == '/_stats':
+            with self.lock:
+                stats = {'requests': self.requests, 'bytes_sent': self.bytes_sent, 'entries': self.history.size,
+                         'requests_by_path': dict(self.requests_by_path)}
+            return 200, {'Content-Type': 'application/json'}, json.dumps(stats).encode()
+        if path == '/bank-holidays.json':
+            if headers.get('If-None-Match') == self.holidays_etag:
+                return 304, {'ETag': self.holidays_etag}, b''
+            return 200, {'ETag': self.holidays_etag}, self.holidays
+        if path == '/api/v8/workspaces':
+            data = [WORKSPACE]
+        elif path == f'/api/v8/workspaces/{WORKSPACE_ID}/clients':
+            data = [CLIENT, OTHER_CLIENT]
+        elif path == f'/api/v8/workspaces/{WORKSPACE_ID}/projects':
+            data = PROJECTS
+        elif path == '/api/v8/me':
+            data = {'since': int(time.time()), 'data': {'id': 2626092, 'default_wid': WORKSPACE_ID}}
+            if query.get('with_related_data') == 'true':
+                # only the objects changed after `since`, which never happens here but for recent time entries
+                since = int(query.get('since', 0))
+                for kind, objects in (('workspaces', [WORKSPACE]), ('clients', [CLIENT, OTHER_CLIENT]),
+                                      ('projects', PROJECTS)):
+                    data['data'][kind] = [o for o in objects
+                                          if datetime.datetime.fromisoformat(o['at']).timestamp() > since]
+                if 'since' in query:
+                    data['data']['time_entries'] = self.history.changed_since(since)
+        elif path == '/api/v8/time_entries':
+            start_date = datetime.datetime.fromisoformat(query['start_date'])
+            end_date = datetime.datetime.fromisoformat(query['end_date']) if query.get('end_date') else None
+            data = self.history.page(start_date, end_date, self.page_size)
+        elif path == '/api/v8/time_entries/current':
+            data = {'data': self.history.current()}
+        elif path == '/reports/api/v2/summary':
+            if int(query['workspace_id']) != WORKSPACE_ID:
+                return 403, {}, b'Forbidden'
+            since, until = (datetime.date.fromisoformat(query[key]) for key in ('since', 'until'))
+            if until - since > datetime.timedelta(days=366):
+                return 400, {}, b'Maximum date span (since..until) is 1 year'
+            data = self.history.summary(since, until)
+        else:
+            return 404, {}, b'Not found'
+        return 200, {'Content-Type': 'application/json'}, json.dumps(data).encode()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real endpoints
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                url = urllib.parse.urlsplit(self.path)
+                query = dict(urllib.parse.parse_qsl(url.query, keep_blank_values=True))
+                status, headers, body = server.route(url.path, query, self.headers)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                if url.path == '/_stats':
+                    return
+                with server.lock:
+                    server.requests += 1
+                    server.bytes_sent += len(body)
+                    server.requests_by_path[url.path] += 1
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def default_history(size: int) -> SyntheticHistory:
+    """Return a history of `size` entries from 2018-02-05 until an hour ago, the last one still running."""
+    start = datetime.datetime(2018, 2, 5, 9, tzinfo=datetime.timezone.utc)
+    end = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=1)
+    return SyntheticHistory(size, start=start, end=end)
+
+
+def main() -> None:
+    """Serve a synthetic history until interrupted, printing the base URL first."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=10000, help='number of time entries')
+    parser.add_argument('--page-size', type=int, default=TOGGL_PAGE_SIZE, help='time entries per response')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds to wait before answering')
+    parser.add_argument('--port', type=int, default=0, help='port to listen on, a free one by default')
+    args = parser.parse_args()
+    server = StandInServer(default_history(args.size), page_size=args.page_size, latency=args.latency, port=args.port)
+    print(server.url, flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
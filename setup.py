@@ -26,16 +26,21 @@ setup(
     classifiers=[
         'Development Status :: 1 - Planning',
         'License :: OSI Approved :: MIT License',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.7',
         # TODO: Look in pypi.org for other classifiers
     ],
     packages=find_packages(exclude=['tests']),
     license='MIT',
-    python_requires='>=3.6',
+    python_requires='>=3.7',
     include_package_data=True,
     zip_safe=False,
     keywords=['toggl'],     # TODO: Add relevant tags
     install_requires=install_requires,
+    extras_require={
+        'async': ['aiohttp'],  # AsyncTogglAPI and 'wwe --asyncio'
+        'numpy': ['numpy'],  # 'wwe export' to .npz
+        'export': ['pyarrow'],  # 'wwe export' to Parquet
+    },
     entry_points={
         "console_scripts": [
             'wwe=wwe.cli:main',
@@ -2,6 +2,8 @@ import datetime
 
 import pytest
 
+from wwe.entry import TimeEntry
+
 
 @pytest.fixture
 def mock_config():
@@ -28,3 +30,39 @@ def mock_entry():
             "tags": ["software imaging"],
             "uid": 2626092,
             "wid": 1819588}
+
+
+@pytest.fixture
+def make_entry():
+    """Return a factory of time entries lasting `seconds`, or still running if `seconds` is None."""
+    def make(id, start, seconds=600, pid=97990658, at=None, **fields):
+        if seconds is None:
+            stop, duration = None, datetime.timedelta(seconds=-start.timestamp())
+        else:
+            duration = datetime.timedelta(seconds=seconds)
+            stop = start + duration
+        fields.setdefault("wid", 1819588)
+        fields.setdefault("description", "General")
+        return TimeEntry(id=id, pid=pid, start=start, stop=stop, duration=duration, at=at or stop or start, **fields)
+
+    return make
+
+
+@pytest.fixture
+def standin(monkeypatch, tmp_path):
+    """Point `wwe` to a local stand-in of Toggl and gov.uk serving a small synthetic history."""
+    import wwe.gov
+    import wwe.toggl_api
+    from benchmarks.bench_e2e import write_config
+    from benchmarks.standin import default_history, StandInServer
+
+    write_config(str(tmp_path))
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.setenv('WWE_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.delenv('WWE_MAX_AGE', raising=False)
+    with StandInServer(default_history(300)) as server:
+        monkeypatch.setattr(wwe.toggl_api, 'TOGGL_API_URL', f'{server.url}/api/v8')
+        monkeypatch.setattr(wwe.toggl_api, 'TOGGL_REPORTS_API_URL', f'{server.url}/reports/api/v2')
+        monkeypatch.setattr(wwe.toggl_api, 'TOGGL_REQUESTS_PER_SECOND', 1e6)
+        monkeypatch.setattr(wwe.gov, 'UKGOV_BANK_HOLIDAYS_URL', f'{server.url}/bank-holidays.json')
+        yield server
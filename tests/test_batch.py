@@ -0,0 +1,56 @@
+import json
+
+from click.testing import CliRunner
+
+from wwe.batch import format_balance_table
+from wwe.cli import main
+from wwe.config import get_token_key
+
+
+def test_batch_computes_every_balance_and_fetches_bank_holidays_once(standin, tmp_path):
+    config_path = tmp_path / '.config' / 'wwe' / 'config.json'
+    other_path = tmp_path / 'other.json'
+    other_path.write_text(config_path.read_text().replace('"2018-02-05"', '"2019-01-07"'))
+
+    result = CliRunner().invoke(main, ['batch', str(config_path), str(other_path), '--token', 'another-token',
+                                       '--format', 'json'])
+    assert result.exit_code == 0, result.output
+    rows = json.loads(result.output)
+    token_label = f'token {get_token_key("another-token")}'
+    assert [row['member'] for row in rows] == [str(config_path), str(other_path), token_label]
+    assert all(row['client'] == 'ACME' for row in rows)
+    # the second config starts later, so less time was worked and less was due
+    assert rows[1]['worked_seconds'] < rows[0]['worked_seconds']
+    assert rows[1]['to_work_seconds'] < rows[0]['to_work_seconds']
+    assert rows[2]['worked_seconds'] == rows[0]['worked_seconds']
+    assert standin.requests_by_path['/bank-holidays.json'] == 1
+
+
+def test_batch_lists_every_client_of_a_member(standin, tmp_path):
+    config_path = tmp_path / '.config' / 'wwe' / 'config.json'
+    data = json.loads(config_path.read_text())
+    data['clients'] = [data.pop('client'), {'name': 'Side project', 'start_date': '2018-06-04'}]
+    config_path.write_text(json.dumps(data))
+
+    result = CliRunner().invoke(main, ['batch', str(config_path), '--format', 'json'])
+    assert result.exit_code == 0, result.output
+    rows = json.loads(result.output)
+    assert [row['client'] for row in rows] == ['ACME', 'Side project']
+    assert all(row['member'] == str(config_path) for row in rows)
+    assert all('error' not in row for row in rows)
+    # both clients share the token, so its catalog and store are synced once
+    assert standin.requests_by_path['/api/v8/me'] == 1
+    assert standin.requests_by_path['/api/v8/time_entries'] == 1
+
+
+def test_format_balance_table():
+    rows = [
+        {'member': 'alice.json', 'client': 'ACME', 'worked_seconds': 9000, 'to_work_seconds': 5400,
+         'balance_seconds': 3600, 'balance': '+1h'},
+        {'member': 'bob.json', 'client': 'ACME', 'error': 'ValueError: boom'},
+    ]
+    assert format_balance_table(rows).splitlines() == [
+        'member      client  worked h  to work h  balance',
+        'alice.json  ACME    2.50      1.50       +1h',
+        'bob.json    ACME                         ValueError: boom',
+    ]
@@ -0,0 +1,49 @@
+from click.testing import CliRunner
+from wwe.catalog import Catalog
+from wwe.cli import main
+
+
+def make_catalog():
+    catalog = Catalog()
+    catalog.apply_me({"since": 1000, "data": {
+        "workspaces": [{"id": 1, "name": "One", "at": "a"}],
+        "clients": [{"id": 10, "wid": 1, "name": "ACME", "at": "a"}, {"id": 11, "wid": 1, "name": "Other", "at": "a"}],
+        "projects": [{"id": 100, "wid": 1, "cid": 10, "name": "Imaging", "at": "a"},
+                     {"id": 101, "wid": 1, "cid": 11, "name": "Hobby", "at": "a"}],
+    }}, now=50)
+    return catalog
+
+
+def test_incremental_update_keeps_indexes_consistent():
+    catalog = make_catalog()
+    changed = catalog.apply_me({"since": 2000, "data": {
+        "clients": [{"id": 10, "wid": 1, "name": "ACME", "at": "a"},
+                    {"id": 11, "wid": 1, "name": "Other", "server_deleted_at": "b"}],
+        # moved from the deleted client to ACME, and renamed
+        "projects": [{"id": 101, "wid": 1, "cid": 10, "name": "Research", "at": "b"}],
+    }})
+    assert changed == 2
+    assert catalog.since == 2000
+    assert catalog.project_ids("ACME") == {100, 101}
+    assert catalog.client_ids("Other") == set()
+    assert catalog.project_ids_by_name == {"Imaging": {100}, "Research": {101}}
+    assert catalog.project_name(101) == "Research"
+
+
+def test_catalog_round_trips_through_json():
+    catalog = make_catalog()
+    loaded = Catalog.from_json(catalog.to_json())
+    assert loaded.client_project_ids() == {"ACME": {100}, "Other": {101}}
+    assert (loaded.since, loaded.synced_at) == (1000, 50)
+    assert loaded.is_stale(ttl=60, now=120)
+    assert not loaded.is_stale(ttl=60, now=100)
+    assert Catalog.from_json(dict(catalog.to_json(), version=0)) is None
+
+
+def test_report_shows_project_names(standin):
+    result = CliRunner().invoke(main, ['report', '--by', 'project'])
+    assert result.exit_code == 0, result.output
+    assert 'Software Imaging' in result.output
+    assert 'Hobby' not in result.output
+    assert standin.requests_by_path['/api/v8/me'] == 1
+    assert standin.requests_by_path['/api/v8/workspaces'] == 0
@@ -1,3 +1,4 @@
+import datetime
 from typing import Tuple
 
 import pytest
@@ -5,10 +6,6 @@ from click.testing import CliRunner
 from wwe.cli import main
 
 
-# TODO: mock Toggle API to return a known set of time entries
-# TODO: do a single end to end test
-
-
 @pytest.mark.integration
 def test_main():
     """Run the main command without arguments or flags."""
@@ -37,3 +34,75 @@ def test_end_date(arguments: Tuple[str]):
 
     assert result.exit_code == 0
     # TODO: assert output format
+
+
+def test_main_end_to_end(standin):
+    """Compute the balance from a synthetic history, then again from the local caches only."""
+    runner = CliRunner()
+    result = runner.invoke(main, [])
+    assert result.exit_code == 0, result.output
+    assert result.output.startswith('You need to work ') or result.output.startswith('You have worked ')
+    assert standin.requests > 0
+
+    standin.reset_counters()
+    cached = runner.invoke(main, ['--max-age', '3600'])
+    assert cached.exit_code == 0, cached.output
+    # the running entry keeps adding up, so only the sign of the balance is compared
+    assert cached.output.split(' ')[:2] == result.output.split(' ')[:2]
+    assert standin.requests == 0
+
+
+def test_summary_matches_detailed_balance(standin):
+    """Let the reports API total the history, and compare it with the sum of every entry."""
+    from wwe.cli import compute_balance, prepare_config
+
+    options = {'end': None, 'refresh': False, 'max_age': None, 'asyncio': False, 'tags': (), 'billable': None}
+    config = prepare_config(options)
+    to_work, worked = compute_balance(config, options)
+    standin.reset_counters()
+    summary_to_work, summary_worked = compute_balance(config, dict(options, summary=True))
+    assert summary_to_work - to_work < datetime.timedelta(seconds=5)
+    assert abs(summary_worked - worked) < datetime.timedelta(seconds=5)
+    assert standin.requests_by_path['/reports/api/v2/summary'] == datetime.date.today().year - 2018 + 1
+    assert standin.requests_by_path['/api/v8/time_entries'] == 0
+
+
+def test_summary_rejects_entry_filters():
+    result = CliRunner().invoke(main, ['--summary', '--tag', 'meeting'])
+    assert result.exit_code == 2
+    assert '--summary cannot be combined' in result.output
+
+
+def test_several_clients_are_computed_from_one_pass(standin, tmp_path):
+    """Compute the balance of two clients at once, like two runs with one client each."""
+    import json
+    from wwe.cli import compute_balance, compute_client_balances, prepare_config
+
+    options = {'end': datetime.datetime(2019, 1, 31), 'refresh': False, 'max_age': None, 'asyncio': False,
+               'tags': (), 'billable': None}
+    config_path = tmp_path / '.config' / 'wwe' / 'config.json'
+    data = json.loads(config_path.read_text())
+    data['clients'] = [data.pop('client'), {'name': 'Side project', 'start_date': '2018-06-04',
+                                            'working_day_hours': 2}]
+    config_path.write_text(json.dumps(data))
+
+    config = prepare_config(options)
+    balances = compute_client_balances(config, options)
+    assert [client.client.name for client, _, _ in balances] == ['ACME', 'Side project']
+    assert standin.requests_by_path['/api/v8/me'] == 1
+    entry_requests = standin.requests_by_path['/api/v8/time_entries']
+    for client, to_work, worked in balances:
+        assert compute_balance(client, dict(options, max_age=datetime.timedelta(hours=1))) == (to_work, worked)
+    assert standin.requests_by_path['/api/v8/time_entries'] == entry_requests
+
+    result = CliRunner().invoke(main, ['--max-age', '3600'])
+    assert result.exit_code == 0, result.output
+    assert [line.split(':')[0] for line in result.output.splitlines()] == ['ACME', 'Side project']
+
+    # commands working on one client need to be told which one
+    result = CliRunner().invoke(main, ['--max-age', '3600', 'report', '--by', 'project'])
+    assert result.exit_code == 2
+    assert 'choose one with --client: ACME, Side project' in result.output
+    result = CliRunner().invoke(main, ['--max-age', '3600', 'report', '--by', 'project', '--client', 'Side project'])
+    assert result.exit_code == 0, result.output
+    assert 'Hobby' in result.output and 'Meetings' not in result.output
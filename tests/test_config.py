@@ -0,0 +1,113 @@
+import datetime
+import json
+import os
+
+import pytest
+
+import wwe.config
+from wwe.config import ClientConfig, ConfigError, ConfigWatcher, load_config
+
+CONFIG = {
+    "toggl_token": "870738agd54db0e63qfd943380ahbe8f",
+    "personal_holidays": [["2018-06-08", 0.5], ["2018-06-20", 1]],
+    "company_bonus_days": [["2018-12-24", 1]],
+    "client": {"name": "ACME", "start_date": "2018-02-05"},
+    "working_day_hours": 7.5,
+}
+
+
+@pytest.fixture
+def config_path(tmp_path, monkeypatch):
+    monkeypatch.setenv('WWE_CACHE_DIR', str(tmp_path / 'cache'))
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps(CONFIG))
+    return str(path)
+
+
+def test_load_config_parses_dates(config_path):
+    config = load_config(config_path)
+    assert config.toggl_token == CONFIG['toggl_token']
+    assert config.client == ClientConfig(name='ACME', start_date=datetime.datetime(2018, 2, 5))
+    assert config.working_day_hours == 7.5
+    assert config.personal_holidays == (
+        (datetime.date(2018, 6, 8).toordinal(), 0.5),
+        (datetime.date(2018, 6, 20).toordinal(), 1.0),
+    )
+    assert config.company_bonus_days == ((datetime.date(2018, 12, 24).toordinal(), 1.0),)
+
+
+def test_load_config_uses_snapshot_until_file_changes(config_path, monkeypatch):
+    config = load_config(config_path)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('configuration parsed again')
+
+    with monkeypatch.context() as m:
+        m.setattr(wwe.config, 'compile_config', fail)
+        assert load_config(config_path) == config
+
+    # same size and possibly the same mtime, but a different hash
+    with open(config_path, 'w') as fd:
+        json.dump(dict(CONFIG, working_day_hours=8.5), fd)
+    assert load_config(config_path).working_day_hours == 8.5
+
+
+def test_config_watcher_reloads_modified_file(config_path):
+    watcher = ConfigWatcher(load_config(config_path), path=config_path)
+    assert not watcher.reload()
+
+    with open(config_path, 'w') as fd:
+        json.dump(dict(CONFIG, working_day_hours=8.5), fd)
+    os.utime(config_path, ns=(0, watcher.mtime_ns + 1))
+    assert watcher.reload()
+    assert watcher.config.working_day_hours == 8.5
+
+    with open(config_path, 'w') as fd:
+        json.dump(dict(CONFIG, toggl_token='another token'), fd)
+    os.utime(config_path, ns=(0, watcher.mtime_ns + 1))
+    with pytest.raises(ConfigError, match='another Toggl token'):
+        watcher.reload()
+    # the error is reported once, and the previous configuration kept
+    assert not watcher.reload()
+    assert watcher.config.working_day_hours == 8.5
+
+
+@pytest.mark.parametrize("change, message", [
+    ({'client': {'name': 'ACME', 'start_date': '05/02/2018'}}, 'client.start_date'),
+    ({'working_day_hours': 'all day'}, 'working_day_hours'),
+    ({'personal_holidays': [["2018-06-08"]]}, 'personal_holidays[0]'),
+    ({'company_bonus_days': [["2018-12-24", "one"]]}, 'company_bonus_days[0][1]'),
+    ({'toggl_token': None}, 'toggl_token'),
+    ({'clients': [{'name': 'ACME', 'start_date': '2018-02-05', 'working_day_hours': 0}]},
+     'clients[0].working_day_hours'),
+    ({'clients': [{'name': 'ACME', 'start_date': '2018-02-05'}] * 2}, 'different name'),
+])
+def test_load_config_reports_invalid_schema(config_path, change, message):
+    with open(config_path, 'w') as fd:
+        json.dump(dict(CONFIG, **change), fd)
+    with pytest.raises(ConfigError, match=message.replace('[', r'\[').replace(']', r'\]')):
+        load_config(config_path)
+
+
+def test_load_config_with_several_clients(config_path):
+    clients = [
+        {"name": "ACME", "start_date": "2018-02-05"},
+        {"name": "Initech", "start_date": "2019-01-07", "working_day_hours": 3, "personal_holidays": []},
+    ]
+    data = dict(CONFIG, clients=clients)
+    del data['client']
+    with open(config_path, 'w') as fd:
+        json.dump(data, fd)
+    config = load_config(config_path)
+    acme, initech = config.per_client()
+    assert config.client.name == 'ACME'
+    assert acme.working_day_hours == 7.5
+    assert len(acme.personal_holidays) == 2
+    assert initech.client == ClientConfig(name='Initech', start_date=datetime.datetime(2019, 1, 7))
+    assert (initech.working_day_hours, initech.personal_holidays) == (3, ())
+    assert initech.company_bonus_days == acme.company_bonus_days
+
+
+def test_load_config_reports_missing_file(tmp_path):
+    with pytest.raises(ConfigError, match='cannot read configuration file'):
+        load_config(str(tmp_path / 'missing.json'))
@@ -0,0 +1,102 @@
+import datetime
+import threading
+
+import pytest
+from click.testing import CliRunner
+
+from wwe.cli import format_balance_message, get_time_to_work, main
+from wwe.config import ClientConfig, Config
+from wwe.daemon import BalanceServer, BalanceTracker, get_daemon_socket_path, query_daemon
+from wwe.store import EntryStore
+from wwe.workdays import HolidayIndex
+from tests.test_store import FakeAPI
+
+UTC = datetime.timezone.utc
+START = datetime.datetime(2018, 2, 5, tzinfo=UTC)
+CONFIG = Config(
+    toggl_token="870738agd54db0e63qfd943380ahbe8f",
+    client=ClientConfig(name="ACME", start_date=datetime.datetime(2018, 2, 5)),
+    working_day_hours=7.5,
+)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setenv("WWE_CACHE_DIR", str(tmp_path))
+    return EntryStore(str(tmp_path / "entries.sqlite3"))
+
+
+def test_tracker_sums_frozen_recent_and_running_entries(store, make_entry):
+    now = datetime.datetime.now(UTC).replace(microsecond=0)
+    old = make_entry(1, START, seconds=3600)
+    recent = make_entry(2, now - datetime.timedelta(hours=5), seconds=1800)
+    running = make_entry(3, now - datetime.timedelta(hours=1), seconds=None)
+    other_project = make_entry(4, now - datetime.timedelta(hours=4), pid=1)
+    store.sync(FakeAPI([old, recent, running, other_project]), start=START)
+
+    tracker = BalanceTracker(CONFIG, store)
+    tracker.update(START, {old.pid}, HolidayIndex(), now=now)
+    assert tracker.frozen_worked == datetime.timedelta(hours=1)
+    assert tracker.recent_worked == datetime.timedelta(minutes=30)
+    assert tracker.worked(now=now) == datetime.timedelta(hours=2, minutes=30)
+
+
+def test_daemon_answers_like_print_balance(store, make_entry):
+    store.sync(FakeAPI([make_entry(1, START, seconds=7 * 3600)]), start=START)
+    tracker = BalanceTracker(CONFIG, store)
+    server = BalanceServer(get_daemon_socket_path(CONFIG.toggl_token), tracker)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        assert query_daemon(CONFIG) is None  # not ready before the first update
+        tracker.update(START, {97990658}, HolidayIndex())
+        to_work = get_time_to_work(CONFIG, HolidayIndex(), CONFIG.client.start_date, datetime.datetime.now())
+        assert query_daemon(CONFIG) == format_balance_message(to_work, datetime.timedelta(hours=7))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_query_without_daemon(tmp_path, monkeypatch):
+    monkeypatch.setenv("WWE_CACHE_DIR", str(tmp_path))
+    assert query_daemon(CONFIG) is None
+    # a socket left behind by a daemon which is not running anymore
+    server = BalanceServer(get_daemon_socket_path(CONFIG.toggl_token), BalanceTracker(CONFIG, None))
+    server.server_close()
+    assert query_daemon(CONFIG) is None
+
+
+def test_tracker_moves_frozen_total_forward_and_rereads_changed_history(store, make_entry):
+    now = datetime.datetime.now(UTC).replace(microsecond=0)
+    entries = [make_entry(i, now - datetime.timedelta(days=10 - i), seconds=3600) for i in range(10)]
+    api = FakeAPI(entries)
+    store.sync(api, start=START, now=now)
+    tracker = BalanceTracker(CONFIG, store)
+    tracker.update(START, {97990658}, HolidayIndex(), now=now)
+    frozen_until = tracker.frozen_until
+
+    later = now + datetime.timedelta(days=3)
+    store.sync(api, start=START, now=later)
+    tracker.update(START, {97990658}, HolidayIndex(), now=later)
+    assert tracker.frozen_until == frozen_until + 3 * 24 * 3600
+    assert tracker.worked(now=later) == datetime.timedelta(hours=10)
+
+    # an entry older than the frozen total is edited in Toggl
+    api.entries = [make_entry(0, entries[0].start, seconds=7200, at=later)] + entries[1:]
+    store.sync(api, start=START, now=later + datetime.timedelta(minutes=1))
+    tracker.update(START, {97990658}, HolidayIndex(), now=later + datetime.timedelta(minutes=1))
+    assert tracker.worked(now=later) == datetime.timedelta(hours=11)
+
+
+def test_profile_bypasses_daemon(standin, monkeypatch, tmp_path):
+    import collections
+    import wwe.daemon
+    import wwe.trace
+
+    monkeypatch.setattr(wwe.daemon, 'query_daemon', lambda config: 'answered by the daemon')
+    # keep the profile out of the trace state other tests see
+    monkeypatch.setattr(wwe.trace, 'events', [])
+    monkeypatch.setattr(wwe.trace, 'counters', collections.defaultdict(float))
+    assert CliRunner().invoke(main).output == 'answered by the daemon\n'
+    result = CliRunner().invoke(main, ['--profile', str(tmp_path / 'profile.json')])
+    assert result.exit_code == 0, result.output
+    assert 'answered by the daemon' not in result.output
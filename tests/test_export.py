@@ -0,0 +1,94 @@
+import datetime
+import json
+import sys
+
+import pytest
+from click.testing import CliRunner
+from wwe.cli import main
+from wwe.export import ExportError, guess_format, MISSING_ID, write_npz, write_parquet
+
+UTC = datetime.timezone.utc
+NOW = datetime.datetime(2019, 3, 1, 12, tzinfo=UTC)
+
+
+def make_entries(make_entry):
+    # the last entry is still running
+    return [make_entry(i + 1, datetime.datetime(2019, 3, 1, 8, tzinfo=UTC) + datetime.timedelta(minutes=30 * i),
+                       seconds=20 * 60 if i < 4 else None, wid=10, pid=i if i else None, description=f'Täsk {i}',
+                       tags=('a', 'b')[:i % 3], billable=i % 2 == 1)
+            for i in range(5)]
+
+
+def read_npz(path):
+    """Read every column of an .npz archive as lists."""
+    numpy = pytest.importorskip('numpy')
+    with numpy.load(path) as archive:
+        return {name: archive[name] for name in archive.files}
+
+
+def decode_strings(data, offsets):
+    raw = bytes(data)
+    return [raw[start:end].decode() for start, end in zip(offsets, offsets[1:])]
+
+
+def test_write_npz_in_row_groups(tmp_path, make_entry):
+    numpy = pytest.importorskip('numpy')
+    path = str(tmp_path / 'entries.npz')
+    assert write_npz(make_entries(make_entry), path, row_group_size=2, now=NOW) == 5
+    columns = read_npz(path)
+    assert columns['id'].tolist() == [1, 2, 3, 4, 5]
+    assert columns['pid'].tolist() == [MISSING_ID, 1, 2, 3, 4]
+    assert columns['start'].dtype == numpy.dtype('datetime64[s]')
+    assert columns['start'][0] == numpy.datetime64('2019-03-01T08:00:00')
+    assert numpy.isnat(columns['stop'][-1])
+    assert columns['duration'].view('<i8').tolist() == [1200, 1200, 1200, 1200, 7200]
+    assert columns['running'].tolist() == [False, False, False, False, True]
+    assert columns['billable'].tolist() == [False, True, False, True, False]
+    assert decode_strings(columns['description_data'], columns['description_offsets']) == [
+        f'Täsk {i}' for i in range(5)
+    ]
+    tags = decode_strings(columns['tags_data'], columns['tags_offsets'])
+    assert [json.loads(t) for t in tags] == [[], ['a'], ['a', 'b'], [], ['a']]
+
+
+def test_write_npz_keeps_path_and_empty_columns(tmp_path):
+    pytest.importorskip('numpy')
+    path = str(tmp_path / 'entries')
+    assert write_npz([], path, now=NOW) == 0
+    columns = read_npz(path)
+    assert len(columns['id']) == 0
+    assert columns['description_offsets'].tolist() == [0]
+
+
+def test_write_npz_needs_numpy(tmp_path, monkeypatch, make_entry):
+    monkeypatch.setitem(sys.modules, 'numpy', None)
+    with pytest.raises(ExportError):
+        write_npz(make_entries(make_entry), str(tmp_path / 'entries.npz'), now=NOW)
+
+
+def test_write_parquet(tmp_path, make_entry):
+    parquet = pytest.importorskip('pyarrow.parquet')
+    path = str(tmp_path / 'entries.parquet')
+    assert write_parquet(make_entries(make_entry), path, row_group_size=2, now=NOW) == 5
+    assert parquet.ParquetFile(path).num_row_groups == 3
+    table = parquet.read_table(path)
+    assert table.column('pid').to_pylist() == [None, 1, 2, 3, 4]
+    assert table.column('duration').to_pylist()[-1] == datetime.timedelta(hours=2)
+    assert table.column('tags').to_pylist()[2] == ['a', 'b']
+
+
+def test_guess_format():
+    assert guess_format('hours.parquet') == 'parquet'
+    assert guess_format('hours.NPZ') == 'npz'
+
+
+def test_export_command(standin, tmp_path):
+    pytest.importorskip('numpy')
+    path = str(tmp_path / 'entries.npz')
+    result = CliRunner().invoke(main, ['export', path, '--row-group-size', '64'])
+    assert result.exit_code == 0, result.output
+    columns = read_npz(path)
+    assert result.output == f'{len(columns["id"])} time entries written to "{path}"\n'
+    # only the entries of the client's projects, two out of three
+    assert len(columns['id']) == 200
+    assert columns['start'].tolist() == sorted(columns['start'].tolist())
@@ -0,0 +1,52 @@
+import datetime
+
+import pytest
+
+from wwe.filters import EntryFilter
+from wwe.store import EntryStore
+from tests.test_store import FakeAPI
+
+UTC = datetime.timezone.utc
+START = datetime.datetime(2019, 1, 7, 9, tzinfo=UTC)
+
+
+def make_entries(make_entry):
+    return [make_entry(i, START + datetime.timedelta(hours=i), pid=(1, 2, 3, None)[i % 4], wid=(10, 20)[i % 2],
+                       tags=(("meeting",), ("code", "review"), ())[i % 3], billable=i % 5 == 0)
+            for i in range(24)]
+
+
+@pytest.mark.parametrize("entry_filter", [
+    EntryFilter.create(),
+    EntryFilter.create(project_ids=[1, 3]),
+    EntryFilter.create(project_ids=[]),
+    EntryFilter.create(workspace_ids=[20]),
+    EntryFilter.create(tags=["review", "other"]),
+    EntryFilter.create(billable=True),
+    EntryFilter.create(billable=False),
+    EntryFilter.create(project_ids=[1, 2, 3], workspace_ids=[10], tags=["meeting", "code"], billable=False),
+])
+def test_compiled_predicate_and_sql_push_down_agree(tmp_path, entry_filter, make_entry):
+    entries = make_entries(make_entry)
+    store = EntryStore(str(tmp_path / "entries.sqlite3"))
+    store.sync(FakeAPI(entries), start=START)
+
+    expected = [entry.id for entry in entries if naive_match(entry_filter, entry)]
+    assert [entry.id for entry in entry_filter.apply(entries)] == expected
+    assert [entry.id for entry in store.entries(start=START, entry_filter=entry_filter)] == expected
+
+
+def naive_match(entry_filter, entry):
+    return all([
+        entry_filter.project_ids is None or entry.pid in entry_filter.project_ids,
+        entry_filter.workspace_ids is None or entry.wid in entry_filter.workspace_ids,
+        entry_filter.tags is None or any(tag in entry_filter.tags for tag in entry.tags),
+        entry_filter.billable is None or entry.billable == entry_filter.billable,
+    ])
+
+
+def test_store_keeps_tags_and_billable(tmp_path, make_entry):
+    entries = make_entries(make_entry)
+    store = EntryStore(str(tmp_path / "entries.sqlite3"))
+    store.sync(FakeAPI(entries), start=START)
+    assert list(store.entries(start=START)) == entries
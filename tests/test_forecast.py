@@ -0,0 +1,58 @@
+import datetime
+
+from click.testing import CliRunner
+from wwe.cli import compute_balance, compute_forecast, main, prepare_config
+from wwe.forecast import Forecast
+
+UTC = datetime.timezone.utc
+HOUR = datetime.timedelta(hours=1)
+MIDNIGHT = datetime.datetime(2019, 3, 4, tzinfo=UTC)
+OPTIONS = {'end': None, 'refresh': False, 'max_age': None, 'asyncio': False, 'tags': (), 'billable': None,
+           'summary': False}
+
+
+def test_forecast_splits_closed_days_and_today(make_entry):
+    entries = [
+        make_entry(1, MIDNIGHT - 15 * HOUR, seconds=9 * 3600),
+        make_entry(2, MIDNIGHT + 9 * HOUR, seconds=2 * 3600),
+        make_entry(3, MIDNIGHT + 12 * HOUR, seconds=None),
+    ]
+    forecast = Forecast.from_entries(entries, MIDNIGHT, to_work_before_today=8 * HOUR, to_work_today=8 * HOUR)
+    assert forecast.baseline == HOUR
+    assert forecast.worked_today == 2 * HOUR
+    assert forecast.running_since == [MIDNIGHT + 12 * HOUR]
+    # the running entry only counts after it started
+    assert forecast.balance_at(MIDNIGHT + 10 * HOUR) == -5 * HOUR
+    assert forecast.balance_at(MIDNIGHT + 16 * HOUR) == -HOUR
+    assert forecast.zero_at(MIDNIGHT + 13 * HOUR) == MIDNIGHT + 17 * HOUR
+
+
+def test_zero_at_without_running_entry():
+    forecast = Forecast(baseline=-HOUR, to_work_today=8 * HOUR, worked_today=6 * HOUR)
+    now = MIDNIGHT + 15 * HOUR
+    assert forecast.balance_at(now) == forecast.balance_at(now + 2 * HOUR) == -3 * HOUR
+    assert forecast.zero_at(now) == now + 3 * HOUR
+    assert Forecast(baseline=HOUR, to_work_today=HOUR).zero_at(now) is None
+
+
+def test_forecast_matches_balance(standin):
+    config = prepare_config(OPTIONS)
+    forecast = compute_forecast(config, OPTIONS)
+    now = datetime.datetime.now(UTC)
+    to_work, worked = compute_balance(config, OPTIONS)
+    assert abs((forecast.balance_at(now) - (worked - to_work)).total_seconds()) < 5
+
+
+def test_forecast_command(standin):
+    result = CliRunner().invoke(main, ['forecast', '--at', '16:00', '--at', '18:30'])
+    assert result.exit_code == 0, result.output
+    lines = result.output.splitlines()
+    assert lines[0].startswith('Balance now: ')
+    assert lines[1].startswith('Balance at 16:00: ')
+    assert lines[2].startswith('Balance at 18:30: ')
+    assert len(lines) == 4
+
+
+def test_forecast_rejects_end_date():
+    result = CliRunner().invoke(main, ['--end', '2019-01-31', 'forecast'])
+    assert result.exit_code == 2
@@ -0,0 +1,82 @@
+import datetime
+
+import pytest
+import requests
+
+from wwe.gov import gov_uk_bank_holidays_between, load_bank_holidays
+
+FEED = {"england-and-wales": {"division": "england-and-wales",
+                              "events": [{"title": "Christmas Day", "date": "2018-12-25"},
+                                         {"title": "New Year’s Day", "date": "2018-01-01"},
+                                         {"title": "Boxing Day", "date": "2018-12-26"}]}}
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, data=None, headers=None):
+        self.status_code = status_code
+        self.data = data
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(self.status_code)
+
+    def json(self):
+        return self.data
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("WWE_CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def fake_get(monkeypatch):
+    calls = []
+    responses = []
+
+    def get(url, headers=None, timeout=None):
+        calls.append(headers)
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(requests, "get", get)
+    return calls, responses
+
+
+def test_fresh_cache_skips_network(cache_dir, fake_get):
+    calls, responses = fake_get
+    responses.append(FakeResponse(data=FEED, headers={"ETag": '"abc"'}))
+
+    assert load_bank_holidays() == load_bank_holidays()
+    assert len(calls) == 1
+
+
+def test_stale_cache_is_revalidated(cache_dir, fake_get):
+    calls, responses = fake_get
+    responses.extend([FakeResponse(data=FEED, headers={"ETag": '"abc"'}), FakeResponse(status_code=304)])
+
+    expected = load_bank_holidays()
+    assert load_bank_holidays(ttl=datetime.timedelta(0)) == expected
+    assert calls[1] == {"If-None-Match": '"abc"'}
+
+
+def test_network_failure_falls_back_to_cache(cache_dir, fake_get):
+    calls, responses = fake_get
+    responses.extend([FakeResponse(data=FEED), requests.ConnectionError()])
+
+    expected = load_bank_holidays()
+    assert load_bank_holidays(ttl=datetime.timedelta(0)) == expected
+
+
+def test_bank_holidays_between(cache_dir, fake_get):
+    _, responses = fake_get
+    responses.append(FakeResponse(data=FEED))
+
+    start = datetime.datetime(2018, 2, 5)
+    assert gov_uk_bank_holidays_between(start, datetime.datetime(2018, 12, 25, 9)) == 1
+    assert gov_uk_bank_holidays_between(start, datetime.datetime(2018, 12, 31)) == 2
+    assert gov_uk_bank_holidays_between(datetime.datetime(2018, 12, 25, 9), datetime.datetime(2018, 12, 31)) == 1
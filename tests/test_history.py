@@ -0,0 +1,59 @@
+import datetime
+import json
+
+from click.testing import CliRunner
+from wwe.cli import compute_balance, main, prepare_config
+from wwe.entry import TimeEntry
+from wwe.history import balance_history, bucket_by_start_day
+
+UTC = datetime.timezone.utc
+HOUR = datetime.timedelta(hours=1)
+
+
+def test_bucket_by_start_day():
+    start = datetime.datetime(2019, 3, 1, 10, tzinfo=UTC)
+    entries = [
+        TimeEntry(id=1, wid=1, pid=1, start=start, stop=start + HOUR, duration=HOUR),
+        TimeEntry(id=2, wid=1, pid=1, start=start + 2 * HOUR, stop=start + 3 * HOUR, duration=HOUR),
+        TimeEntry(id=3, wid=1, pid=1, start=start + 24 * HOUR, stop=None,
+                  duration=datetime.timedelta(seconds=-(start + 24 * HOUR).timestamp())),
+    ]
+    worked = bucket_by_start_day(entries, now=start + 26 * HOUR)
+    assert worked == {
+        (start.astimezone()).date(): 2 * HOUR,
+        (start + 24 * HOUR).astimezone().date(): 2 * HOUR,
+    }
+
+
+def test_balance_history_skips_days_without_work_nor_time_to_work():
+    friday = datetime.date(2019, 3, 1)
+    monday = datetime.date(2019, 3, 4)
+
+    def to_work_until(day):
+        return 8 * HOUR * (1 if day < monday else 2)
+
+    worked = {friday: 9 * HOUR, friday + datetime.timedelta(days=1): HOUR}
+    rows = balance_history(worked, to_work_until, friday, monday)
+    assert [(row['date'], row['worked_seconds'], row['to_work_seconds'], row['balance_seconds']) for row in rows] == [
+        ('2019-03-01', 9 * 3600, 8 * 3600, 3600),
+        ('2019-03-02', 3600, 0, 2 * 3600),
+        ('2019-03-04', 0, 8 * 3600, -6 * 3600),
+    ]
+
+
+def test_history_matches_balance_at_end_date(standin):
+    runner = CliRunner()
+    result = runner.invoke(main, ['--end', '2019-01-31', 'history', '--format', 'json'])
+    assert result.exit_code == 0, result.output
+    rows = json.loads(result.output)
+    assert rows[0]['date'] == '2018-02-05'
+    assert rows[-1]['date'] == '2019-01-31'
+
+    options = {'end': datetime.datetime(2019, 1, 31), 'refresh': False, 'max_age': None, 'asyncio': False,
+               'tags': (), 'billable': None}
+    to_work, worked = compute_balance(prepare_config(options), options)
+    assert rows[-1]['balance_seconds'] == int((worked - to_work).total_seconds())
+
+    csv = runner.invoke(main, ['--end', '2019-01-31', '--max-age', '3600', 'history']).output.splitlines()
+    assert csv[0] == 'date,worked_seconds,to_work_seconds,balance_seconds,balance'
+    assert len(csv) == len(rows) + 1
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from wwe.jsonstream import iter_json_array, JsonArrayParser
+
+DOCUMENT = json.dumps([
+    {"id": 1, "description": "Café ☕", "tags": ["a", "b"], "duration": -1543849200},
+    {"id": 2, "description": "]}, [{", "pid": None, "billable": False},
+    12345,
+    "text",
+    [1, [2, {}]],
+], indent=1, ensure_ascii=False).encode()
+
+
+def chunked(data, size):
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(DOCUMENT)])
+def test_items_match_json_loads_whatever_the_chunk_size(size):
+    assert list(iter_json_array(chunked(DOCUMENT, size))) == json.loads(DOCUMENT)
+
+
+def test_items_are_returned_as_soon_as_complete():
+    parser = JsonArrayParser()
+    assert parser.feed(b'[{"id": 1}, {"id"') == [{"id": 1}]
+    assert parser.feed(b': 2}, 3') == [{"id": 2}]
+    assert parser.feed(b'4]') == [34]
+    assert parser.close() == []
+
+
+NUMBERS = b'[-15000000000.0, 1e5, 2.5E-3, -0, 12, null, true]'
+
+
+@pytest.mark.parametrize("document", [DOCUMENT, NUMBERS])
+def test_items_match_json_loads_whatever_the_split(document):
+    for offset in range(len(document) + 1):
+        assert list(iter_json_array([document[:offset], document[offset:]])) == json.loads(document), offset
+
+
+def test_numbers_cut_after_their_dot_wait_for_the_next_chunk():
+    chunks = [b'[-150000000', b'0', b'0.', b'0,', b' ', b'nul', b'l]']
+    assert list(iter_json_array(chunks)) == [-15000000000.0, None]
+
+
+@pytest.mark.parametrize("document, expected", [(b"[]", []), (b" [ ] ", []), (b"null", []), (b"[1]", [1])])
+def test_small_documents(document, expected):
+    assert list(iter_json_array(chunked(document, 1))) == expected
+
+
+@pytest.mark.parametrize("document", [b'[{"id": 1}', b'[1 2]', b'[1] 2', b'[{"id": }]'])
+def test_invalid_documents(document):
+    with pytest.raises(ValueError):
+        list(iter_json_array(chunked(document, 4)))
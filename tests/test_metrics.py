@@ -0,0 +1,111 @@
+import threading
+import urllib.request
+
+import wwe.trace as trace
+from wwe.cli import compute_balance, prepare_config
+from wwe.metrics import CONTENT_TYPE, endpoint_label, MetricsRegistry, MetricsServer, refresh_metrics
+from wwe.store import open_store
+from wwe.toggl import TogglWrap
+
+OPTIONS = {'end': None, 'refresh': False, 'max_age': None, 'asyncio': False, 'tags': (), 'billable': None,
+           'summary': False}
+
+
+def parse_samples(text):
+    """Return the value of every sample line, by name with labels."""
+    samples = {}
+    for line in text.splitlines():
+        if not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_render_openmetrics():
+    registry = MetricsRegistry()
+    registry.set('wwe_balance_seconds', -1800, client='ACME "Ltd"')
+    registry.count('requests', 1)
+    registry.count('requests', 2)
+    registry.count('store cache hits', 3)
+    registry.count('store cache misses', 1)
+    registry.count('entries read', 10)
+    registry.span('http request', 0.2, {'section': 'workspaces/123/clients'})
+    registry.span('http request', 3, {'section': 'workspaces/123/clients'})
+    registry.span('http request', 0.2, {'url': 'https://www.gov.uk/bank-holidays.json'})
+
+    text = registry.render()
+    assert text.endswith('\n# EOF\n')
+    assert '# TYPE wwe_http_requests counter\n' in text
+    samples = parse_samples(text)
+    assert samples['wwe_balance_seconds{client="ACME \\"Ltd\\""}'] == -1800
+    assert samples['wwe_http_requests_total'] == 3
+    assert samples['wwe_cache_hit_ratio{cache="store"}'] == 0.75
+    histogram = 'wwe_toggl_request_duration_seconds'
+    assert samples[f'{histogram}_bucket{{endpoint="workspaces/:id/clients",le="0.1"}}'] == 0
+    assert samples[f'{histogram}_bucket{{endpoint="workspaces/:id/clients",le="0.25"}}'] == 1
+    assert samples[f'{histogram}_bucket{{endpoint="workspaces/:id/clients",le="+Inf"}}'] == 2
+    assert samples[f'{histogram}_sum{{endpoint="workspaces/:id/clients"}}'] == 3.2
+    # only the Toggl requests are in the latency histogram
+    assert samples[f'{histogram}_count{{endpoint="workspaces/:id/clients"}}'] == 2
+    assert not any('entries_read' in name for name in samples)
+
+
+def test_endpoint_label():
+    assert endpoint_label('time_entries') == 'time_entries'
+    assert endpoint_label('workspaces/42/projects') == 'workspaces/:id/projects'
+
+
+def test_observer_sees_spans_and_counters_without_recording():
+    registry = MetricsRegistry()
+    trace.add_observer(registry)
+    try:
+        assert trace.enabled and not trace.recording
+        with trace.span('http request', section='me'):
+            trace.count('requests')
+    finally:
+        trace.remove_observer(registry)
+    assert not trace.enabled
+    assert 'requests' not in trace.counters
+    samples = parse_samples(registry.render())
+    assert samples['wwe_http_requests_total'] == 1
+    assert samples['wwe_toggl_request_duration_seconds_count{endpoint="me"}'] == 1
+
+
+def test_refresh_then_scrape(standin):
+    config = prepare_config(OPTIONS)
+    t = TogglWrap(token=config.toggl_token, store=open_store(token=config.toggl_token))
+    registry = MetricsRegistry()
+    trace.add_observer(registry)
+    try:
+        refresh_metrics(registry, config, OPTIONS, t)
+        first_requests = standin.requests
+        toggl, store = t.toggl, t.store
+        refresh_metrics(registry, config, OPTIONS, t)
+        # the session, rate limiter and store of the first refresh are reused
+        assert t.toggl is toggl and t.store is store
+        # the second refresh only asks for the changed and recent entries
+        assert standin.requests - first_requests == 2
+    finally:
+        trace.remove_observer(registry)
+
+    server = MetricsServer(('127.0.0.1', 0), registry)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        requests_before = standin.requests
+        with urllib.request.urlopen(f'http://127.0.0.1:{server.server_address[1]}/metrics') as response:
+            assert response.headers['Content-Type'] == CONTENT_TYPE
+            samples = parse_samples(response.read().decode())
+        # scrapes are answered from memory
+        assert standin.requests == requests_before
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    to_work, worked = compute_balance(config, dict(OPTIONS, max_age=None))
+    assert abs(samples['wwe_balance_seconds{client="ACME"}'] - (worked - to_work).total_seconds()) < 5
+    assert 'wwe_worked_today_seconds{client="ACME"}' in samples
+    assert samples['wwe_http_requests_total'] == first_requests + 2
+    assert samples['wwe_cache_misses_total{cache="bank holidays"}'] == 1
+    assert samples['wwe_cache_hits_total{cache="bank holidays"}'] == 1
+    assert samples['wwe_bank_holidays_age_seconds'] < 60
+    assert samples['wwe_entries_downloaded_total'] >= 300
@@ -0,0 +1,41 @@
+import datetime
+import time
+
+import pytest
+
+from wwe.entry import TimeEntry
+from wwe.report import Aggregator
+
+UTC = datetime.timezone.utc
+
+
+@pytest.fixture(autouse=True)
+def utc_local_time(monkeypatch):
+    monkeypatch.setenv("TZ", "UTC")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_entries_spanning_midnight_are_split(make_entry):
+    # Sunday 22:00 to Monday 01:30
+    entry = make_entry(1, datetime.datetime(2018, 2, 4, 22, tzinfo=UTC), 3.5 * 3600)
+
+    aggregation = Aggregator().consume([entry])
+
+    assert aggregation.by_day == {datetime.date(2018, 2, 4): datetime.timedelta(hours=2),
+                                  datetime.date(2018, 2, 5): datetime.timedelta(hours=1.5)}
+    assert aggregation.by_week == {(2018, 5): datetime.timedelta(hours=2), (2018, 6): datetime.timedelta(hours=1.5)}
+    assert aggregation.by_project == {97990658: datetime.timedelta(hours=3.5)}
+    assert aggregation.total == datetime.timedelta(hours=3.5)
+
+
+def test_running_entries_count_until_now():
+    start = datetime.datetime(2018, 2, 5, 9, tzinfo=UTC)
+    running = TimeEntry(id=1, wid=1819588, pid=1, start=start, stop=None,
+                        duration=datetime.timedelta(seconds=-start.timestamp()))
+
+    aggregation = Aggregator(now=start + datetime.timedelta(hours=1)).consume([running])
+
+    assert aggregation.by_day == {datetime.date(2018, 2, 5): datetime.timedelta(hours=1)}
@@ -0,0 +1,49 @@
+import datetime
+import json
+import subprocess
+import sys
+import time
+
+from wwe.cache import get_cache_path, write_json_cache
+from wwe.catalog import Catalog, save_catalog
+from wwe.store import EntryStore, get_default_store_path, to_epoch
+
+HEAVY_MODULES = ("requests", "urllib3", "colorama", "tzlocal")
+TOKEN = "870738agd54db0e63qfd943380ahbe8f"
+
+
+def loaded_modules(code):
+    script = f"import sys\n{code}\nprint('loaded:' + ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+    return result.stdout.strip().splitlines()[-1][len("loaded:"):]
+
+
+def test_importing_cli_does_not_load_heavy_dependencies():
+    assert loaded_modules("import wwe.cli") == ""
+
+
+def test_warm_cache_fast_path_does_not_load_http_stack(tmp_path, monkeypatch):
+    home = tmp_path / "home"
+    (home / ".config" / "wwe").mkdir(parents=True)
+    (home / ".config" / "wwe" / "config.json").write_text(json.dumps({
+        "toggl_token": TOKEN,
+        "personal_holidays": [],
+        "company_bonus_days": [],
+        "client": {"name": "ACME", "start_date": "2018-02-05"},
+        "working_day_hours": 7.5,
+    }))
+    monkeypatch.setenv("HOME", str(home))
+    monkeypatch.setenv("WWE_CACHE_DIR", str(tmp_path / "cache"))
+    write_json_cache(get_cache_path("bank-holidays.json"), {"fetched_at": time.time(), "ordinals": []})
+    catalog = Catalog()
+    catalog.update(clients=[{"id": 10, "name": "ACME"}], projects=[{"id": 1, "cid": 10, "name": "Imaging"}])
+    catalog.synced_at = time.time()
+    save_catalog(TOKEN, catalog)
+    store = EntryStore(get_default_store_path(TOKEN))
+    with store.connection:
+        store._set_state("synced_from", to_epoch(datetime.datetime(2018, 2, 5, tzinfo=datetime.timezone.utc)))
+        store._set_state("synced_until", int(time.time()))
+    store.close()
+
+    code = "from wwe.cli import main\nmain.main(['--max-age', '3600'], standalone_mode=False)"
+    assert loaded_modules(code) == "colorama,tzlocal"
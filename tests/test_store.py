@@ -0,0 +1,142 @@
+import datetime
+import threading
+
+import pytest
+
+from wwe.store import EntryStore
+
+UTC = datetime.timezone.utc
+
+
+class FakeAPI:
+    def __init__(self, entries):
+        self.entries = entries
+        self.deleted_ids = []
+        self.calls = []
+        self.changes_calls = []
+
+    def get_time_entry_changes(self, since):
+        self.changes_calls.append(since)
+        changed = [entry for entry in self.entries if entry.at.timestamp() > since]
+        return max([since] + [int(entry.at.timestamp()) for entry in changed]), changed, self.deleted_ids
+
+    def get_time_entries(self, start_date, end_date=None):
+        self.calls.append((start_date, end_date))
+        for entry in self.entries:
+            if entry.start >= start_date and (end_date is None or entry.start < end_date):
+                yield entry
+
+    def get_time_entries_concurrently(self, start_date, end_date=None):
+        return self.get_time_entries(start_date, end_date)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return EntryStore(str(tmp_path / "entries.sqlite3"))
+
+
+def test_cold_sync_downloads_full_history(store, make_entry):
+    start = datetime.datetime(2018, 2, 5, tzinfo=UTC)
+    entries = [make_entry(i, start + datetime.timedelta(days=i)) for i in range(10)]
+    api = FakeAPI(entries)
+
+    store.sync(api, start=start, now=start + datetime.timedelta(days=10))
+
+    assert api.calls == [(start, None)]
+    assert [e.id for e in store.entries(start)] == list(range(10))
+
+
+def test_warm_sync_only_rechecks_recent_window(store, make_entry):
+    start = datetime.datetime(2018, 2, 5, tzinfo=UTC)
+    now = start + datetime.timedelta(days=10)
+    entries = [make_entry(i, start + datetime.timedelta(days=i)) for i in range(10)]
+    api = FakeAPI(entries)
+    store.sync(api, start=start, now=now)
+
+    # entry 9 is deleted and entry 8 is edited in Toggl
+    edited = make_entry(8, entries[8].start, seconds=60, at=now)
+    api.entries = entries[:8] + [edited]
+    api.calls = []
+    store.sync(api, start=start, now=now)
+
+    assert api.calls == [(now - store.recheck_window, None)]
+    stored = list(store.entries(start))
+    assert [e.id for e in stored] == list(range(9))
+    assert stored[-1].duration == datetime.timedelta(seconds=60)
+
+
+def test_sync_backfills_earlier_start(store, make_entry):
+    start = datetime.datetime(2018, 2, 5, tzinfo=UTC)
+    now = start + datetime.timedelta(days=10)
+    entries = [make_entry(i, start + datetime.timedelta(days=i)) for i in range(10)]
+    api = FakeAPI(entries)
+    store.sync(api, start=start + datetime.timedelta(days=5), now=now)
+
+    store.sync(api, start=start, now=now)
+
+    assert api.calls[1] == (start, start + datetime.timedelta(days=5))
+    end = start + datetime.timedelta(days=3)
+    assert [e.id for e in store.entries(start, end)] == [0, 1, 2]
+
+
+def test_warm_sync_applies_changes_to_old_entries(store, make_entry):
+    start = datetime.datetime(2018, 2, 5, tzinfo=UTC)
+    now = start + datetime.timedelta(days=10)
+    entries = [make_entry(i, start + datetime.timedelta(days=i)) for i in range(10)]
+    api = FakeAPI(entries)
+    store.sync(api, start=start, now=now)
+    assert store.changes_since == int(now.timestamp())
+
+    # long after the recheck window, entry 1 is edited, entry 2 deleted and an entry is added on day 3
+    later = now + datetime.timedelta(days=1)
+    edited = make_entry(1, entries[1].start, seconds=60, at=later)
+    added = make_entry(10, start + datetime.timedelta(days=3, hours=1), at=later)
+    api.entries = [entries[0], edited] + entries[3:] + [added]
+    api.deleted_ids = [2]
+    store.sync(api, start=start, now=later)
+
+    assert api.changes_calls == [int(now.timestamp())]
+    stored = {e.id: e for e in store.entries(start)}
+    assert sorted(stored) == [0, 1, 3, 4, 5, 6, 7, 8, 9, 10]
+    assert stored[1].duration == datetime.timedelta(seconds=60)
+    assert store.changed_from == int(entries[1].start.timestamp())
+    assert store.changes_since == int(later.timestamp())
+
+
+def test_concurrent_opens_of_a_new_store(tmp_path):
+    path = str(tmp_path / "entries.sqlite3")
+    errors = []
+
+    def open_and_read():
+        try:
+            EntryStore(path).project_ids()
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=open_and_read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def test_store_is_not_locked_while_downloading(tmp_path, make_entry):
+    path = str(tmp_path / "entries.sqlite3")
+    start = datetime.datetime(2018, 2, 5, tzinfo=UTC)
+    entries = [make_entry(i, start + datetime.timedelta(days=i)) for i in range(3)]
+    other = EntryStore(path)
+    other.connection.execute('PRAGMA busy_timeout = 0')
+
+    def download(start_date, end_date=None):
+        for entry in FakeAPI.get_time_entries(api, start_date, end_date):
+            # another process syncing the same store meanwhile must not find it locked
+            with other.connection:
+                other._set_state('synced_until', 0)
+            yield entry
+
+    api = FakeAPI(entries)
+    api.get_time_entries = download
+    store = EntryStore(path)
+    store.sync(api, start=start, now=start + datetime.timedelta(days=10))
+    assert [e.id for e in store.entries(start)] == [0, 1, 2]
@@ -1,6 +1,68 @@
-# from wwe.toggl import TogglWrap
+from wwe.toggl import TogglWrap
 
 
 def test_empty(mock_config):
     c = mock_config
     assert c.get("toggl").get("timezone") == "+00:00"
+
+
+class FakeTogglAPI:
+    def __init__(self):
+        self.calls = []
+
+    def get_me(self, related_data=False, since=None):
+        self.calls.append(since)
+        if since is not None:
+            return {"since": 2000, "data": {"projects": [{"id": 201, "wid": 2, "cid": 20, "name": "New", "at": "b"}]}}
+        return {"since": 1000, "data": {
+            "workspaces": [{"id": 1, "name": "One"}, {"id": 2, "name": "Two"}],
+            "clients": [{"id": 10, "wid": 1, "name": "ACME", "at": "a"}, {"id": 20, "wid": 2, "name": "ACME"}],
+            "projects": [{"id": 100, "wid": 1, "cid": 10, "name": "Imaging", "at": "a"},
+                         {"id": 101, "wid": 1, "name": "Unassigned", "at": "a"},
+                         {"id": 200, "wid": 2, "cid": 20, "name": "Imaging", "at": "a"}],
+        }}
+
+
+def test_client_project_ids_are_cached(tmp_path, monkeypatch):
+    monkeypatch.setenv("WWE_CACHE_DIR", str(tmp_path))
+    t = TogglWrap(token="870738agd54db0e63qfd943380ahbe8f")
+    t.toggl = FakeTogglAPI()
+
+    # every workspace in one request
+    assert t.get_client_project_ids() == {"ACME": {100, 200}}
+    assert t.toggl.calls == [None]
+    assert t.get_client_project_ids() == {"ACME": {100, 200}}
+    assert t.toggl.calls == [None]
+
+    # persisted across runs, and then only the changes are downloaded
+    t = TogglWrap(token="870738agd54db0e63qfd943380ahbe8f")
+    t.toggl = FakeTogglAPI()
+    assert t.get_catalog().project_ids("ACME") == {100, 200}
+    assert t.toggl.calls == []
+    assert t.get_catalog(ttl=0).project_ids("ACME") == {100, 200, 201}
+    assert t.toggl.calls == [1000]
+    assert t.get_catalog().since == 2000
+    assert [p["client"] for p in t._project_by_client("ACME")] == ["ACME"] * 3
+    assert t._client_by_id(20)["name"] == "ACME"
+
+
+def test_projects_of_new_entries_refresh_the_catalog(tmp_path, monkeypatch, make_entry):
+    import datetime
+    from tests.test_store import FakeAPI
+    from wwe.cli import get_project_ids
+    from wwe.store import EntryStore
+
+    monkeypatch.setenv("WWE_CACHE_DIR", str(tmp_path))
+    t = TogglWrap(token="870738agd54db0e63qfd943380ahbe8f", store=EntryStore(str(tmp_path / "entries.sqlite3")))
+    t.toggl = FakeTogglAPI()
+    assert get_project_ids("ACME", t) == {100, 200}
+
+    # an entry of a project created since the catalog was synced
+    start = datetime.datetime(2019, 3, 4, tzinfo=datetime.timezone.utc)
+    entry = make_entry(1, start, pid=201)
+    t.store.sync(FakeAPI([entry]), start=start)
+    assert get_project_ids("ACME", t) == {100, 200, 201}
+    assert t.toggl.calls == [None, 1000]
+    # known projects do not refresh it again
+    assert get_project_ids("ACME", t) == {100, 200, 201}
+    assert t.toggl.calls == [None, 1000]
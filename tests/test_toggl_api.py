@@ -0,0 +1,195 @@
+import datetime
+
+import pytest
+
+from wwe.entry import decode_time_entry, TimeEntry
+from wwe.ratelimit import parse_retry_after, TokenBucket
+import wwe.pagination as pagination
+import wwe.ratelimit as ratelimit
+from wwe.toggl_api import deserialize_toggl, MAX_RETRIES, split_years, TogglAPI, write_toggl_timestamp
+
+UTC = datetime.timezone.utc
+
+
+def test_split_years():
+    assert split_years(datetime.date(2016, 2, 29), datetime.date(2018, 1, 10)) == [
+        (datetime.date(2016, 2, 29), datetime.date(2017, 2, 28)),
+        (datetime.date(2017, 3, 1), datetime.date(2018, 1, 10)),
+    ]
+    assert split_years(datetime.date(2018, 1, 1), datetime.date(2018, 1, 1)) == [
+        (datetime.date(2018, 1, 1), datetime.date(2018, 1, 1))
+    ]
+    assert split_years(datetime.date(2018, 1, 2), datetime.date(2018, 1, 1)) == []
+
+
+class PagedAPI(TogglAPI):
+    """Serve time entries in pages, like Toggl."""
+
+    def __init__(self, entries, page_size):
+        super().__init__(api_token="870738agd54db0e63qfd943380ahbe8f")
+        self.entries = entries
+        self.page_size = page_size
+        self.requests = []
+
+    def get_items(self, section, params=None):
+        start_date = datetime.datetime.fromisoformat(params['start_date'])
+        end_date = datetime.datetime.fromisoformat(params['end_date']) if params['end_date'] else None
+        self.requests.append((start_date, end_date))
+        # like Toggl, both ends are included
+        matches = [e for e in self.entries
+                   if start_date <= e['start'] and (end_date is None or e['start'] <= end_date)]
+        return [dict(e, start=write_toggl_timestamp(e['start'])) for e in matches[:self.page_size]]
+
+
+def make_entries(starts):
+    return [{'id': i, 'wid': 1, 'start': start, 'duration': 60} for i, start in enumerate(starts)]
+
+
+def test_pagination_keeps_entries_sharing_a_second_and_stops_on_a_short_page(monkeypatch):
+    monkeypatch.setattr(pagination, 'TOGGL_PAGE_SIZE', 4)
+    start = datetime.datetime(2018, 1, 1, tzinfo=UTC)
+    # entries 3 to 5 start within the same second, across the first page boundary
+    starts = [start + datetime.timedelta(minutes=i) for i in range(3)] + [start + datetime.timedelta(hours=1)] * 3
+    api = PagedAPI(make_entries(starts), page_size=4)
+
+    result = list(api.get_time_entries(start_date=start))
+
+    assert [e.id for e in result] == list(range(6))
+    # the second page is short, so no empty page is requested after it
+    assert len(api.requests) == 2
+
+
+def test_concurrent_download_is_ordered_and_unique(monkeypatch):
+    monkeypatch.setattr(pagination, 'TOGGL_PAGE_SIZE', 50)
+    start = datetime.datetime(2018, 1, 1, tzinfo=UTC)
+    api = PagedAPI(make_entries(start + datetime.timedelta(days=i) for i in range(400)), page_size=50)
+
+    result = list(api.get_time_entries_concurrently(start, start + datetime.timedelta(days=400), workers=3))
+
+    assert [e.id for e in result] == list(range(400))
+    # windows are sized after the first page to hold 40 entries each
+    assert len(api.requests) == 1 + 9
+
+
+def test_sparse_history_is_downloaded_in_one_request(monkeypatch):
+    start = datetime.datetime(2018, 1, 1, tzinfo=UTC)
+    api = PagedAPI(make_entries(start + datetime.timedelta(days=i) for i in range(400)), page_size=1000)
+
+    result = list(api.get_time_entries_concurrently(start, start + datetime.timedelta(days=400)))
+
+    assert len(result) == 400
+    assert len(api.requests) == 1
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3
+    assert parse_retry_after(None, default=2) == 2
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+
+
+def test_decode_time_entry_matches_deserialize_toggl():
+    data = {"at": "2018-05-23T15:04:45+00:00",
+            "billable": False,
+            "description": "General",
+            "duration": 615,
+            "id": 880947808,
+            "pid": 97990658,
+            "start": "2018-05-23T14:54:29+00:00",
+            "stop": "2018-05-23T15:04:44+00:00",
+            "tags": ["software imaging"],
+            "wid": 1819588}
+    expected = deserialize_toggl(data)
+
+    entry = decode_time_entry(data)
+
+    for field in TimeEntry.__slots__:
+        assert entry[field] == (tuple(expected[field]) if field == 'tags' else expected[field])
+
+
+class FakeClock:
+    """Stand in for the `time` module of the rate limiter, sleeping instantly."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.ok = status_code < 400
+        self.text = f'status {status_code}'
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    """Answer requests with the given responses in turn, recording when each one was sent."""
+
+    def __init__(self, clock, responses):
+        self.clock = clock
+        self.responses = iter(responses)
+        self.sent_at = []
+
+    def get(self, url, params=None, stream=False):
+        self.sent_at.append(self.clock.now)
+        return next(self.responses)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit, 'time', clock)
+    return clock
+
+
+def make_api(clock, responses):
+    api = TogglAPI(api_token="870738agd54db0e63qfd943380ahbe8f")
+    api.session = FakeSession(clock, responses)
+    return api
+
+
+def test_request_is_retried_after_retry_after(clock):
+    api = make_api(clock, [FakeResponse(429, {'Retry-After': '0.2'}), FakeResponse(200)])
+    assert api._request('me').status_code == 200
+    assert api.session.sent_at == [0, pytest.approx(0.2)]
+
+
+def test_request_is_retried_with_exponential_backoff_without_retry_after(clock):
+    api = make_api(clock, [FakeResponse(429), FakeResponse(429), FakeResponse(200)])
+    assert api._request('me').status_code == 200
+    assert api.session.sent_at == [0, 1, 3]
+
+
+def test_request_gives_up_after_max_retries(clock):
+    api = make_api(clock, [FakeResponse(429, {'Retry-After': '1'})] * (MAX_RETRIES + 1))
+    with pytest.raises(ValueError, match='status 429'):
+        api._request('me')
+    assert len(api.session.sent_at) == MAX_RETRIES + 1
+
+
+def test_token_bucket_allows_a_burst_then_paces_requests(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    sent_at = []
+    for _ in range(6):
+        bucket.acquire()
+        sent_at.append(clock.now)
+    assert sent_at == [0, 0, 0, 0.5, 1, 1.5]
+
+
+def test_token_bucket_refills_after_a_pause(clock):
+    bucket = TokenBucket(rate=1, capacity=4)
+    bucket.pause(0.2)
+    sent_at = []
+    for _ in range(3):
+        bucket.acquire()
+        sent_at.append(clock.now)
+    # the first request goes out when the pause ends, and the bucket refills from then on
+    assert sent_at == [pytest.approx(0.2), pytest.approx(1.2), pytest.approx(2.2)]
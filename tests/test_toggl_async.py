@@ -0,0 +1,89 @@
+import asyncio
+import datetime
+
+import pytest
+
+import wwe.toggl_api as toggl_api
+import wwe.toggl_async as toggl_async
+
+web = pytest.importorskip("aiohttp.web")
+
+UTC = datetime.timezone.utc
+ENTRY = {"id": 1, "wid": 1, "pid": 100, "start": "2018-02-05T09:00:00+00:00", "stop": "2018-02-05T10:00:00+00:00",
+         "duration": 3600, "description": "General", "at": "2018-02-05T10:00:00+00:00"}
+
+
+async def serve(app):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def test_async_client(monkeypatch):
+    requests = []
+
+    async def me(request):
+        assert request.query["with_related_data"] == "true"
+        return web.json_response({"since": 1000, "data": {
+            "workspaces": [{"id": 1, "name": "Workspace"}],
+            "clients": [{"id": 10, "wid": 1, "name": "ACME"}],
+            "projects": [{"id": 100, "wid": 1, "cid": 10, "name": "Imaging"}],
+        }})
+
+    async def time_entries(request):
+        requests.append(request.query["start_date"])
+        if len(requests) == 1:
+            return web.Response(status=429, headers={"Retry-After": "0"})
+        return web.json_response([ENTRY] if len(requests) == 2 else [])
+
+    app = web.Application()
+    app.router.add_get("/me", me)
+    app.router.add_get("/time_entries", time_entries)
+
+    async def run():
+        runner, url = await serve(app)
+        monkeypatch.setattr(toggl_api, "TOGGL_API_URL", url)
+        monkeypatch.setattr(toggl_async, "TOGGL_REQUESTS_PER_SECOND", 1000)
+        try:
+            async with toggl_async.AsyncTogglAPI(api_token="870738agd54db0e63qfd943380ahbe8f") as toggl:
+                project_ids = (await toggl.sync_catalog(None)).client_project_ids()
+                start = datetime.datetime(2018, 2, 5, tzinfo=UTC)
+                entries = [entry async for entry in toggl.get_time_entries(start_date=start)]
+        finally:
+            await runner.cleanup()
+        return project_ids, entries
+
+    project_ids, entries = asyncio.run(run())
+
+    assert project_ids == {"ACME": {100}}
+    assert [entry.id for entry in entries] == [1]
+    # rate limited once, then a short page which needs no empty page after it
+    assert len(requests) == 2
+
+
+def test_sync_store_writes_every_window(monkeypatch, tmp_path):
+    import wwe.pagination as pagination
+    from benchmarks.standin import default_history, StandInServer
+    from wwe.store import EntryStore
+
+    history = default_history(300)
+    monkeypatch.setattr(pagination, "TOGGL_PAGE_SIZE", 40)
+    monkeypatch.setattr(toggl_async, "TOGGL_REQUESTS_PER_SECOND", 1e6)
+    store = EntryStore(str(tmp_path / "entries.sqlite3"))
+    start = datetime.datetime(2018, 2, 5, tzinfo=UTC)
+
+    async def run():
+        async with toggl_async.AsyncTogglAPI(api_token="870738agd54db0e63qfd943380ahbe8f") as toggl:
+            await toggl.sync_store(store, start=start)
+
+    with StandInServer(history, page_size=40) as server:
+        monkeypatch.setattr(toggl_api, "TOGGL_API_URL", f"{server.url}/api/v8")
+        asyncio.run(run())
+        # the whole history does not fit in a page, so it is downloaded in windows
+        assert server.requests_by_path["/api/v8/time_entries"] > 300 // 40
+
+    assert [entry.id for entry in store.entries(start)] == [history.entry(i)["id"] for i in range(300)]
+    assert store.synced_from == int(start.timestamp())
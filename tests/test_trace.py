@@ -0,0 +1,51 @@
+import json
+
+from click.testing import CliRunner
+
+import wwe.trace as trace
+from wwe.cli import main
+
+
+def test_disabled_tracing_records_nothing():
+    trace.disable()
+    assert trace.span('phase') is trace.NO_SPAN
+    with trace.span('phase'):
+        trace.count('requests')
+    assert 'requests' not in trace.counters
+
+
+def test_enabled_tracing_records_spans_and_counters(tmp_path):
+    trace.enable()
+    try:
+        with trace.span('outer', section='time_entries'):
+            with trace.span('inner'):
+                trace.count('requests')
+                trace.count('bytes received', 100)
+            trace.count('bytes received', 50)
+    finally:
+        trace.disable()
+    path = tmp_path / 'trace.json'
+    trace.write_trace(str(path))
+    document = json.loads(path.read_text())
+
+    spans = [event for event in document['traceEvents'] if event['ph'] == 'X']
+    assert [span['name'] for span in spans] == ['inner', 'outer']
+    assert spans[1]['args'] == {'section': 'time_entries'}
+    assert spans[1]['dur'] >= spans[0]['dur']
+    assert document['otherData']['counters'] == {'requests': 1, 'bytes received': 150}
+    assert set(document['otherData']['phases']) == {'inner', 'outer'}
+
+
+def test_profile_option_writes_trace(standin, tmp_path):
+    path = tmp_path / 'profile.json'
+    result = CliRunner().invoke(main, ['--profile', str(path)])
+    assert result.exit_code == 0, result.output
+    assert not trace.enabled
+
+    summary = json.loads(path.read_text())['otherData']
+    assert {'wwe', 'sync', 'client projects', 'http request', 'entries', 'holidays'} <= set(summary['phases'])
+    assert summary['counters']['requests'] == standin.requests
+    assert summary['counters']['bytes received'] == standin.bytes_sent
+    assert summary['counters']['entries downloaded'] >= 300
+    # the store only reads the entries of the 2 ACME projects, out of 3
+    assert summary['counters']['entries read'] == 200
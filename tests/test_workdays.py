@@ -0,0 +1,39 @@
+import datetime
+
+import pytest
+
+from wwe.workdays import count_weekend_days, HolidayIndex
+
+START = datetime.date(2018, 2, 5)
+
+
+@pytest.mark.parametrize("offset", range(0, 7))
+@pytest.mark.parametrize("length", [-1, 0, 1, 5, 6, 13, 100])
+def test_count_weekend_days(offset, length):
+    start = START + datetime.timedelta(days=offset)
+    end = start + datetime.timedelta(days=length)
+    expected = sum(1 for i in range(length + 1) if (start + datetime.timedelta(days=i)).weekday() > 4)
+    assert count_weekend_days(start, end) == expected
+
+
+def naive_holiday_amount(days, start, end):
+    return sum(fraction for day, fraction in days if start <= datetime.datetime.strptime(day, '%Y-%m-%d') <= end)
+
+
+@pytest.mark.parametrize("start, end", [
+    (datetime.datetime(2018, 6, 8), datetime.datetime(2018, 6, 8)),
+    (datetime.datetime(2018, 6, 8, 9), datetime.datetime(2018, 6, 20)),
+    (datetime.datetime(2018, 1, 1), datetime.datetime(2018, 12, 31, 18)),
+    (datetime.datetime(2018, 6, 21), datetime.datetime(2018, 6, 1)),
+    (datetime.datetime(2019, 1, 1), datetime.datetime(2019, 12, 31)),
+])
+def test_holiday_index_matches_linear_scan(start, end):
+    days = [["2018-06-08", 0.5], ["2018-06-20", 1], ["2018-12-24", 1], ["2018-06-08", 0.5], ["2018-12-31", 0.25]]
+    assert HolidayIndex(days).between(start, end) == naive_holiday_amount(days, start, end)
+
+
+def test_holiday_index_accepts_ordinals_and_dates():
+    index = HolidayIndex([(datetime.date(2018, 12, 25).toordinal(), 1), (datetime.date(2018, 12, 26), 0.5)])
+    assert len(index) == 2
+    assert index.between(datetime.date(2018, 12, 25), datetime.date(2018, 12, 26)) == 1.5
+    assert index.amount_until(datetime.date(2018, 12, 25).toordinal()) == 1
@@ -0,0 +1,112 @@
+import datetime
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+import wwe.trace as trace
+from wwe.config import Config, ConfigError, get_token_key, load_config
+
+# Balances computed at once, unless told otherwise
+DEFAULT_WORKERS = 8
+
+
+def get_members(config_paths: Iterable[str], tokens: Iterable[str],
+                base_config: Optional[Config]) -> List[Tuple[str, Config]]:
+    """Return the (label, config) of every person: one per config file, and one per token applied to `base_config`.
+
+    Tokens are labelled with their key rather than with the token itself, which must not be disclosed. A person
+    with several clients is listed once per client.
+    """
+    members = [(path, client) for path in config_paths for client in load_config(path).per_client()]
+    tokens = list(tokens)
+    if tokens and base_config is None:
+        raise ConfigError('a base configuration is needed to compute the balance of a token')
+    members += [(f'token {get_token_key(token)}', client._replace(toggl_token=token))
+                for token in tokens for client in base_config.per_client()]
+    return members
+
+
+def compute_member_balance(label: str, config: Config, options: dict, bank_holidays: List[int]) -> Dict:
+    """Return the balance of one person as a JSON serializable row.
+
+    This runs in a pool worker, possibly in another process, so every argument must be picklable and errors are
+    reported in the row rather than raised.
+    """
+    from wwe.cli import compute_balance, format_signed_balance
+
+    row = {'member': label, 'client': config.client.name}
+    try:
+        with trace.span('member balance', member=label):
+            to_work, worked = compute_balance(config, options, bank_holidays=bank_holidays)
+    except Exception as e:  # one broken config or token must not hide the balances of everybody else
+        return dict(row, error=f'{type(e).__name__}: {e}')
+    balance = worked - to_work
+    return dict(
+        row,
+        worked_seconds=int(worked.total_seconds()),
+        to_work_seconds=int(to_work.total_seconds()),
+        balance_seconds=int(balance.total_seconds()),
+        balance=format_signed_balance(balance),
+    )
+
+
+def compute_token_balances(members: List[Tuple[str, Config]], options: dict, bank_holidays: List[int]) -> List[Dict]:
+    """Return the balance rows of members sharing a Toggl token, computed one after the other.
+
+    Such members share the local store and catalog of the token: they are synced by the first balance computed, and
+    used as they are by the next ones (the store is only synced again to backfill an earlier start date).
+    """
+    rows = []
+    for label, config in members:
+        row = compute_member_balance(label, config, options, bank_holidays)
+        rows.append(row)
+        if 'error' not in row:
+            options = dict(options, refresh=False, max_age=datetime.timedelta.max)
+    return rows
+
+
+def make_pool(workers: int, processes: bool) -> Executor:
+    """Return a thread pool, or a process pool if the balances are CPU bound (e.g. long warm histories)."""
+    if processes:
+        return ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+    return ThreadPoolExecutor(max_workers=workers or DEFAULT_WORKERS)
+
+
+def compute_balances(members: List[Tuple[str, Config]], options: dict, bank_holidays: List[int],
+                     workers: int = 0, processes: bool = False) -> List[Dict]:
+    """Return the balance rows of many people, computed in parallel, in the order of `members`.
+
+    The bank holidays are loaded once by the caller and shared by every balance. Members sharing a token (e.g. the
+    clients of one person) are computed in turn by the same worker, see `compute_token_balances`, so that the store
+    and catalog of a token are never synced twice at once.
+    """
+    groups: Dict[str, List[int]] = {}
+    for index, (_, config) in enumerate(members):
+        groups.setdefault(config.toggl_token, []).append(index)
+    rows: List[Optional[Dict]] = [None] * len(members)
+    with make_pool(workers, processes) as pool:
+        futures = [(indexes, pool.submit(compute_token_balances, [members[index] for index in indexes], options,
+                                         bank_holidays))
+                   for indexes in groups.values()]
+        for indexes, future in futures:
+            for index, row in zip(indexes, future.result()):
+                rows[index] = row
+    return rows
+
+
+def format_balance_table(rows: List[Dict]) -> str:
+    """Return balance rows as a plain text table."""
+    def hours(seconds):
+        return f'{seconds / 3600:.2f}'
+
+    header = ('member', 'client', 'worked h', 'to work h', 'balance')
+    lines = [header]
+    for row in rows:
+        if 'error' in row:
+            lines.append((row['member'], row['client'], '', '', row['error']))
+        else:
+            lines.append((row['member'], row['client'], hours(row['worked_seconds']), hours(row['to_work_seconds']),
+                          row['balance']))
+    widths = [max(len(line[column]) for line in lines) for column in range(len(header) - 1)]
+    return '\n'.join(
+        '  '.join([cell.ljust(width) for cell, width in zip(line, widths)] + [line[-1]]).rstrip() for line in lines
+    )
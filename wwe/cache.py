@@ -0,0 +1,38 @@
+import json
+import os
+import tempfile
+from typing import Any, Optional
+from wwe.config import get_default_cache_dir, get_token_key
+
+
+def get_cache_path(name: str, token: str = None) -> str:
+    """Return the path of a cache file in the cache folder.
+
+    If a `token` is passed the file name is suffixed with its key, so that different Toggl accounts never share
+    cached data.
+    """
+    if token:
+        stem, extension = os.path.splitext(name)
+        name = f'{stem}-{get_token_key(token)}{extension}'
+    return os.path.join(get_default_cache_dir(), name)
+
+
+def read_json_cache(path: str) -> Optional[Any]:
+    """Return the data cached in `path`, or None if it does not exist or is corrupt."""
+    try:
+        with open(path) as fd:
+            return json.load(fd)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json_cache(path: str, data: Any) -> None:
+    """Write `data` to `path` atomically, so that concurrent runs (or threads) never read half a file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as file:
+            json.dump(data, file)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
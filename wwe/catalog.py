@@ -0,0 +1,185 @@
+import click
+import collections
+import time
+from typing import Dict, Optional, Set
+import wwe.log as log
+from wwe.cache import get_cache_path, read_json_cache, write_json_cache
+
+# Bump whenever the persisted format changes: catalogs with another version are downloaded again
+CATALOG_VERSION = 1
+# Catalogs synced longer ago than this (in seconds) are refreshed with the changes since their last sync
+CATALOG_TTL = 24 * 3600
+
+# Fields kept of every kind of object, the rest of what Toggl returns is not used by wwe
+WORKSPACE_FIELDS = ('id', 'name', 'at')
+CLIENT_FIELDS = ('id', 'wid', 'name', 'at')
+PROJECT_FIELDS = ('id', 'wid', 'cid', 'name', 'active', 'at')
+
+
+def pick(obj: dict, fields) -> dict:
+    """Return the given fields of a Toggl object, leaving out the missing ones."""
+    return {field: obj[field] for field in fields if field in obj}
+
+
+class Catalog:
+    """Workspaces, clients and projects of every workspace of a Toggl account, indexed by ID and by name.
+
+    Every lookup is a dictionary access. The catalog is filled from the ``me`` endpoint with related data, which
+    returns the objects of all the workspaces in one request, and later updated with the objects changed since the
+    previous sync only (``since``). Client and project names are not unique across workspaces, so name lookups
+    return sets of IDs.
+    """
+
+    def __init__(self):
+        """Create empty catalog."""
+        self.since: Optional[int] = None
+        self.synced_at: Optional[float] = None
+        self.workspaces: Dict[int, dict] = {}
+        self.clients: Dict[int, dict] = {}
+        self.projects: Dict[int, dict] = {}
+        self.client_ids_by_name: Dict[str, Set[int]] = collections.defaultdict(set)
+        self.project_ids_by_name: Dict[str, Set[int]] = collections.defaultdict(set)
+        self.project_ids_by_client_id: Dict[Optional[int], Set[int]] = collections.defaultdict(set)
+
+    def __len__(self) -> int:
+        """Return the number of workspaces, clients and projects."""
+        return len(self.workspaces) + len(self.clients) + len(self.projects)
+
+    @staticmethod
+    def _unindex(index: Dict, key, object_id: int) -> None:
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(object_id)
+            if not ids:
+                del index[key]
+
+    def _remove(self, kind: str, object_id: int) -> bool:
+        old = getattr(self, kind).pop(object_id, None)
+        if old is None:
+            return False
+        if kind == 'clients':
+            self._unindex(self.client_ids_by_name, old['name'], object_id)
+        elif kind == 'projects':
+            self._unindex(self.project_ids_by_name, old['name'], object_id)
+            self._unindex(self.project_ids_by_client_id, old.get('cid'), object_id)
+        return True
+
+    def _put(self, kind: str, obj: dict) -> bool:
+        """Add or replace an object, and return false if it did not change since it was stored (same ``at``)."""
+        old = getattr(self, kind).get(obj['id'])
+        if old is not None:
+            if 'at' in obj and old.get('at') == obj['at']:
+                return False
+            self._remove(kind, obj['id'])
+        getattr(self, kind)[obj['id']] = obj
+        if kind == 'clients':
+            self.client_ids_by_name[obj['name']].add(obj['id'])
+        elif kind == 'projects':
+            self.project_ids_by_name[obj['name']].add(obj['id'])
+            self.project_ids_by_client_id[obj.get('cid')].add(obj['id'])
+        return True
+
+    def update(self, workspaces=(), clients=(), projects=()) -> int:
+        """Add, replace or remove (if deleted in Toggl) objects as returned by Toggl, and return how many changed."""
+        changed = 0
+        for kind, objects, fields in (('workspaces', workspaces, WORKSPACE_FIELDS),
+                                      ('clients', clients, CLIENT_FIELDS),
+                                      ('projects', projects, PROJECT_FIELDS)):
+            for obj in objects or ():
+                if obj.get('server_deleted_at'):
+                    changed += self._remove(kind, obj['id'])
+                else:
+                    changed += self._put(kind, pick(obj, fields))
+        return changed
+
+    def apply_me(self, response: dict, now: float = None) -> int:
+        """Merge the response of the ``me`` endpoint with related data, and return how many objects changed.
+
+        The ``since`` timestamp of the response is kept, to ask for the next changes only.
+        """
+        data = response.get('data') or {}
+        changed = self.update(data.get('workspaces'), data.get('clients'), data.get('projects'))
+        self.since = response.get('since', self.since)
+        self.synced_at = time.time() if now is None else now
+        return changed
+
+    def is_stale(self, ttl: float = CATALOG_TTL, now: float = None) -> bool:
+        """Return true if the catalog was never synced, or longer than `ttl` seconds ago."""
+        if self.synced_at is None:
+            return True
+        return (time.time() if now is None else now) - self.synced_at >= ttl
+
+    def client_ids(self, name: str) -> Set[int]:
+        """Return the IDs of the clients with a given name, in any workspace."""
+        return self.client_ids_by_name.get(name, set())
+
+    def project_ids(self, client_name: str) -> Set[int]:
+        """Return the IDs of the projects of every client with a given name, in any workspace."""
+        project_ids = set()
+        for client_id in self.client_ids(client_name):
+            project_ids |= self.project_ids_by_client_id.get(client_id, set())
+        return project_ids
+
+    def client_project_ids(self) -> Dict[str, Set[int]]:
+        """Return the IDs of the projects of every client, by client name."""
+        return {name: self.project_ids(name) for name in self.client_ids_by_name}
+
+    def project_name(self, project_id: Optional[int]) -> Optional[str]:
+        """Return the name of a project, or None if it is not known."""
+        project = self.projects.get(project_id)
+        return project['name'] if project else None
+
+    def to_json(self) -> dict:
+        """Return the catalog as JSON serializable data."""
+        return {
+            'version': CATALOG_VERSION,
+            'since': self.since,
+            'synced_at': self.synced_at,
+            'workspaces': list(self.workspaces.values()),
+            'clients': list(self.clients.values()),
+            'projects': list(self.projects.values()),
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> Optional['Catalog']:
+        """Return the catalog stored by `to_json`, or None if it was stored by another version of wwe."""
+        if not isinstance(data, dict) or data.get('version') != CATALOG_VERSION:
+            return None
+        catalog = cls()
+        catalog.update(data['workspaces'], data['clients'], data['projects'])
+        catalog.since, catalog.synced_at = data['since'], data['synced_at']
+        return catalog
+
+
+def get_catalog_path(token: str) -> str:
+    """Return the path of the persisted catalog of a Toggl account."""
+    return get_cache_path('catalog.json', token=token)
+
+
+def load_catalog(token: str) -> Optional[Catalog]:
+    """Return the persisted catalog of a Toggl account, or None if there is none."""
+    catalog = Catalog.from_json(read_json_cache(get_catalog_path(token)))
+    if catalog is not None and log.verbose:
+        click.echo('Loading clients and projects from cache...')
+    return catalog
+
+
+def save_catalog(token: str, catalog: Catalog) -> None:
+    """Persist the catalog of a Toggl account."""
+    write_json_cache(get_catalog_path(token), catalog.to_json())
+
+
+def sync_catalog(catalog: Optional[Catalog], me: dict) -> Catalog:
+    """Return `catalog` updated with a ``me`` response, or a new catalog if it is None."""
+    if catalog is None:
+        catalog = Catalog()
+    changed = catalog.apply_me(me)
+    if log.verbose:
+        click.echo(f'{changed} workspaces, clients or projects added, updated or removed')
+    return catalog
+
+
+def project_label(catalog: Optional[Catalog], project_id: Optional[int]) -> str:
+    """Return the name of a project for reports, falling back to its ID."""
+    name = catalog.project_name(project_id) if catalog is not None else None
+    return name if name is not None else str(project_id)
@@ -1,16 +1,24 @@
 import click
-from colorama import init, Fore, Style
 import datetime
-import functools
-from typing import List
-from wwe.toggl import TogglWrap
-from wwe.config import load_config
-from wwe.gov import gov_uk_bank_holidays_between
+import itertools
+from typing import List, Optional, Tuple
+from wwe.toggl import ensure_datetime_timezone, TogglWrap
+from wwe.workdays import count_weekend_days, HolidayIndex
+from wwe.catalog import Catalog
+from wwe.config import Config, ConfigError, load_config
+from wwe.entry import TimeEntry
+from wwe.filters import EntryFilter
+from wwe.gov import load_bank_holidays
+from wwe.store import EntryStore, open_store
 import wwe.log as log
+import wwe.trace as trace
 from wwe.log import format_log, set_verbose_mode
+from wwe.report import Aggregator
 
 
 DATE_INPUT_FORMAT = '%Y-%m-%d'
+# (client config, time to work, time worked)
+ClientBalance = Tuple[Config, datetime.timedelta, datetime.timedelta]
 # (start, end)
 # (00:00:00, 23:59:59)
 # (08:30:00, 16:00:00)
@@ -45,83 +53,57 @@ def filter_out_non_working_hours(times):  # TODO: what's this?
         pass
 
 
-def get_project_ids(target_client: str, t: TogglWrap) -> set:
+def get_project_ids(target_client: str, t: TogglWrap, refresh: bool = False) -> set:
     """Return all project IDs accross all workspaces for a given client.
 
     Args:
         target_client (str): name of the client from whom to get the projects.
         t (TogglWrap): Toggl client wrapper.
+        refresh (bool): ignore the cached clients and projects and fetch them again.
     """
-    work_projects = set()
-    for workspace in t.toggl.get_workspaces():
-        workspace_id = workspace['id']
-        clients = t.toggl.get_clients(workspace_id=workspace_id)
-        projects = t.toggl.get_projects(workspace_id=workspace_id)
-        for client in clients:
-            client_name = client['name']
-            if target_client != client_name:
-                continue
-            client_id = client['id']
-            for project in projects:
-                project_client = project.get('cid')
-                if project_client != client_id:
-                    continue
-                work_projects.add(project['id'])
-    return work_projects
+    catalog = t.get_catalog(refresh=refresh)
+    if not refresh and (not catalog.client_ids(target_client) or has_unknown_projects(catalog, t.store)):
+        # the client or some projects may have been created since the catalog was synced, only the changes are
+        # downloaded
+        catalog = t.get_catalog(ttl=0)
+    return catalog.project_ids(target_client)
+
+
+def has_unknown_projects(catalog: Catalog, store: Optional[EntryStore]) -> bool:
+    """Return true if the entries changed by the last sync of the store belong to projects missing in the catalog."""
+    if store is None or store.changed_from is None:
+        return False
+    return not store.project_ids(start=store.changed_from) <= catalog.projects.keys()
 
 
-def is_work(entry: dict, work_projects: List[str]):
+def is_work(entry: TimeEntry, work_projects: List[str]):
     """Return true if the entrie belongs to any of the work_projects."""
-    if entry['pid'] in work_projects:
+    if entry.pid in work_projects:
         return True
     return False
 
 
 def get_weekend_days_between(start: datetime.datetime, end: datetime.datetime) -> int:
     """Return the number of weekend days between two given dates."""
-    result = 0
-    current_date = start
-    while current_date <= end:
-        if current_date.weekday() > 4:
-            result += 1
-        current_date += datetime.timedelta(days=1)
-    return result
-
-
-def get_holiday_amount(days: any, start: datetime.datetime, end: datetime.datetime) -> float:
-    """Return the number of holidays between two given dates.
+    if end < start:
+        return 0
+    # only the days which are a whole number of days after `start` count, like `start + n days <= end`
+    last_day = start + datetime.timedelta(days=(end - start).days)
+    return count_weekend_days(start.date(), last_day.date())
 
-    Any dates later than the current date are ignored, as they
-    represent booked annual leaves for the future.
 
-    Example of 'day' argument values: ["2018-11-07", 1], ["2018-11-08", 0.5]...
+def get_holiday_index(config: Config, bank_holidays: List[int] = None) -> HolidayIndex:
+    """Return one index of every day off: personal holidays, company bonus days and UK bank holidays.
 
-    :param days: list of tuples, as shown above
-    :param start: date from which to start counting (included)
-    :param end: last date to be included in the count
-    :returns: number of personal holidays
+    Each query of the index costs a bisection, so it should be built once and queried for every range needed. The
+    bank holiday ordinals are loaded unless given, e.g. when they are shared by the balances of several people.
     """
-    result = 0
-    for day in days:
-        current_day = datetime.datetime.strptime(day[0], '%Y-%m-%d')
-        if start <= current_day <= end:
-            result += float(day[1])
-    return result
-
-
-def get_personal_holidays_between(config: any, start: datetime.datetime, end: datetime.datetime) -> float:
-    """Return the number of days off booked by a person between two given dates."""
-    if log.verbose:
-        click.echo('Loading personal holidays from configuration file...')
-    personal_holidays = config['personal_holidays']
-    return get_holiday_amount(personal_holidays, start, end)
-
-
-def get_company_holidays_between(config: any, start: datetime.datetime, end: datetime.datetime) -> float:
-    """Return the number of extra days off a by a person between two given dates."""
     if log.verbose:
-        click.echo('Loading company holidays from configuration file...')
-    return get_holiday_amount(config['company_bonus_days'], start, end)
+        click.echo('Loading personal and company holidays from configuration file...')
+    if bank_holidays is None:
+        bank_holidays = load_bank_holidays()
+    bank_holidays = ((ordinal, 1) for ordinal in bank_holidays)
+    return HolidayIndex(itertools.chain(config.personal_holidays, config.company_bonus_days, bank_holidays))
 
 
 def format_balance(delta: datetime.timedelta) -> str:
@@ -147,66 +129,519 @@ def format_balance(delta: datetime.timedelta) -> str:
     return result
 
 
+def format_signed_balance(balance: datetime.timedelta) -> str:
+    """Return a formated balance with its sign, e.g. '+1h, 30min' or '-2d, 4h'."""
+    return ('-' if balance < datetime.timedelta() else '+') + (format_balance(abs(balance)) or '0min')
+
+
+def format_balance_message(to_work: datetime.timedelta, worked: datetime.timedelta) -> str:
+    """Return the balance message, coloured depending on whether the balance is positive or negative."""
+    from colorama import Fore, Style
+
+    if to_work > worked:
+        balance = format_balance(to_work - worked)
+        coloured_balance = Fore.RED + balance + Style.RESET_ALL
+        return f"You need to work {coloured_balance} more today"
+    balance = format_balance(worked - to_work)
+    coloured_balance = Fore.GREEN + balance + Style.RESET_ALL
+    return f"You have worked {coloured_balance} extra so far"
+
+
 def print_balance(to_work: datetime.datetime, worked: datetime.datetime):
     """Format balance and print it on screen.
 
     This function considers whether the balance is positive or negative, and format it consequently.
     """
-    if to_work > worked:
-        balance = format_balance(to_work - worked)
-        coloured_balance = Fore.RED + balance + Style.RESET_ALL
-        click.echo(f"You need to work {coloured_balance} more today")
-    else:
-        balance = format_balance(worked - to_work)
-        coloured_balance = Fore.GREEN + balance + Style.RESET_ALL
-        click.echo(f"You have worked {coloured_balance} extra so far")
+    click.echo(format_balance_message(to_work, worked))
+
 
+def get_time_to_work(config: Config, holidays: HolidayIndex, start: datetime.datetime,
+                     end: datetime.datetime) -> datetime.timedelta:
+    """Return the time to work from the start date until the end date (included)."""
+    weekend_days = get_weekend_days_between(start, end)
+    full_timespan = end - start
+    days_to_work = full_timespan.days + 1 \
+        - holidays.between(start, end) \
+        - weekend_days
+    hours_to_work = days_to_work * config.working_day_hours
+    return datetime.timedelta(seconds=(hours_to_work * 3600))
 
-@click.command()
+
+def open_toggl(config: Config, options: dict, start: datetime.datetime,
+               t: TogglWrap = None) -> Tuple[TogglWrap, bool, datetime.timedelta]:
+    """Return a Toggl wrapper reading time entries from the local store, and the refresh and max age to read with.
+
+    If the ``asyncio`` option is set, everything is downloaded concurrently in one event loop first, and the local
+    data is then used as it is. Long running processes pass the wrapper `t` they keep, with its store, rather than
+    opening new ones.
+    """
+    refresh, max_age = options['refresh'], options['max_age']
+    store = t.store if t is not None else open_store(token=config.toggl_token)
+    if options['asyncio']:
+        aware_start = ensure_datetime_timezone(start)
+        if max_age is None or not store.is_fresh(start=aware_start, max_age=max_age):
+            import asyncio
+            from wwe.toggl_async import prefetch
+
+            with trace.span('prefetch'):
+                asyncio.run(prefetch(token=config.toggl_token, store=store, start=aware_start, refresh=refresh))
+        # everything is in the local caches now
+        refresh, max_age = False, datetime.timedelta.max
+    return t or TogglWrap(token=config.toggl_token, store=store), refresh, max_age
+
+
+def get_work_entries(config: Config, options: dict, start: datetime.datetime, end: datetime.datetime = None,
+                     t: TogglWrap = None):
+    """Return the time entries of the configured client started between two dates (end excluded).
+
+    If the ``max_age`` option is set and the local data is younger than it, no request is sent to Toggl.
+    """
+    t, refresh, max_age = open_toggl(config, options, start, t=t)
+    # synced first, so that the projects of new entries are known
+    t.sync_store(start=start, max_age=max_age)
+    with trace.span('client projects'):
+        project_ids = get_project_ids(target_client=config.client.name, t=t, refresh=refresh)
+    entry_filter = EntryFilter.create(project_ids=project_ids, tags=options['tags'], billable=options['billable'])
+    return t.get_filtered_entries(start=start, end=end, max_age=max_age, entry_filter=entry_filter)
+
+
+def get_entries_work_time(config: Config, options: dict, start: datetime.datetime,
+                          end: datetime.datetime = None, t: TogglWrap = None) -> datetime.timedelta:
+    """Return the time worked for the configured client between two dates (end excluded), summing every entry."""
+    worked = datetime.timedelta()
+    matched = 0
+    with trace.span('entries'):
+        for entry in get_work_entries(config, options, start=start, end=end, t=t):
+            duration = entry.duration
+            if log.verbose:
+                click.echo(format_log(entry))
+
+            # unfinished time entries have negative durations
+            if entry.is_running:
+                tz = entry.start.tzinfo
+                now = datetime.datetime.now(tz)
+                duration = now - entry.start
+            worked += duration
+            matched += 1
+    trace.count('entries matched', matched)
+    return worked
+
+
+def get_summary_work_time(config: Config, options: dict, start: datetime.datetime,
+                          end: datetime.datetime = None, t: TogglWrap = None) -> datetime.timedelta:
+    """Return the time worked for the configured client between two dates (end included), totalled by Toggl.
+
+    Only a few summary reports are downloaded instead of every time entry. Reports leave out the running entry, so
+    it is requested on its own and counted until now, unless an end date is set.
+    """
+    t = t or TogglWrap(token=config.toggl_token)
+    with trace.span('client projects'):
+        project_ids = get_project_ids(target_client=config.client.name, t=t, refresh=options['refresh'])
+    until = end.date() if end else datetime.date.today()
+    with trace.span('summary'):
+        worked = t.get_client_summary_time(config.client.name, since=start.date(), until=until)
+    if end is None:
+        running = t.toggl.get_current_time_entry()
+        if running is not None and running.pid in project_ids:
+            if log.verbose:
+                click.echo(format_log(running))
+            worked += datetime.datetime.now(running.start.tzinfo) - running.start
+    return worked
+
+
+@click.group(invoke_without_command=True)
 @click.option('--verbose', '-v', is_flag=True, default=False, help='Enable logging')
 @click.option('--end', '-e', type=click.DateTime([DATE_INPUT_FORMAT]), help='End date (included)')
-def main(verbose: bool, end: datetime.datetime):
-    """Run main function."""
+@click.option('--refresh', is_flag=True, default=False, help='Discard locally cached data and download it again')
+@click.option('--max-age', type=int, envvar='WWE_MAX_AGE',
+              help='Use local data synced less than MAX_AGE seconds ago without contacting Toggl')
+@click.option('--asyncio', 'use_asyncio', is_flag=True, default=False,
+              help='Download everything concurrently in one asyncio event loop (requires aiohttp)')
+@click.option('--tag', '-t', 'tags', multiple=True, help='Only count entries with this tag (can be repeated)')
+@click.option('--billable/--non-billable', default=None, help='Only count billable, or non billable, entries')
+@click.option('--summary', is_flag=True, default=False,
+              help='Let Toggl total the time worked with summary reports instead of downloading every entry')
+@click.option('--no-daemon', is_flag=True, default=False, help='Do not ask a running `wwe daemon` for the balance')
+@click.option('--profile', type=click.Path(dir_okay=False, writable=True),
+              help='Write the time spent per phase, requests, bytes and entries as a Chrome trace to PROFILE')
+@click.pass_context
+def main(ctx: click.Context, verbose: bool, end: datetime.datetime, refresh: bool, max_age: int, use_asyncio: bool,
+         tags: List[str], billable: bool, summary: bool, no_daemon: bool, profile: str):
+    """Run main function.
+
+    Without a command, print the current work hour balance. If a `wwe daemon` is running, it answers instead.
+    """
+    from colorama import init
+
+    if summary and (tags or billable is not None):
+        raise click.UsageError('--summary cannot be combined with --tag, --billable or --non-billable')
     set_verbose_mode(verbose)
+    if profile:
+        start_profile(ctx, profile)
     init()  # initialize colorama package
-    config = load_config()
-    start = datetime.datetime.strptime(config['client']['start_date'], DATE_INPUT_FORMAT)
-    adjusted_end = end + datetime.timedelta(days=1) if end else None
+    max_age = datetime.timedelta(seconds=max_age) if max_age is not None else None
+    ctx.obj = {'end': end, 'refresh': refresh, 'max_age': max_age, 'asyncio': use_asyncio, 'tags': tags,
+               'billable': billable, 'summary': summary}
+    if ctx.invoked_subcommand is None:
+        config = prepare_config(ctx.obj)
+        # the daemon only keeps the unfiltered balance of a single client
+        daemon_knows = not (tags or billable is not None or summary or config.contracts)
+        if daemon_knows and not (no_daemon or profile or end or refresh):
+            from wwe.daemon import query_daemon
+
+            answer = query_daemon(config)
+            if answer is not None:
+                click.echo(answer)
+                return
+        balance(config=config, options=ctx.obj)
+
+
+def start_profile(ctx: click.Context, path: str) -> None:
+    """Enable tracing for the whole command, and write the trace to `path` when the command ends."""
+    trace.enable()
+    root = trace.span('wwe', command=ctx.invoked_subcommand or 'balance')
+    root.__enter__()
+
+    def write_profile():
+        root.__exit__(None, None, None)
+        trace.disable()
+        trace.write_trace(path)
+        if log.verbose:
+            click.echo(f'Profile written to "{path}"')
+
+    ctx.call_on_close(write_profile)
+
+
+def prepare_config(options: dict) -> Config:
+    """Load the configuration and apply the options shared by all commands."""
+    try:
+        config = load_config()
+    except ConfigError as e:
+        raise click.ClickException(str(e))
+    end = options['end']
     if end and datetime.datetime.now() < end:
         click.echo(f'{end.strftime(DATE_INPUT_FORMAT)} is a future date. Sorry, not supported')
-    t = TogglWrap(token=config['toggl_token'])
-    project_ids = get_project_ids(target_client=config['client']['name'], t=t)
-    filters = [functools.partial(is_work, work_projects=project_ids)]
+    if options['refresh']:
+        open_store(token=config.toggl_token).clear()
+        load_bank_holidays(ttl=datetime.timedelta(0))
+    return config
 
-    worked = datetime.timedelta()
-    for entry in t.get_filtered_entries(filters=filters, start=start, end=adjusted_end):
-        duration = entry['duration']
+
+def select_client(config: Config, name: Optional[str] = None) -> Config:
+    """Return the configuration of the client called `name`, or of the only configured client.
+
+    Commands working on a single client fail if several are configured and none was chosen, instead of silently
+    using the first one.
+    """
+    clients = {client.client.name: client for client in config.per_client()}
+    if name is None and len(clients) > 1:
+        raise click.UsageError(f'several clients are configured, choose one with --client: {", ".join(clients)}')
+    if name is not None and name not in clients:
+        raise click.UsageError(f'no client named "{name}" is configured, choose one of: {", ".join(clients)}')
+    return config if name is None else clients[name]
+
+
+def compute_balance(config: Config, options: dict, bank_holidays: List[int] = None,
+                    t: TogglWrap = None) -> Tuple[datetime.timedelta, datetime.timedelta]:
+    """Return the (time to work, time worked) from the client start date until the end date (included).
+
+    With the ``summary`` option, the time worked is totalled by Toggl instead of summing every entry.
+    """
+    end = options['end']
+    start = config.client.start_date
+    adjusted_end = end + datetime.timedelta(days=1) if end else None
+
+    if options.get('summary'):
+        worked = get_summary_work_time(config, options, start, end=end, t=t)
+    else:
+        worked = get_entries_work_time(config, options, start, end=adjusted_end, t=t)
+
+    end = datetime.datetime.now() if end is None else end
+    with trace.span('holidays'):
+        holidays = get_holiday_index(config, bank_holidays=bank_holidays)
         if log.verbose:
-            click.echo(format_log(entry))
+            click.echo('Calculating current work hour balance...')
+        to_work = get_time_to_work(config, holidays, start, end)
+    return to_work, worked
 
-        # unfinished time entries have negative durations
-        if duration.days < 0:
-            tz = entry['start'].tzinfo
-            now = datetime.datetime.now(tz)
-            duration = now - entry['start']
-        worked += duration
+
+def compute_client_balances(config: Config, options: dict, bank_holidays: List[int] = None,
+                            t: TogglWrap = None) -> List[ClientBalance]:
+    """Return the (client config, time to work, time worked) of every configured client.
+
+    The entries of all the clients are read in a single pass from the earliest start date, and every entry is added
+    to the balance of the client its project belongs to.
+    """
+    clients = config.per_client()
+    if len(clients) == 1 or options.get('summary'):
+        return [(client, *compute_balance(client, options, bank_holidays=bank_holidays, t=t)) for client in clients]
+
+    end = options['end']
+    start = min(client.client.start_date for client in clients)
+    adjusted_end = end + datetime.timedelta(days=1) if end else None
+    t, refresh, max_age = open_toggl(config, options, start, t=t)
+    t.sync_store(start=start, max_age=max_age)
+    with trace.span('client projects'):
+        owners = {}
+        for index, client in enumerate(clients):
+            # the first lookup refreshes the catalog if needed, the next ones read it
+            for project_id in get_project_ids(client.client.name, t=t, refresh=refresh and index == 0):
+                owners.setdefault(project_id, index)
+    entry_filter = EntryFilter.create(project_ids=owners, tags=options['tags'], billable=options['billable'])
+
+    starts = [ensure_datetime_timezone(client.client.start_date) for client in clients]
+    worked = [datetime.timedelta()] * len(clients)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    with trace.span('entries'):
+        for entry in t.get_filtered_entries(start=start, end=adjusted_end, max_age=max_age, entry_filter=entry_filter):
+            index = owners[entry.pid]
+            if entry.start < starts[index]:
+                continue
+            if log.verbose:
+                click.echo(format_log(entry))
+            # unfinished time entries have negative durations
+            worked[index] += now - entry.start if entry.is_running else entry.duration
 
     end = datetime.datetime.now() if end is None else end
-    bank_holidays = gov_uk_bank_holidays_between(start, end)
-    weekend_days = get_weekend_days_between(start, end)
-    personal_holidays = get_personal_holidays_between(config, start, end)
-    company_holidays = get_company_holidays_between(config, start, end)
-    full_timespan = end - start
-    if log.verbose:
-        click.echo('Calculating current work hour balance...')
-    days_to_work = full_timespan.days + 1 \
-        - bank_holidays \
-        - weekend_days \
-        - personal_holidays \
-        - company_holidays
-    hours_to_work = days_to_work * config['working_day_hours']
-    to_work = datetime.timedelta(seconds=(hours_to_work * 3600))
-    print_balance(to_work, worked)
+    with trace.span('holidays'):
+        if bank_holidays is None:
+            bank_holidays = load_bank_holidays()
+        to_work = [get_time_to_work(client, get_holiday_index(client, bank_holidays=bank_holidays),
+                                    client.client.start_date, end) for client in clients]
+    return list(zip(clients, to_work, worked))
+
+
+def balance(config: Config, options: dict):
+    """Print the work hour balance from the client start date until the end date (included).
+
+    If several clients are configured, one balance is printed per client.
+    """
+    if not config.contracts:
+        print_balance(*compute_balance(config, options))
+        return
+    for client, to_work, worked in compute_client_balances(config, options):
+        click.echo(f'{client.client.name}: {format_balance_message(to_work, worked)}')
+
+
+def compute_history(config: Config, options: dict, bank_holidays: List[int] = None) -> List[dict]:
+    """Return the cumulative balance at the end of every day from the client start date until the end date.
+
+    Entries are read once and bucketed by day, instead of computing a whole balance for every day.
+    """
+    from wwe.history import balance_history, bucket_by_start_day
+
+    end = options['end']
+    start = config.client.start_date
+    adjusted_end = end + datetime.timedelta(days=1) if end else None
+    with trace.span('entries'):
+        worked_by_day = bucket_by_start_day(get_work_entries(config, options, start=start, end=adjusted_end))
+    with trace.span('holidays'):
+        holidays = get_holiday_index(config, bank_holidays=bank_holidays)
+
+    def to_work_until(day: datetime.date) -> datetime.timedelta:
+        return get_time_to_work(config, holidays, start, datetime.datetime.combine(day, datetime.time()))
+
+    last = end.date() if end else datetime.date.today()
+    return balance_history(worked_by_day, to_work_until, start.date(), last, format_balance=format_signed_balance)
+
+
+def compute_forecast(config: Config, options: dict, bank_holidays: List[int] = None):
+    """Return today's balance forecast of the configured client.
+
+    Entries are read once and split into the closed days and today, so the forecast answers any time of today
+    without reading them again.
+    """
+    from wwe.forecast import Forecast
+
+    start = config.client.start_date
+    today = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    with trace.span('holidays'):
+        holidays = get_holiday_index(config, bank_holidays=bank_holidays)
+        to_work = get_time_to_work(config, holidays, start, today)
+        to_work_before = datetime.timedelta()
+        if start < today:
+            to_work_before = get_time_to_work(config, holidays, start, today - datetime.timedelta(days=1))
+    with trace.span('entries'):
+        return Forecast.from_entries(get_work_entries(config, options, start=start), midnight=today.astimezone(),
+                                     to_work_before_today=to_work_before, to_work_today=to_work - to_work_before)
+
+
+def print_report_section(title: str, rows) -> None:
+    """Print a report table with one row per (label, worked time)."""
+    click.echo(title)
+    for label, worked in rows:
+        click.echo(f'  {label:<12} {format_balance(worked) or "0min"}')
+
+
+# commands working on a single client
+client_option = click.option('--client', '-c', 'client_name', help='Client to use, if several are configured')
+
+
+@main.command()
+@click.option('--start', '-s', type=click.DateTime([DATE_INPUT_FORMAT]),
+              help='Start date (included), defaults to the client start date')
+@click.option('--by', '-b', 'groupings', type=click.Choice(['day', 'week', 'project']), multiple=True,
+              help='Breakdown to print, all of them by default')
+@client_option
+@click.pass_obj
+def report(obj: dict, start: datetime.datetime, groupings: List[str], client_name: Optional[str]):
+    """Print the time worked per day, per week and per project."""
+    config, end = select_client(prepare_config(obj), client_name), obj['end']
+    start = start or config.client.start_date
+    adjusted_end = end + datetime.timedelta(days=1) if end else None
+    entries = get_work_entries(config, obj, start=start, end=adjusted_end)
+    aggregation = Aggregator().consume(entries)
+
+    groupings = groupings or ('day', 'week', 'project')
+    if 'day' in groupings:
+        rows = sorted(aggregation.by_day.items())
+        print_report_section('Day', ((day.strftime(DATE_INPUT_FORMAT), w) for day, w in rows))
+    if 'week' in groupings:
+        print_report_section('Week', ((f'{y}-W{w:02}', t) for (y, w), t in sorted(aggregation.by_week.items())))
+    if 'project' in groupings:
+        from wwe.catalog import load_catalog, project_label
+
+        catalog = load_catalog(config.toggl_token)
+        rows = sorted(aggregation.by_project.items(), key=lambda item: item[1], reverse=True)
+        print_report_section('Project', ((project_label(catalog, pid), w) for pid, w in rows))
+    print_report_section('Total', [('', aggregation.total)])
+
+
+@main.command()
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.option('--start', '-s', type=click.DateTime([DATE_INPUT_FORMAT]),
+              help='Start date (included), defaults to the client start date')
+@click.option('--format', '-f', 'export_format', type=click.Choice(['parquet', 'npz']),
+              help='Defaults to the extension of PATH, else Parquet if pyarrow is installed, else npz')
+@click.option('--row-group-size', type=click.IntRange(min=1), default=65536, show_default=True,
+              help='Entries converted and written at once')
+@client_option
+@click.pass_obj
+def export(obj: dict, path: str, start: datetime.datetime, export_format: str, row_group_size: int,
+           client_name: Optional[str]):
+    """Write the time entries of the client to a Parquet or NumPy .npz file, for analysis."""
+    from wwe.export import export_entries, ExportError
+
+    config, end = select_client(prepare_config(obj), client_name), obj['end']
+    start = start or config.client.start_date
+    adjusted_end = end + datetime.timedelta(days=1) if end else None
+    entries = get_work_entries(config, obj, start=start, end=adjusted_end)
+    try:
+        with trace.span('export'):
+            rows = export_entries(entries, path, export_format=export_format, row_group_size=row_group_size)
+    except ExportError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'{rows} time entries written to "{path}"')
+
+
+@main.command()
+@click.option('--format', '-f', 'output_format', type=click.Choice(['csv', 'json']), default='csv',
+              show_default=True)
+@client_option
+@click.pass_obj
+def history(obj: dict, output_format: str, client_name: Optional[str]):
+    """Print the cumulative balance at the end of every day worked or to work, since the client start date."""
+    from wwe.history import HISTORY_COLUMNS
+
+    rows = compute_history(select_client(prepare_config(obj), client_name), obj)
+    if output_format == 'json':
+        import json
+
+        click.echo(json.dumps(rows, indent=2))
+    else:
+        import csv
+        import io
+
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=HISTORY_COLUMNS, lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(rows)
+        click.echo(output.getvalue(), nl=False)
+
+
+@main.command()
+@click.option('--at', '-a', 'times', type=click.DateTime(['%H:%M']), multiple=True,
+              help='Also print the balance at this time of today, e.g. 16:00 (can be repeated)')
+@client_option
+@click.pass_obj
+def forecast(obj: dict, times: List[datetime.datetime], client_name: Optional[str]):
+    """Print today's balance now and at the given times, and when it reaches zero."""
+    if obj['end'] or obj['summary']:
+        raise click.UsageError('forecast is computed for today from the time entries, without --end or --summary')
+    prediction = compute_forecast(select_client(prepare_config(obj), client_name), obj)
+    now = datetime.datetime.now().astimezone()
+    click.echo(f'Balance now: {format_signed_balance(prediction.balance_at(now))}')
+    for at in times:
+        when = datetime.datetime.combine(now.date(), at.time()).astimezone()
+        click.echo(f'Balance at {when:%H:%M}: {format_signed_balance(prediction.balance_at(when))}')
+    zero_at = prediction.zero_at(now)
+    if zero_at is None:
+        click.echo('The balance is not negative')
+    elif zero_at.date() != now.date():
+        click.echo('The balance does not reach zero today')
+    else:
+        condition = '' if prediction.running_since else ' if you start working now'
+        click.echo(f'The balance reaches zero at {zero_at:%H:%M}{condition}')
+
+
+@main.command()
+@click.option('--interval', '-i', type=float, default=60, show_default=True, help='Seconds between two syncs')
+@client_option
+@click.pass_obj
+def daemon(obj: dict, interval: float, client_name: Optional[str]):
+    """Keep the balance in memory and answer `wwe` over a Unix socket."""
+    from wwe.daemon import run_daemon
+
+    run_daemon(prepare_config(obj), interval=interval, client_name=client_name)
+
+
+@main.command('serve-metrics')
+@click.option('--host', default='127.0.0.1', show_default=True, help='Address to listen on')
+@click.option('--port', '-p', type=int, default=9788, show_default=True, help='Port to listen on')
+@click.option('--interval', '-i', type=float, default=60, show_default=True, help='Seconds between two refreshes')
+@click.pass_obj
+def serve_metrics(obj: dict, host: str, port: int, interval: float):
+    """Expose the balance and Toggl fetch performance as OpenMetrics on http://HOST:PORT/metrics."""
+    from wwe.metrics import run_metrics_server
+
+    run_metrics_server(prepare_config(obj), obj, host=host, port=port, interval=interval)
+
+
+@main.command()
+@click.argument('config_paths', nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.option('--token', '-t', 'tokens', multiple=True,
+              help='Toggl token of a person, the rest of the default configuration applies (can be repeated)')
+@click.option('--workers', '-w', type=int, default=0, help='Balances computed at once [default: 8, or CPUs]')
+@click.option('--processes', is_flag=True, default=False, help='Use a process pool instead of threads')
+@click.option('--format', '-f', 'output_format', type=click.Choice(['table', 'json']), default='table',
+              show_default=True)
+@click.pass_context
+def batch(ctx: click.Context, config_paths: List[str], tokens: List[str], workers: int, processes: bool,
+          output_format: str):
+    """Print the balances of many people, one per configuration file or token, computed in parallel."""
+    import json
+    from wwe.batch import compute_balances, format_balance_table, get_members
+
+    obj = ctx.obj
+    if not config_paths and not tokens:
+        raise click.UsageError('Pass at least one configuration file or --token')
+    try:
+        members = get_members(config_paths, tokens, base_config=load_config() if tokens else None)
+    except ConfigError as e:
+        raise click.ClickException(str(e))
+    if obj['refresh']:
+        for _, config in members:
+            open_store(token=config.toggl_token).clear()
+    # fetched once for everybody
+    bank_holidays = load_bank_holidays(ttl=datetime.timedelta(0)) if obj['refresh'] else load_bank_holidays()
+    options = dict(obj, asyncio=False)
+    rows = compute_balances(members, options, bank_holidays, workers=workers, processes=processes)
+    if output_format == 'json':
+        click.echo(json.dumps(rows, indent=2))
+    else:
+        click.echo(format_balance_table(rows))
+    if any('error' in row for row in rows):
+        ctx.exit(1)
 
 
 # Required for debugging:
@@ -1,8 +1,48 @@
+import datetime
+import hashlib
 import json
 import os
+import pickle
 import platform
+from typing import Any, NamedTuple, Optional, Tuple
 import wwe.log as log
 
+CONFIG_DATE_FORMAT = '%Y-%m-%d'
+# Bump when `Config` changes, so that snapshots written by older versions are ignored
+CONFIG_SNAPSHOT_VERSION = 2
+
+
+class ConfigError(ValueError):
+    """The configuration file cannot be read or does not follow the expected schema."""
+
+
+class ClientConfig(NamedTuple):
+    """Client whose working hours are counted."""
+
+    name: str
+    start_date: datetime.datetime
+
+
+class Config(NamedTuple):
+    """Validated configuration, with every date already parsed.
+
+    Holidays are (date ordinal, fraction of the day) pairs, ready to be indexed by `wwe.workdays.HolidayIndex`.
+
+    If several clients are configured, `contracts` holds the configuration of each one, and the other fields are
+    those of the first one.
+    """
+
+    toggl_token: str
+    client: ClientConfig
+    working_day_hours: float
+    personal_holidays: Tuple[Tuple[int, float], ...] = ()
+    company_bonus_days: Tuple[Tuple[int, float], ...] = ()
+    contracts: Tuple['Config', ...] = ()
+
+    def per_client(self) -> Tuple['Config', ...]:
+        """Return the configuration of every client, each with its own start date, working hours and holidays."""
+        return self.contracts or (self,)
+
 
 def get_default_config_path():
     """Return default configuration file path depending on the OS."""
@@ -16,17 +56,205 @@ def get_default_config_path():
     return config_path
 
 
-def load_config(path=None) -> dict:
+def get_default_cache_dir():
+    """Return default cache folder path.
+
+    The ``WWE_CACHE_DIR`` environment variable takes precedence, then ``$XDG_CACHE_HOME/wwe`` and finally
+    ``~/.cache/wwe``. The folder is created if it does not exist.
+    """
+    cache_dir = os.environ.get('WWE_CACHE_DIR')
+    if not cache_dir:
+        xdg_cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        cache_dir = os.path.join(xdg_cache_home, 'wwe')
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def get_token_key(token: str) -> str:
+    """Return a short, filesystem-safe key that identifies a Toggl token without disclosing it."""
+    return hashlib.sha1(token.encode('utf-8')).hexdigest()[:16]
+
+
+def parse_config_date(value: Any, field: str) -> datetime.datetime:
+    """Return a configured YYYY-MM-DD date as a naive datetime at midnight."""
+    try:
+        return datetime.datetime.strptime(value, CONFIG_DATE_FORMAT)
+    except (TypeError, ValueError):
+        raise ConfigError(f'"{field}" must be a YYYY-MM-DD date, got {value!r}') from None
+
+
+def parse_config_days(rows: Any, field: str) -> Tuple[Tuple[int, float], ...]:
+    """Return configured [date, fraction] rows as (date ordinal, fraction) pairs."""
+    if not isinstance(rows, list):
+        raise ConfigError(f'"{field}" must be a list of [date, fraction of the day] pairs, got {rows!r}')
+    days = []
+    for index, row in enumerate(rows):
+        if not isinstance(row, list) or len(row) != 2:
+            raise ConfigError(f'"{field}[{index}]" must be a [date, fraction of the day] pair, got {row!r}')
+        day = parse_config_date(row[0], f'{field}[{index}][0]')
+        if isinstance(row[1], bool) or not isinstance(row[1], (int, float)):
+            raise ConfigError(f'"{field}[{index}][1]" must be a number, got {row[1]!r}')
+        days.append((day.toordinal(), float(row[1])))
+    return tuple(days)
+
+
+def parse_working_day_hours(hours: Any, field: str) -> float:
+    """Return configured working hours per day."""
+    if isinstance(hours, bool) or not isinstance(hours, (int, float)) or hours <= 0:
+        raise ConfigError(f'"{field}" must be a positive number, got {hours!r}')
+    return float(hours)
+
+
+def compile_client(token: str, client: Any, field: str, defaults: dict) -> Config:
+    """Return the configuration of one client, whose missing hours and holidays are taken from `defaults`."""
+    if not isinstance(client, dict) or not isinstance(client.get('name'), str):
+        raise ConfigError(f'"{field}" must be an object with a "name" and a "start_date"')
+    settings = dict(defaults, **{key: value for key, value in client.items() if key in defaults})
+    if 'working_day_hours' not in settings:
+        raise ConfigError(f'missing required field(s): working_day_hours (or {field}.working_day_hours)')
+    # fields set for this client are reported with its prefix
+    prefix = {key: f'{field}.{key}' if key in client else key for key in settings}
+    return Config(
+        toggl_token=token,
+        client=ClientConfig(name=client['name'],
+                            start_date=parse_config_date(client.get('start_date'), f'{field}.start_date')),
+        working_day_hours=parse_working_day_hours(settings['working_day_hours'], prefix['working_day_hours']),
+        personal_holidays=parse_config_days(settings.get('personal_holidays', []), prefix['personal_holidays']),
+        company_bonus_days=parse_config_days(settings.get('company_bonus_days', []), prefix['company_bonus_days']),
+    )
+
+
+def compile_config(data: Any) -> Config:
+    """Validate the contents of a configuration file and return them as a `Config`.
+
+    Either one ``client`` or a list of ``clients`` is configured. Every client may set its own
+    ``working_day_hours``, ``personal_holidays`` and ``company_bonus_days``, else the top level ones apply.
+    """
+    if not isinstance(data, dict):
+        raise ConfigError('the configuration must be a JSON object')
+    missing = ['toggl_token'] if 'toggl_token' not in data else []
+    if 'client' not in data and 'clients' not in data:
+        missing.append('client')
+    if missing:
+        raise ConfigError(f'missing required field(s): {", ".join(missing)}')
+    if not isinstance(data['toggl_token'], str) or not data['toggl_token']:
+        raise ConfigError('"toggl_token" must be a non empty string')
+    defaults = {key: data[key] for key in ('working_day_hours', 'personal_holidays', 'company_bonus_days')
+                if key in data}
+    defaults.setdefault('personal_holidays', [])
+    defaults.setdefault('company_bonus_days', [])
+    if 'clients' not in data:
+        return compile_client(data['toggl_token'], data['client'], 'client', defaults)
+
+    clients = data['clients']
+    if not isinstance(clients, list) or not clients:
+        raise ConfigError('"clients" must be a non empty list of clients')
+    contracts = tuple(compile_client(data['toggl_token'], client, f'clients[{index}]', defaults)
+                      for index, client in enumerate(clients))
+    names = [contract.client.name for contract in contracts]
+    if len(set(names)) != len(names):
+        raise ConfigError('every client in "clients" must have a different name')
+    if len(contracts) == 1:
+        return contracts[0]
+    return contracts[0]._replace(contracts=contracts)
+
+
+def get_config_snapshot_path(config_path: str) -> str:
+    """Return the path of the compiled snapshot of a configuration file."""
+    key = hashlib.sha1(os.path.abspath(config_path).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(get_default_cache_dir(), f'config-{key}.pickle')
+
+
+def read_config_snapshot(path: str, mtime_ns: int, digest: str) -> Optional[Config]:
+    """Return the snapshotted configuration if it was compiled from a file with this mtime and hash."""
+    try:
+        with open(path, 'rb') as fd:
+            version, snapshot_mtime_ns, snapshot_digest, config = pickle.load(fd)
+    except Exception:  # missing, corrupt or written by another version: compile the configuration again
+        return None
+    if (version, snapshot_mtime_ns, snapshot_digest) != (CONFIG_SNAPSHOT_VERSION, mtime_ns, digest):
+        return None
+    return config if isinstance(config, Config) else None
+
+
+def write_config_snapshot(path: str, mtime_ns: int, digest: str, config: Config) -> None:
+    """Write the compiled configuration atomically, readable only by the user as it holds the Toggl token."""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with open(fd, 'wb') as snapshot:
+        pickle.dump((CONFIG_SNAPSHOT_VERSION, mtime_ns, digest, config), snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_config(path=None) -> Config:
     """Load and return configuration file.
 
     If no path is provided, default configuration is loaded from
     the config folder: ~/.config/wwe/config.json
+
+    The compiled configuration is snapshotted in the cache folder, keyed on the mtime and the hash of the file, so
+    as long as the file does not change it is neither parsed nor validated again.
     """
-    if path is None:
-        config_path = get_default_config_path()
+    config_path = get_default_config_path() if path is None else path
     if log.verbose:
         print(f'Loading configuration from "{config_path}"...')
-    return import_json_file(config_path)
+    try:
+        with open(config_path, 'rb') as fd:
+            mtime_ns = os.fstat(fd.fileno()).st_mtime_ns
+            content = fd.read()
+    except OSError as e:
+        raise ConfigError(f'cannot read configuration file "{config_path}": {e.strerror}') from e
+    digest = hashlib.sha1(content).hexdigest()
+    snapshot_path = get_config_snapshot_path(config_path)
+    config = read_config_snapshot(snapshot_path, mtime_ns, digest)
+    if config is not None:
+        return config
+
+    try:
+        data = json.loads(content)
+    except ValueError as e:
+        raise ConfigError(f'"{config_path}" is not valid JSON: {e}') from e
+    try:
+        config = compile_config(data)
+    except ConfigError as e:
+        raise ConfigError(f'invalid configuration in "{config_path}": {e}') from None
+    try:
+        write_config_snapshot(snapshot_path, mtime_ns, digest, config)
+    except OSError:
+        pass  # the snapshot only saves time
+    return config
+
+
+class ConfigWatcher:
+    """Configuration of a long running process, loaded again whenever its file is modified."""
+
+    def __init__(self, config: Config, path: str = None):
+        """Watch `path` (the default configuration file), from which `config` was loaded."""
+        self.path = get_default_config_path() if path is None else path
+        self.config = config
+        self.mtime_ns = self._mtime_ns()
+
+    def _mtime_ns(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def reload(self) -> bool:
+        """Load the configuration again if its file was modified since, and return true if it changed.
+
+        Raise ConfigError, once per modification, if the file is invalid or belongs to another Toggl account. The
+        previous configuration is kept in that case.
+        """
+        mtime_ns = self._mtime_ns()
+        if mtime_ns == self.mtime_ns:
+            return False
+        self.mtime_ns = mtime_ns
+        config = load_config(self.path)
+        if config.toggl_token != self.config.toggl_token:
+            raise ConfigError(f'"{self.path}" now has another Toggl token, restart to use it')
+        changed, self.config = config != self.config, config
+        return changed
 
 
 def import_json_file(path: str):
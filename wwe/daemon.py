@@ -0,0 +1,240 @@
+import click
+import datetime
+import os
+import socket
+import socketserver
+import threading
+import time
+from typing import Callable, List, Optional
+import wwe.log as log
+from wwe.cache import get_cache_path
+from wwe.config import Config, ConfigError, ConfigWatcher
+from wwe.entry import TimeEntry
+from wwe.store import EntryStore, from_epoch, to_epoch
+
+# Seconds between two syncs with Toggl
+POLL_INTERVAL = 60
+# Seconds a client waits for the daemon before computing the balance itself
+QUERY_TIMEOUT = 0.5
+MAX_ANSWER_SIZE = 64 * 1024  # bytes
+
+
+def get_daemon_socket_path(token: str) -> str:
+    """Return the path of the Unix socket the daemon of a Toggl account listens on."""
+    return get_cache_path('daemon.sock', token=token)
+
+
+def query_daemon(config: Config, command: str = 'balance', timeout: float = QUERY_TIMEOUT) -> Optional[str]:
+    """Return the answer of the running daemon to a command, or None if no daemon is running."""
+    path = get_daemon_socket_path(config.toggl_token)
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(timeout)
+            client.connect(path)
+            client.sendall(f'{command}\n'.encode())
+            chunks = []
+            while True:
+                chunk = client.recv(MAX_ANSWER_SIZE)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+    except OSError:
+        # stale socket of a daemon which is not running anymore, or a daemon too busy to answer in time
+        return None
+    answer = b''.join(chunks).decode()
+    if not answer.startswith('ok '):
+        return None
+    if log.verbose:
+        click.echo(f'Balance answered by the daemon listening on "{path}"')
+    return answer[len('ok '):]
+
+
+class BalanceTracker:
+    """In-memory work hour balance, updated from the local store after every sync.
+
+    Entries started before the store recheck window rarely change, so their worked time is summed into a frozen
+    total, which moves forward with the window. After every sync only the recent entries are read again: the
+    finished ones are summed and the running ones are kept, so that a query adds their time up to the current moment
+    without any I/O. The frozen total is summed again if the sync changed any entry older than it.
+    """
+
+    def __init__(self, config: Config, store: EntryStore):
+        """Create empty tracker."""
+        self.config = config
+        self.store = store
+        self.start: Optional[datetime.datetime] = None
+        self.project_ids: Optional[set] = None
+        self.frozen_until: Optional[int] = None
+        self.frozen_worked = datetime.timedelta()
+        self.recent_worked = datetime.timedelta()
+        self.running: List[TimeEntry] = []
+        self.holidays = None
+        self.lock = threading.Lock()
+
+    def _worked(self, entries, project_ids: set):
+        """Return the time worked in the finished entries, and the running entries, of the client projects."""
+        worked, running = datetime.timedelta(), []
+        for entry in entries:
+            if entry.pid not in project_ids:
+                continue
+            if entry.is_running:
+                running.append(entry)
+            else:
+                worked += entry.duration
+        return worked, running
+
+    def _freeze_point(self, start: datetime.datetime, now: datetime.datetime) -> int:
+        """Return the timestamp before which entries are summed into the frozen total."""
+        # only the entries started before the recheck window, and before any running entry, are final
+        frozen_until = to_epoch(now - self.store.recheck_window)
+        oldest_running = self.store._oldest_running_start()
+        if oldest_running is not None:
+            frozen_until = min(frozen_until, oldest_running)
+        return max(frozen_until, to_epoch(start))
+
+    def update(self, start: datetime.datetime, project_ids: set, holidays, now: datetime.datetime = None) -> None:
+        """Recompute the balance from the store, which must have been synced from `start`.
+
+        The frozen total is moved forward by summing the entries between the previous and the new freeze point
+        only. It is summed again from `start` if the client, its projects or its start date changed, or if the last
+        sync of the store changed an entry older than the previous freeze point.
+        """
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        frozen_until = self._freeze_point(start, now)
+        changed_from = self.store.changed_from
+        history_changed = changed_from is not None and changed_from < (self.frozen_until or 0)
+        scope_changed = project_ids != self.project_ids or start != self.start
+        if self.frozen_until is None or scope_changed or frozen_until < self.frozen_until or history_changed:
+            frozen_worked, _ = self._worked(self.store.entries(start=start, end=from_epoch(frozen_until)), project_ids)
+        elif frozen_until > self.frozen_until:
+            entries = self.store.entries(start=from_epoch(self.frozen_until), end=from_epoch(frozen_until))
+            frozen_worked = self.frozen_worked + self._worked(entries, project_ids)[0]
+        else:
+            frozen_worked = self.frozen_worked
+        recent_worked, running = self._worked(self.store.entries(start=from_epoch(frozen_until)), project_ids)
+        with self.lock:
+            self.start, self.project_ids = start, project_ids
+            self.frozen_until, self.frozen_worked = frozen_until, frozen_worked
+            self.recent_worked, self.running, self.holidays = recent_worked, running, holidays
+
+    def worked(self, now: datetime.datetime = None) -> datetime.timedelta:
+        """Return the time worked since the client start date up to now."""
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        with self.lock:
+            running = sum((now - entry.start for entry in self.running), datetime.timedelta())
+            return self.frozen_worked + self.recent_worked + running
+
+    def balance_message(self) -> str:
+        """Return the same balance message `wwe` prints."""
+        from wwe.cli import format_balance_message, get_time_to_work
+
+        start = self.config.client.start_date
+        to_work = get_time_to_work(self.config, self.holidays, start, datetime.datetime.now())
+        return format_balance_message(to_work, self.worked())
+
+
+class BalanceRequestHandler(socketserver.StreamRequestHandler):
+    """Answer one command per connection: ``balance`` or ``ping``."""
+
+    def handle(self):
+        """Read a command and write the answer."""
+        command = self.rfile.readline(1024).decode(errors='replace').strip()
+        tracker = self.server.tracker
+        if tracker.holidays is None:
+            answer = 'error not ready'
+        elif command == 'balance':
+            answer = 'ok ' + tracker.balance_message()
+        elif command == 'ping':
+            answer = 'ok pong'
+        else:
+            answer = f'error unknown command {command!r}'
+        self.wfile.write(answer.encode())
+
+
+class BalanceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server answering from a `BalanceTracker`."""
+
+    daemon_threads = True
+
+    def __init__(self, path: str, tracker: BalanceTracker):
+        """Listen on `path`, removing a stale socket left by a daemon which is not running anymore."""
+        if os.path.exists(path):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.connect(path)
+                except OSError:
+                    os.remove(path)
+                else:
+                    raise click.ClickException(f'A wwe daemon is already listening on "{path}"')
+        self.tracker = tracker
+        super().__init__(path, BalanceRequestHandler)
+        os.chmod(path, 0o600)
+
+
+def serve_while_refreshing(server: socketserver.BaseServer, refresh: Callable[[], None], interval: float,
+                           on_error: Callable[[Exception], None] = None) -> None:
+    """Serve requests in a background thread, and call `refresh` every `interval` seconds until interrupted.
+
+    A failed refresh is reported and tried again after `interval`, while requests are still answered with the last
+    known values. The server is shut down and closed when interrupted.
+    """
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        while True:
+            try:
+                refresh()
+            except Exception as e:  # keep serving the last known values, Toggl may be unreachable for a while
+                click.echo(f'Refresh failed, retrying in {interval:g}s: {e}', err=True)
+                if on_error is not None:
+                    on_error(e)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def run_daemon(config: Config, interval: float = POLL_INTERVAL, client_name: str = None) -> None:
+    """Keep the balance up to date and serve it over a Unix socket until interrupted.
+
+    Every `interval` seconds the configuration is loaded again if its file was modified, the local store is synced,
+    which only downloads the changed entries, and the client projects and holidays are reloaded from their caches.
+    Queries are answered from memory in between. If several clients are configured, the balance is kept for the
+    one called `client_name`.
+    """
+    from wwe.cli import get_holiday_index, get_project_ids, select_client
+    from wwe.store import open_store
+    from wwe.toggl import ensure_datetime_timezone, TogglWrap
+
+    store = open_store(token=config.toggl_token)
+    t = TogglWrap(token=config.toggl_token, store=store)
+    tracker = BalanceTracker(select_client(config, client_name), store)
+    watcher = ConfigWatcher(config)
+    path = get_daemon_socket_path(config.toggl_token)
+    server = BalanceServer(path, tracker)
+    click.echo(f'Listening on "{path}", syncing every {interval:g}s')
+
+    def refresh():
+        try:
+            if watcher.reload() and log.verbose:
+                click.echo(f'Configuration reloaded from "{watcher.path}"')
+        except ConfigError as e:
+            click.echo(f'Keeping the previous configuration: {e}', err=True)
+        config = select_client(watcher.config, client_name)
+        start = ensure_datetime_timezone(config.client.start_date)
+        store.sync(t.toggl, start=start)
+        project_ids = get_project_ids(target_client=config.client.name, t=t)
+        holidays = get_holiday_index(config)
+        tracker.config = config
+        tracker.update(start, project_ids, holidays)
+        if log.verbose:
+            click.echo(tracker.balance_message())
+
+    try:
+        serve_while_refreshing(server, refresh, interval)
+    finally:
+        os.remove(path)
+        store.close()
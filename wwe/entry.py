@@ -0,0 +1,82 @@
+import datetime
+from typing import Any, Optional, Tuple
+
+
+def parse_timestamp(text: Optional[str]) -> Optional[datetime.datetime]:
+    """Parse an ISO 8601 timestamp as returned by Toggl (e.g. 2018-05-23T14:54:29+00:00)."""
+    if text is None:
+        return None
+    if text[-1] == 'Z':
+        text = text[:-1] + '+00:00'
+    return datetime.datetime.fromisoformat(text)
+
+
+class TimeEntry:
+    """Toggl time entry holding only the fields used by wwe.
+
+    Entries can also be read like the dictionaries returned by Toggl (`entry['start']`), so that code written for
+    them keeps working.
+    """
+
+    __slots__ = ('id', 'wid', 'pid', 'start', 'stop', 'duration', 'description', 'at', 'tags', 'billable')
+
+    def __init__(self, id: int, wid: Optional[int], pid: Optional[int], start: datetime.datetime,
+                 stop: Optional[datetime.datetime], duration: datetime.timedelta, description: str = '',
+                 at: Optional[datetime.datetime] = None, tags: Tuple[str, ...] = (), billable: bool = False):
+        """Create time entry."""
+        self.id = id
+        self.wid = wid
+        self.pid = pid
+        self.start = start
+        self.stop = stop
+        self.duration = duration
+        self.description = description
+        self.at = at
+        self.tags = tags
+        self.billable = billable
+
+    def __getitem__(self, key: str) -> Any:
+        """Return a field by name, like a Toggl time entry dictionary."""
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return a field by name, or `default` if the entry has no such field."""
+        return getattr(self, key, default)
+
+    def __eq__(self, other: Any) -> bool:
+        """Return true if both entries have the same fields."""
+        if not isinstance(other, TimeEntry):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    def __repr__(self) -> str:
+        """Return representation with every field."""
+        fields = ', '.join(f'{field}={getattr(self, field)!r}' for field in self.__slots__)
+        return f'TimeEntry({fields})'
+
+    @property
+    def is_running(self) -> bool:
+        """Return true if the time entry has not been stopped yet (Toggl sets a negative duration)."""
+        return self.duration.days < 0
+
+
+def decode_time_entry(data: dict) -> TimeEntry:
+    """Build a TimeEntry from a time entry as returned by Toggl.
+
+    Unlike `deserialize_toggl`, only the fields known to hold timestamps are parsed.
+    """
+    return TimeEntry(
+        id=data['id'],
+        wid=data.get('wid'),
+        pid=data.get('pid'),
+        start=parse_timestamp(data['start']),
+        stop=parse_timestamp(data.get('stop')),
+        duration=datetime.timedelta(seconds=data['duration']),
+        description=data.get('description', ''),
+        at=parse_timestamp(data.get('at')),
+        tags=tuple(data.get('tags') or ()),
+        billable=bool(data.get('billable')),
+    )
@@ -0,0 +1,184 @@
+import contextlib
+import datetime
+import json
+import os
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Optional
+from wwe.entry import TimeEntry
+
+# Entries converted and written at once: one Parquet row group, or one chunk of every NumPy column
+ROW_GROUP_SIZE = 65536
+EXPORT_FORMATS = ('parquet', 'npz')
+# NumPy integer columns cannot be null, missing workspace and project IDs are exported as this
+MISSING_ID = -1
+# NumPy "not a time" value, for the stop timestamp of running entries
+NAT = -2 ** 63
+
+# name: NumPy dtype of the fixed width .npz columns, all of them 64 bit integers or booleans
+NPZ_COLUMNS = {
+    'id': '<i8',
+    'wid': '<i8',
+    'pid': '<i8',
+    'start': '<M8[s]',
+    'stop': '<M8[s]',
+    'duration': '<m8[s]',
+    'running': '|b1',
+    'billable': '|b1',
+}
+# Variable length .npz columns, stored like Arrow strings: UTF-8 bytes in `<name>_data`, and the N + 1 boundaries of
+# every value in `<name>_offsets`. Tags are stored as JSON arrays.
+NPZ_STRING_COLUMNS = ('description', 'tags')
+
+
+class ExportError(Exception):
+    """The export cannot be written, e.g. a format needs a missing optional dependency."""
+
+
+def has_pyarrow() -> bool:
+    """Return true if the optional pyarrow dependency, needed to write Parquet, is installed."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def guess_format(path: str) -> str:
+    """Return the export format matching the extension of `path`, else Parquet if pyarrow is installed, else npz."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.parquet', '.pq'):
+        return 'parquet'
+    if extension == '.npz':
+        return 'npz'
+    return 'parquet' if has_pyarrow() else 'npz'
+
+
+def batched(entries: Iterable[TimeEntry], size: int) -> Iterator[List[TimeEntry]]:
+    """Yield lists of `size` entries at most."""
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def to_columns(entries: List[TimeEntry], now: datetime.datetime) -> Dict[str, list]:
+    """Return the columns of a batch of entries, with running entries lasting until `now`."""
+    return {
+        'id': [entry.id for entry in entries],
+        'wid': [entry.wid for entry in entries],
+        'pid': [entry.pid for entry in entries],
+        'start': [entry.start for entry in entries],
+        'stop': [entry.stop if not entry.is_running else None for entry in entries],
+        'duration': [now - entry.start if entry.is_running else entry.duration for entry in entries],
+        'running': [entry.is_running for entry in entries],
+        'billable': [entry.billable for entry in entries],
+        'description': [entry.description or '' for entry in entries],
+        'tags': [list(entry.tags) for entry in entries],
+    }
+
+
+def write_parquet(entries: Iterable[TimeEntry], path: str, row_group_size: int = ROW_GROUP_SIZE,
+                  now: datetime.datetime = None) -> int:
+    """Write time entries to a Parquet file, one row group at a time, and return how many were written."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ExportError('Parquet export needs pyarrow (pip install wwe[export]), or export to .npz instead')
+
+    now = (now or datetime.datetime.now(datetime.timezone.utc)).replace(microsecond=0)
+    schema = pyarrow.schema([
+        ('id', pyarrow.int64()),
+        ('wid', pyarrow.int64()),
+        ('pid', pyarrow.int64()),
+        ('start', pyarrow.timestamp('s', tz='UTC')),
+        ('stop', pyarrow.timestamp('s', tz='UTC')),
+        ('duration', pyarrow.duration('s')),
+        ('running', pyarrow.bool_()),
+        ('billable', pyarrow.bool_()),
+        ('description', pyarrow.string()),
+        ('tags', pyarrow.list_(pyarrow.string())),
+    ])
+    rows = 0
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        for batch in batched(entries, row_group_size):
+            writer.write_table(pyarrow.Table.from_pydict(to_columns(batch, now), schema=schema))
+            rows += len(batch)
+    return rows
+
+
+def write_npz(entries: Iterable[TimeEntry], path: str, row_group_size: int = ROW_GROUP_SIZE,
+              now: datetime.datetime = None) -> int:
+    """Write time entries to a NumPy .npz archive, and return how many were written.
+
+    Entries are converted `row_group_size` at a time and appended to one spooled file per column, which are mapped
+    back into memory and saved by `numpy.savez` at the end, so memory use does not grow with the history.
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise ExportError('.npz export needs numpy (pip install wwe[numpy]), or export to .parquet instead')
+
+    now = (now or datetime.datetime.now(datetime.timezone.utc)).replace(microsecond=0)
+    dtypes = dict(NPZ_COLUMNS)
+    for name in NPZ_STRING_COLUMNS:
+        dtypes[f'{name}_data'] = '|u1'
+        dtypes[f'{name}_offsets'] = '<i8'
+    rows = 0
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path))) as spool, \
+            contextlib.ExitStack() as stack:
+        files = {name: stack.enter_context(open(os.path.join(spool, name), 'w+b')) for name in dtypes}
+
+        def append(name: str, values: Iterable) -> None:
+            # datetime and timedelta columns are written as their 64 bit integer count of seconds
+            dtype = '<i8' if dtypes[name] in ('<M8[s]', '<m8[s]') else dtypes[name]
+            numpy.fromiter(values, dtype=dtype).tofile(files[name])
+
+        offsets = dict.fromkeys(NPZ_STRING_COLUMNS, 0)
+        for name in NPZ_STRING_COLUMNS:
+            append(f'{name}_offsets', [0])
+        for batch in batched(entries, row_group_size):
+            values = to_columns(batch, now)
+            append('id', values['id'])
+            for name in ('wid', 'pid'):
+                append(name, (MISSING_ID if value is None else value for value in values[name]))
+            append('start', (int(start.timestamp()) for start in values['start']))
+            append('stop', (NAT if stop is None else int(stop.timestamp()) for stop in values['stop']))
+            append('duration', (int(duration.total_seconds()) for duration in values['duration']))
+            append('running', values['running'])
+            append('billable', values['billable'])
+            values['tags'] = [json.dumps(tags) for tags in values['tags']]
+            for name in NPZ_STRING_COLUMNS:
+                encoded = [value.encode() for value in values[name]]
+                ends = []
+                for value in encoded:
+                    offsets[name] += len(value)
+                    ends.append(offsets[name])
+                append(f'{name}_data', b''.join(encoded))
+                append(f'{name}_offsets', ends)
+            rows += len(batch)
+        arrays = {}
+        for name, file in files.items():
+            file.flush()
+            # an empty file cannot be mapped
+            arrays[name] = (numpy.memmap(file, dtype=dtypes[name], mode='r') if file.tell()
+                            else numpy.empty(0, dtype=dtypes[name]))
+        # written through a file object, as numpy.savez appends '.npz' to paths without that extension
+        with open(path, 'wb') as output:
+            numpy.savez(output, **arrays)
+        # release the mappings before the spooled files are removed
+        del arrays
+    return rows
+
+
+def export_entries(entries: Iterable[TimeEntry], path: str, export_format: Optional[str] = None,
+                   row_group_size: int = ROW_GROUP_SIZE) -> int:
+    """Write time entries to `path` in a columnar format, guessed from the path if not given, and return the count."""
+    export_format = export_format or guess_format(path)
+    if export_format == 'parquet':
+        return write_parquet(entries, path, row_group_size=row_group_size)
+    return write_npz(entries, path, row_group_size=row_group_size)
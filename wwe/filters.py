@@ -0,0 +1,79 @@
+import json
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from wwe.entry import TimeEntry
+
+
+class EntryFilter(NamedTuple):
+    """Conditions a time entry must meet, all of them. Conditions left as None are not checked.
+
+    - project_ids: the entry belongs to one of these projects (e.g. every project of a client)
+    - workspace_ids: the entry belongs to one of these workspaces
+    - tags: the entry has at least one of these tags
+    - billable: the entry is (or is not) billable
+
+    A filter can be compiled into a single Python predicate, or pushed down into the local store as an SQL condition
+    so that discarded entries are never read.
+    """
+
+    project_ids: Optional[frozenset] = None
+    workspace_ids: Optional[frozenset] = None
+    tags: Optional[frozenset] = None
+    billable: Optional[bool] = None
+
+    @classmethod
+    def create(cls, project_ids: Iterable[int] = None, workspace_ids: Iterable[int] = None,
+               tags: Iterable[str] = None, billable: bool = None) -> 'EntryFilter':
+        """Return a filter from any iterables, leaving out empty tag lists (no tag condition)."""
+        return cls(
+            project_ids=frozenset(project_ids) if project_ids is not None else None,
+            workspace_ids=frozenset(workspace_ids) if workspace_ids is not None else None,
+            tags=frozenset(tags) if tags else None,
+            billable=billable,
+        )
+
+    def compile(self) -> Callable[[TimeEntry], bool]:
+        """Return one predicate checking every condition of the filter.
+
+        Only the conditions which are set are checked, each by a small closure over its value. A filter with a
+        single condition (the usual client projects) returns that closure itself.
+        """
+        project_ids, workspace_ids, tags, billable = self
+        checks = []
+        if project_ids is not None:
+            checks.append(lambda entry: entry.pid in project_ids)
+        if workspace_ids is not None:
+            checks.append(lambda entry: entry.wid in workspace_ids)
+        if tags is not None:
+            checks.append(lambda entry: not tags.isdisjoint(entry.tags))
+        if billable is not None:
+            checks.append(lambda entry: entry.billable is billable)
+        if not checks:
+            return lambda entry: True
+        if len(checks) == 1:
+            return checks[0]
+        return lambda entry: all(check(entry) for check in checks)
+
+    def apply(self, entries: Iterable[TimeEntry]) -> Iterator[TimeEntry]:
+        """Yield the entries meeting every condition."""
+        return filter(self.compile(), entries)
+
+    def to_sql(self) -> Tuple[str, List]:
+        """Return the SQL condition on the `time_entries` table, and its parameters, equivalent to the filter.
+
+        Sets are passed as a single JSON array parameter, so their size is not bound by the SQLite variable limit.
+        """
+        conditions, parameters = [], []
+        if self.project_ids is not None:
+            conditions.append('pid IN (SELECT value FROM json_each(?))')
+            parameters.append(json.dumps(sorted(self.project_ids)))
+        if self.workspace_ids is not None:
+            conditions.append('wid IN (SELECT value FROM json_each(?))')
+            parameters.append(json.dumps(sorted(self.workspace_ids)))
+        if self.tags is not None:
+            conditions.append('EXISTS (SELECT 1 FROM json_each(time_entries.tags) AS tag '
+                              'WHERE tag.value IN (SELECT value FROM json_each(?)))')
+            parameters.append(json.dumps(sorted(self.tags)))
+        if self.billable is not None:
+            conditions.append('billable = ?')
+            parameters.append(int(self.billable))
+        return ' AND '.join(conditions) or '1', parameters
@@ -0,0 +1,55 @@
+import datetime
+from typing import Iterable, List, Optional
+from wwe.entry import TimeEntry
+
+
+class Forecast:
+    """Balance of the current day as a function of the time of day.
+
+    The closed days, every entry started before today and the time to work until yesterday, are summed once into a
+    baseline. Only today's worked time and the start of the running entries are kept besides it, so the balance at
+    any time today, or the time it reaches zero, is a few additions rather than another pass over the entries.
+    """
+
+    def __init__(self, baseline: datetime.timedelta, to_work_today: datetime.timedelta,
+                 worked_today: datetime.timedelta = datetime.timedelta(),
+                 running_since: Iterable[datetime.datetime] = ()):
+        """Create forecast from the balance at the end of yesterday and today's figures."""
+        self.baseline = baseline
+        self.to_work_today = to_work_today
+        self.worked_today = worked_today
+        self.running_since: List[datetime.datetime] = list(running_since)
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[TimeEntry], midnight: datetime.datetime,
+                     to_work_before_today: datetime.timedelta, to_work_today: datetime.timedelta) -> 'Forecast':
+        """Return the forecast of the day starting at `midnight`, in a single pass over the entries.
+
+        Like the balance, a finished entry counts entirely on the day it started, and running entries count until
+        the time asked for.
+        """
+        closed, today, running = datetime.timedelta(), datetime.timedelta(), []
+        for entry in entries:
+            if entry.is_running:
+                running.append(entry.start)
+            elif entry.start < midnight:
+                closed += entry.duration
+            else:
+                today += entry.duration
+        return cls(closed - to_work_before_today, to_work_today, today, running)
+
+    def balance_at(self, when: datetime.datetime) -> datetime.timedelta:
+        """Return the balance at a time of today, if the running entries keep running until then."""
+        running = sum((max(when - since, datetime.timedelta()) for since in self.running_since), datetime.timedelta())
+        return self.baseline + self.worked_today + running - self.to_work_today
+
+    def zero_at(self, now: datetime.datetime) -> Optional[datetime.datetime]:
+        """Return when the balance reaches zero, or None if it is not negative at `now`.
+
+        The running entries are expected to keep running. Without any, the time is the one reached by starting to
+        work at `now`.
+        """
+        balance = self.balance_at(now)
+        if balance >= datetime.timedelta():
+            return None
+        return now + -balance / max(len(self.running_since), 1)
@@ -1,24 +1,149 @@
+import bisect
 import click
 import datetime
-import requests
+import time
+from typing import List, Optional
 import wwe.log as log
+import wwe.trace as trace
+from wwe.cache import get_cache_path, read_json_cache, write_json_cache
+from wwe.workdays import first_midnight_ordinal
 
 UKGOV_TIMESTAMP_FORMAT = '%Y-%m-%d'
+UKGOV_BANK_HOLIDAYS_URL = 'https://www.gov.uk/bank-holidays.json'
+# Cached bank holidays younger than this are used without asking gov.uk
+BANK_HOLIDAYS_TTL = datetime.timedelta(days=1)
+REQUEST_TIMEOUT = 10  # seconds
 
 
-def gov_uk_bank_holidays() -> set:
-    """Fetch bank holiday list for England from the UK government endpoint."""
+def get_bank_holidays_cache_path() -> str:
+    """Return the path of the cached bank holiday list."""
+    return get_cache_path('bank-holidays.json')
+
+
+def read_bank_holidays_cache(path: str) -> Optional[dict]:
+    """Return the cached bank holidays, or None if there is no usable cache."""
+    cache = read_json_cache(path)
+    if not isinstance(cache, dict) or 'ordinals' not in cache:
+        return None
+    return cache
+
+
+def parse_bank_holidays(data: dict) -> List[int]:
+    """Return the sorted date ordinals of the bank holidays for England in a gov.uk response."""
+    england_data = data['england-and-wales']['events']
+    return sorted(
+        datetime.datetime.strptime(event['date'], UKGOV_TIMESTAMP_FORMAT).toordinal()
+        for event in england_data
+    )
+
+
+def revalidation_headers(cache: Optional[dict]) -> dict:
+    """Return the conditional request headers to revalidate a cached bank holiday list."""
+    headers = {}
+    if cache and cache.get('etag'):
+        headers['If-None-Match'] = cache['etag']
+    if cache and cache.get('last_modified'):
+        headers['If-Modified-Since'] = cache['last_modified']
+    return headers
+
+
+def updated_bank_holidays_cache(cache: Optional[dict], status: int, headers, data: Optional[dict], now: float) -> dict:
+    """Return the bank holiday cache updated with a gov.uk response (`data` is None for 304 Not Modified)."""
+    if status == 304 and cache:
+        if log.verbose:
+            click.echo('Cached bank holidays are still up to date')
+        return dict(cache, fetched_at=now)
+    return {
+        'fetched_at': now,
+        'etag': headers.get('ETag'),
+        'last_modified': headers.get('Last-Modified'),
+        'ordinals': parse_bank_holidays(data),
+    }
+
+
+def cached_bank_holidays_fallback(cache: Optional[dict], error: Exception) -> List[int]:
+    """Return the cached bank holidays after failing to fetch them, or raise `error` if there is no cache."""
+    if cache is None:
+        raise error
+    if log.verbose:
+        click.echo(f'Cannot fetch bank holidays ({error}), using cached copy...')
+    return cache['ordinals']
+
+
+def load_bank_holidays(path: str = None, ttl: datetime.timedelta = BANK_HOLIDAYS_TTL) -> List[int]:
+    """Return the sorted date ordinals of the bank holidays for England.
+
+    The list is read from the local cache while it is younger than `ttl`. Otherwise it is revalidated against the
+    UK government endpoint with ``If-None-Match``/``If-Modified-Since``, and if the endpoint cannot be reached the
+    cached copy is used regardless of its age.
+    """
+    path = path or get_bank_holidays_cache_path()
+    cache = read_bank_holidays_cache(path)
+    now = time.time()
+    if cache and now - cache.get('fetched_at', 0) < ttl.total_seconds():
+        trace.count('bank holidays cache hits')
+        return cache['ordinals']
+
+    trace.count('bank holidays cache misses')
     if log.verbose:
         click.echo('Fetching bank holidays from UK Government API...')
-    r = requests.get('https://www.gov.uk/bank-holidays.json')
-    data = r.json()
-    england_data = data['england-and-wales']['events']
-    for event in england_data:
-        date = datetime.datetime.strptime(event['date'], UKGOV_TIMESTAMP_FORMAT)
-        yield date
+    import requests
+
+    try:
+        with trace.span('http request', url=UKGOV_BANK_HOLIDAYS_URL):
+            r = requests.get(UKGOV_BANK_HOLIDAYS_URL, headers=revalidation_headers(cache), timeout=REQUEST_TIMEOUT)
+        trace.count('requests')
+        if trace.enabled:
+            trace.count('bytes received', len(r.content))
+        if r.status_code != 304:
+            r.raise_for_status()
+        data = r.json() if r.status_code != 304 else None
+        cache = updated_bank_holidays_cache(cache, r.status_code, r.headers, data, now)
+    except (requests.RequestException, ValueError, KeyError) as e:
+        return cached_bank_holidays_fallback(cache, e)
+    write_json_cache(path, cache)
+    return cache['ordinals']
+
+
+async def load_bank_holidays_async(path: str = None, ttl: datetime.timedelta = BANK_HOLIDAYS_TTL) -> List[int]:
+    """Return the sorted date ordinals of the bank holidays for England, like `load_bank_holidays`, using aiohttp."""
+    path = path or get_bank_holidays_cache_path()
+    cache = read_bank_holidays_cache(path)
+    now = time.time()
+    if cache and now - cache.get('fetched_at', 0) < ttl.total_seconds():
+        trace.count('bank holidays cache hits')
+        return cache['ordinals']
+
+    trace.count('bank holidays cache misses')
+    if log.verbose:
+        click.echo('Fetching bank holidays from UK Government API...')
+    import aiohttp
+    import asyncio
+
+    try:
+        timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async with session.get(UKGOV_BANK_HOLIDAYS_URL, headers=revalidation_headers(cache)) as r:
+                trace.count('requests')
+                if r.status != 304:
+                    r.raise_for_status()
+                data = await r.json(content_type=None) if r.status != 304 else None
+                cache = updated_bank_holidays_cache(cache, r.status, r.headers, data, now)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError) as e:
+        return cached_bank_holidays_fallback(cache, e)
+    write_json_cache(path, cache)
+    return cache['ordinals']
+
+
+def gov_uk_bank_holidays():
+    """Generate bank holiday dates for England, as datetimes at midnight."""
+    for ordinal in load_bank_holidays():
+        yield datetime.datetime.fromordinal(ordinal)
 
 
 def gov_uk_bank_holidays_between(start: datetime.datetime, end: datetime.datetime) -> int:
     """Return the total amount of bank holidays between two given dates."""
-    bank_holidays = [day for day in gov_uk_bank_holidays() if start <= day <= end]
-    return len(bank_holidays)
+    ordinals = load_bank_holidays()
+    # a bank holiday counts if its midnight falls within [start, end]
+    first = first_midnight_ordinal(start)
+    return max(0, bisect.bisect_right(ordinals, end.toordinal()) - bisect.bisect_left(ordinals, first))
@@ -0,0 +1,54 @@
+import collections
+import datetime
+from typing import Callable, Dict, Iterable, List
+from wwe.entry import TimeEntry
+
+HISTORY_COLUMNS = ('date', 'worked_seconds', 'to_work_seconds', 'balance_seconds', 'balance')
+
+
+def bucket_by_start_day(entries: Iterable[TimeEntry],
+                        now: datetime.datetime = None) -> Dict[datetime.date, datetime.timedelta]:
+    """Return the time worked by local day, in a single pass over the entries.
+
+    Like the balance with an end date, an entry counts entirely on the day it started. Running entries count until
+    `now`.
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    worked = collections.defaultdict(datetime.timedelta)
+    for entry in entries:
+        duration = now - entry.start if entry.is_running else entry.duration
+        worked[entry.start.astimezone().date()] += duration
+    return worked
+
+
+def balance_history(worked_by_day: Dict[datetime.date, datetime.timedelta],
+                    to_work_until: Callable[[datetime.date], datetime.timedelta],
+                    first: datetime.date, last: datetime.date,
+                    format_balance: Callable[[datetime.timedelta], str] = str) -> List[Dict]:
+    """Return the cumulative balance at the end of every day between two dates (both included), as rows.
+
+    The time to work up to every day comes from `to_work_until`, and the time worked is added up day by day, so the
+    whole history costs one pass over the days. Days without time to work nor time worked (weekends, holidays) do
+    not change the balance and are left out.
+    """
+    rows = []
+    worked = datetime.timedelta()
+    to_work_before = datetime.timedelta()
+    day = first
+    while day <= last:
+        to_work = to_work_until(day)
+        worked_today = worked_by_day.get(day, datetime.timedelta())
+        to_work_today = to_work - to_work_before
+        worked += worked_today
+        if worked_today or to_work_today:
+            balance = worked - to_work
+            rows.append({
+                'date': day.isoformat(),
+                'worked_seconds': int(worked_today.total_seconds()),
+                'to_work_seconds': int(to_work_today.total_seconds()),
+                'balance_seconds': int(balance.total_seconds()),
+                'balance': format_balance(balance),
+            })
+        to_work_before = to_work
+        day += datetime.timedelta(days=1)
+    return rows
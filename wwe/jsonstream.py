@@ -0,0 +1,91 @@
+import codecs
+import json
+import re
+from typing import Any, Iterable, Iterator, List
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+# Characters which may follow an item of an array
+DELIMITERS = ' \t\n\r,]'
+# Bytes read from a response at once when streaming it
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class JsonArrayParser:
+    """Incremental parser of a JSON array, returning every item as soon as it is complete.
+
+    Feed it the chunks of a document as they arrive. Only the unparsed tail of the chunks is kept, so memory usage
+    depends on the size of the chunks and of the items, not on the length of the array. A document which is not an
+    array (e.g. ``null``) is parsed as a whole when the parser is closed, and yields its items if it is a list.
+    """
+
+    def __init__(self):
+        """Create parser expecting the start of a document."""
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.position = 0
+        self.state = 'start'  # then 'first' (after '['), 'items' (after an item), 'done' (after ']') or 'other'
+
+    def feed(self, data: bytes) -> List[Any]:
+        """Add a chunk of the document and return the items completed by it."""
+        self.buffer = self.buffer[self.position:] + self.text_decoder.decode(data)
+        self.position = 0
+        return self._parse(final=False)
+
+    def close(self) -> List[Any]:
+        """Signal the end of the document and return the remaining items.
+
+        Raise `ValueError` if the document is not valid JSON.
+        """
+        self.buffer = self.buffer[self.position:] + self.text_decoder.decode(b'', final=True)
+        self.position = 0
+        items = self._parse(final=True)
+        if self.state == 'other':
+            document = json.loads(self.buffer)
+            return document if isinstance(document, list) else []
+        if self.state != 'done':
+            raise ValueError('Truncated JSON array')
+        return items
+
+    def _parse(self, final: bool) -> List[Any]:
+        buffer, items = self.buffer, []
+        while self.state != 'other':
+            position = WHITESPACE.match(buffer, self.position).end()
+            if position == len(buffer):
+                break
+            if self.state == 'start':
+                if buffer[position] != '[':
+                    self.state = 'other'
+                    break
+                self.state, self.position = 'first', position + 1
+                continue
+            if self.state == 'done':
+                raise ValueError(f'Extra data after JSON array at position {position}')
+            if buffer[position] == ']':
+                self.state, self.position = 'done', position + 1
+                continue
+            if self.state == 'items':
+                if buffer[position] != ',':
+                    raise ValueError(f'Expecting "," delimiter at position {position}')
+                position = WHITESPACE.match(buffer, position + 1).end()
+                if position == len(buffer):
+                    break  # the comma is parsed again with the next chunk
+            try:
+                item, end = self.decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if final:
+                    raise
+                break  # incomplete item, wait for the next chunk
+            if not final and (end == len(buffer) or buffer[end] not in DELIMITERS):
+                break  # a number may go on in the next chunk, e.g. after its "." or exponent
+            items.append(item)
+            self.state, self.position = 'items', end
+        return items
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """Yield the items of a JSON array read in chunks, as soon as each one is complete."""
+    parser = JsonArrayParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
@@ -1,6 +1,8 @@
 import datetime
 from typing import Any, Dict
 
+verbose = False
+
 
 def set_verbose_mode(verbose_mode: bool) -> None:
     """Set verbose mode value globally so that children functions can access it."""
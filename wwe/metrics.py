@@ -0,0 +1,253 @@
+import click
+import collections
+import datetime
+import http.server
+import threading
+import time
+from typing import Dict, List, Tuple, TYPE_CHECKING
+import wwe.log as log
+import wwe.trace as trace
+from wwe.config import Config
+from wwe.daemon import serve_while_refreshing
+
+if TYPE_CHECKING:
+    from wwe.toggl import TogglWrap  # noqa: F401, imported by the server only
+
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9788
+# Seconds between two refreshes of the metrics, scrapes in between are answered from memory
+REFRESH_INTERVAL = 60
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+# Upper bounds, in seconds, of the Toggl request latency histogram buckets (+Inf is implied)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Caches reporting hits and misses as '<cache> cache hits' and '<cache> cache misses' trace counters
+CACHES = ('store', 'catalog', 'bank holidays')
+
+# name: (type, help) of every metric family, in the order they are exposed
+METRICS = {
+    'wwe_balance_seconds': ('gauge', 'Time worked minus time to work since the client start date'),
+    'wwe_worked_today_seconds': ('gauge', 'Time worked for the client since local midnight'),
+    'wwe_bank_holidays_age_seconds': ('gauge', 'Time since the bank holidays were last fetched from gov.uk'),
+    'wwe_last_refresh_timestamp_seconds': ('gauge', 'UNIX time of the last successful refresh'),
+    'wwe_refresh_duration_seconds': ('gauge', 'Time the last successful refresh took'),
+    'wwe_refresh_errors': ('counter', 'Refreshes which failed, e.g. because Toggl was unreachable'),
+    'wwe_http_requests': ('counter', 'HTTP requests sent to Toggl and gov.uk'),
+    'wwe_received_bytes': ('counter', 'Bytes received from Toggl and gov.uk'),
+    'wwe_entries_downloaded': ('counter', 'Time entries downloaded from Toggl'),
+    'wwe_cache_hits': ('counter', 'Reads answered by a local cache'),
+    'wwe_cache_misses': ('counter', 'Reads which had to sync a local cache'),
+    'wwe_cache_hit_ratio': ('gauge', 'Hits out of all the reads of a local cache'),
+    'wwe_toggl_request_duration_seconds': ('histogram', 'Time until Toggl answered a request, by endpoint'),
+}
+# trace counter: metric fed by it
+TRACE_COUNTERS = {
+    'requests': 'wwe_http_requests',
+    'bytes received': 'wwe_received_bytes',
+    'entries downloaded': 'wwe_entries_downloaded',
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def escape_label_value(value: str) -> str:
+    """Return a label value escaped for the OpenMetrics text format."""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_sample(name: str, labels: Labels, value: float) -> str:
+    """Return a line of the OpenMetrics text format."""
+    if labels:
+        name += '{' + ','.join(f'{key}="{escape_label_value(str(label))}"' for key, label in labels) + '}'
+    return f'{name} {float(value)!r}'
+
+
+def endpoint_label(section: str) -> str:
+    """Return a Toggl API section without the IDs in it, e.g. ``workspaces/:id/clients``, to keep few labels."""
+    return '/'.join(':id' if part.isdigit() else part for part in section.split('/'))
+
+
+class Histogram:
+    """Cumulative histogram of durations, in seconds."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """Create empty histogram."""
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Add a duration."""
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def samples(self, name: str, labels: Labels) -> List[str]:
+        """Return the bucket, sum and count lines of the histogram."""
+        lines = [format_sample(f'{name}_bucket', labels + (('le', repr(float(bound))),), count)
+                 for bound, count in zip(self.buckets, self.counts)]
+        lines.append(format_sample(f'{name}_bucket', labels + (('le', '+Inf'),), self.count))
+        lines.append(format_sample(f'{name}_sum', labels, self.sum))
+        lines.append(format_sample(f'{name}_count', labels, self.count))
+        return lines
+
+
+class MetricsRegistry:
+    """Metrics of a ``wwe serve-metrics`` process, rendered in the OpenMetrics text format.
+
+    Gauges are set after every refresh, while counters and latencies are fed by the trace spans and counters the
+    rest of wwe already reports, as a trace observer. Rendering only reads memory, so scrapes cost no request.
+    """
+
+    def __init__(self):
+        """Create empty registry."""
+        self.lock = threading.Lock()
+        self.samples: Dict[str, Dict[Labels, float]] = collections.defaultdict(dict)
+        self.latencies: Dict[str, Histogram] = {}
+
+    def set(self, name: str, value: float, **labels) -> None:
+        """Set a gauge."""
+        with self.lock:
+            self.samples[name][tuple(sorted(labels.items()))] = value
+
+    def add(self, name: str, value: float = 1, **labels) -> None:
+        """Add to a counter."""
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.samples[name][key] = self.samples[name].get(key, 0) + value
+
+    def span(self, name: str, seconds: float, args: dict) -> None:
+        """Record the latency of the Toggl requests (trace observer)."""
+        if name != 'http request' or 'section' not in args:
+            return
+        endpoint = endpoint_label(args['section'])
+        with self.lock:
+            self.latencies.setdefault(endpoint, Histogram()).observe(seconds)
+
+    def count(self, name: str, value: float) -> None:
+        """Add a trace counter increment to the matching counter (trace observer)."""
+        if name in TRACE_COUNTERS:
+            self.add(TRACE_COUNTERS[name], value)
+            return
+        for cache in CACHES:
+            if name == f'{cache} cache hits':
+                self.add('wwe_cache_hits', value, cache=cache)
+            elif name == f'{cache} cache misses':
+                self.add('wwe_cache_misses', value, cache=cache)
+
+    def render(self) -> str:
+        """Return every metric in the OpenMetrics text format."""
+        with self.lock:
+            samples = {name: dict(values) for name, values in self.samples.items()}
+            latencies = {endpoint: histogram.samples('wwe_toggl_request_duration_seconds', (('endpoint', endpoint),))
+                         for endpoint, histogram in sorted(self.latencies.items())}
+        hits, misses = samples.get('wwe_cache_hits', {}), samples.get('wwe_cache_misses', {})
+        for labels in set(hits) | set(misses):
+            total = hits.get(labels, 0) + misses.get(labels, 0)
+            samples.setdefault('wwe_cache_hit_ratio', {})[labels] = hits.get(labels, 0) / total
+
+        lines = []
+        for name, (metric_type, description) in METRICS.items():
+            lines.append(f'# TYPE {name} {metric_type}')
+            lines.append(f'# HELP {name} {description}')
+            if metric_type == 'histogram':
+                for histogram_lines in latencies.values():
+                    lines.extend(histogram_lines)
+                continue
+            sample_name = f'{name}_total' if metric_type == 'counter' else name
+            for labels, value in sorted(samples.get(name, {}).items()):
+                lines.append(format_sample(sample_name, labels, value))
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+
+def refresh_metrics(registry: MetricsRegistry, config: Config, options: dict, t: 'TogglWrap') -> None:
+    """Recompute the balance and today's worked time of every client, and set their gauges.
+
+    The local store of the Toggl wrapper `t`, kept by the server, is synced first, which only downloads the recently
+    changed entries, and today's entries are then read from it without any other request.
+    """
+    from wwe.cli import compute_client_balances, get_entries_work_time
+    from wwe.gov import get_bank_holidays_cache_path, load_bank_holidays, read_bank_holidays_cache
+
+    started = time.perf_counter()
+    bank_holidays = load_bank_holidays()
+    t.expire_sync()
+    balances = compute_client_balances(config, options, bank_holidays=bank_holidays, t=t)
+    midnight = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    synced = dict(options, refresh=False, max_age=datetime.timedelta.max)
+    for client, to_work, worked in balances:
+        name = client.client.name
+        today = get_entries_work_time(client, synced, start=max(midnight, client.client.start_date), t=t)
+        registry.set('wwe_balance_seconds', (worked - to_work).total_seconds(), client=name)
+        registry.set('wwe_worked_today_seconds', today.total_seconds(), client=name)
+    cache = read_bank_holidays_cache(get_bank_holidays_cache_path())
+    if cache and 'fetched_at' in cache:
+        registry.set('wwe_bank_holidays_age_seconds', time.time() - cache['fetched_at'])
+    registry.set('wwe_refresh_duration_seconds', time.perf_counter() - started)
+    registry.set('wwe_last_refresh_timestamp_seconds', time.time())
+
+
+class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Answer ``GET /metrics`` with the registry of the server."""
+
+    def do_GET(self):
+        """Answer with the rendered registry, or 404 outside of ``/metrics``."""
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Log requests in verbose mode only."""
+        if log.verbose:
+            super().log_message(format, *args)
+
+
+class MetricsServer(http.server.ThreadingHTTPServer):
+    """HTTP server exposing a metrics registry."""
+
+    def __init__(self, address: Tuple[str, int], registry: MetricsRegistry):
+        """Listen on `address`."""
+        self.registry = registry
+        super().__init__(address, MetricsRequestHandler)
+
+
+def run_metrics_server(config: Config, options: dict, host: str = METRICS_HOST, port: int = METRICS_PORT,
+                       interval: float = REFRESH_INTERVAL) -> None:
+    """Refresh the metrics every `interval` seconds and serve them over HTTP until interrupted.
+
+    Like the daemon, the server keeps one store and one Toggl wrapper (with its HTTP session, rate limiter and
+    catalog) for all the refreshes.
+    """
+    from wwe.store import open_store
+    from wwe.toggl import TogglWrap
+
+    store = open_store(token=config.toggl_token)
+    t = TogglWrap(token=config.toggl_token, store=store)
+    registry = MetricsRegistry()
+    trace.add_observer(registry)
+    server = MetricsServer((host, port), registry)
+    click.echo(f'Serving metrics on http://{host}:{server.server_address[1]}/metrics, refreshing every {interval:g}s')
+
+    # every refresh syncs the store, and only the first one honours --refresh
+    options = dict(options, max_age=None)
+
+    def refresh():
+        try:
+            refresh_metrics(registry, config, options, t)
+        finally:
+            options['refresh'] = False
+
+    try:
+        serve_while_refreshing(server, refresh, interval, on_error=lambda e: registry.add('wwe_refresh_errors'))
+    finally:
+        trace.remove_observer(registry)
+        store.close()
@@ -0,0 +1,104 @@
+import datetime
+from typing import List, Optional, Tuple
+import wwe.trace as trace
+from wwe.entry import TimeEntry
+
+# Most time entries Toggl returns per request
+TOGGL_PAGE_SIZE = 1000
+# Windows downloaded concurrently are sized to hold this fraction of a page, so that denser periods than the
+# average still fit in a single request
+WINDOW_FILL = 0.8
+MIN_WINDOW = datetime.timedelta(hours=1)
+
+
+class TimeEntryCursor:
+    """Pagination of the time entries started within [start_date, end_date], shared by the sync and async clients.
+
+    Every page is requested from the start of the last entry received, rather than one second later, so that
+    entries sharing that second are not skipped: the entries received twice are recognised by their ID. A page
+    shorter than `page_size` is the last one, which saves the empty request that would otherwise end the loop.
+    """
+
+    def __init__(self, start_date: datetime.datetime, end_date: datetime.datetime = None,
+                 page_size: int = None):
+        """Create cursor positioned at `start_date`, expecting pages of `page_size` (`TOGGL_PAGE_SIZE`) entries."""
+        assert start_date.tzinfo is not None
+        if end_date:
+            assert end_date.tzinfo is not None
+        self.start_date = start_date
+        self.end_date = end_date
+        self.page_size = page_size or TOGGL_PAGE_SIZE
+        self.position = start_date
+        self.done = False
+        self.requests = 0
+        self.received = 0
+        self._page_received = 0
+        self._page_last_start = None
+        # IDs of the entries of the current page started at `_page_last_start`
+        self._page_ids = set()
+        # IDs of the received entries started at `position`, the only ones the next page can repeat
+        self._ids_at_position = set()
+
+    def params(self) -> dict:
+        """Return the query parameters of the next page."""
+        from wwe.toggl_api import write_toggl_timestamp
+
+        return {'start_date': write_toggl_timestamp(self.position), 'end_date': write_toggl_timestamp(self.end_date)}
+
+    def accept(self, entry: TimeEntry) -> bool:
+        """Record an entry of the current page, and return false if it was already received in the previous one."""
+        self._page_received += 1
+        if entry.id in self._ids_at_position:
+            return False
+        if entry.start != self._page_last_start:
+            self._page_last_start = entry.start
+            self._page_ids = set()
+        self._page_ids.add(entry.id)
+        self.received += 1
+        return True
+
+    def end_page(self) -> None:
+        """Move past the current page, or mark the pagination as done."""
+        self.requests += 1
+        trace.count('entries downloaded', self._page_received)
+        if self._page_received < self.page_size:
+            if self._page_received:
+                trace.count('requests saved')
+            self.done = True
+        elif self._page_last_start is None or self._page_last_start == self.position:
+            # a whole page of entries started within the same second: it cannot be paginated by start time
+            self.position += datetime.timedelta(seconds=1)
+            self._ids_at_position = set()
+        else:
+            self.position = self._page_last_start
+            self._ids_at_position = self._page_ids
+        if self.end_date is not None and self.position > self.end_date:
+            self.done = True
+        self._page_received = 0
+        self._page_last_start = None
+        self._page_ids = set()
+
+    def density(self) -> Optional[float]:
+        """Return the entries received per second of history so far, or None if unknown."""
+        if self._page_last_start is not None or not self.received:
+            return None
+        elapsed = (self.position - self.start_date).total_seconds()
+        return self.received / elapsed if elapsed > 0 else None
+
+    def remaining_windows(self, end_date: datetime.datetime) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+        """Split the period not received yet into windows expected to fit in a page each, given the density so far.
+
+        Dense histories get short windows and sparse ones long windows, instead of one window per month whatever
+        the amount of entries.
+        """
+        density = self.density()
+        window = MIN_WINDOW
+        if density:
+            window = max(MIN_WINDOW, datetime.timedelta(seconds=self.page_size * WINDOW_FILL / density))
+        windows = []
+        window_start = self.position
+        while window_start < end_date:
+            window_end = min(end_date, window_start + window)
+            windows.append((window_start, window_end))
+            window_start = window_end
+        return windows
@@ -0,0 +1,81 @@
+import asyncio
+import datetime
+import email.utils
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Thread-safe token bucket rate limiter.
+
+    Tokens are added at `rate` per second up to `capacity`, and every request takes one, so bursts of up to
+    `capacity` requests go through at once and the sustained rate never exceeds `rate`.
+    """
+
+    def __init__(self, rate: float, capacity: int = 1):
+        """Create a full bucket."""
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated_at:  # nothing is added during a pause
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+    def _try_acquire(self) -> float:
+        """Take a token if available and return 0, otherwise return how many seconds to wait before trying again."""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now >= self.paused_until and self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return max(self.paused_until - now, (1 - self.tokens) / self.rate)
+
+    def acquire(self) -> None:
+        """Block until a token is available and take it."""
+        wait = self._try_acquire()
+        while wait:
+            time.sleep(wait)
+            wait = self._try_acquire()
+
+    async def acquire_async(self) -> None:
+        """Wait without blocking the event loop until a token is available and take it."""
+        wait = self._try_acquire()
+        while wait:
+            await asyncio.sleep(wait)
+            wait = self._try_acquire()
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for `seconds`, e.g. after the server asked to slow down.
+
+        A single token is available when the pause ends, so that the request which was refused is retried right
+        away, and the bucket only refills from then on.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.paused_until = max(self.paused_until, now + seconds)
+            self.tokens = 1
+            self.updated_at = self.paused_until
+
+
+def parse_retry_after(value: Optional[str], default: float = 1.0) -> float:
+    """Return how many seconds to wait according to a ``Retry-After`` header (delay in seconds or HTTP date)."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
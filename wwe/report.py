@@ -0,0 +1,58 @@
+import collections
+import datetime
+from typing import Dict, Iterable, Iterator, Tuple
+from wwe.entry import TimeEntry
+
+
+def split_by_local_day(start: datetime.datetime,
+                       stop: datetime.datetime) -> Iterator[Tuple[datetime.date, datetime.timedelta]]:
+    """Generate the time worked on every local day between two timezone aware datetimes.
+
+    Input> 2000-01-01 22:00:00 - 2000-01-02 01:30:00
+    Would generate:
+    (2000-01-01, 2:00:00)
+    (2000-01-02, 1:30:00)
+    """
+    current = start.astimezone()  # system local timezone
+    stop = stop.astimezone()
+    while current < stop:
+        day = current.date()
+        # naive datetimes are interpreted as system local time, which keeps the midnight right across DST changes
+        next_midnight = datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time()).astimezone()
+        piece_end = min(stop, next_midnight)
+        yield day, piece_end - current
+        current = piece_end
+
+
+class Aggregator:
+    """Single pass aggregation of worked time per local day, per ISO week and per project.
+
+    Entries spanning midnight are split between the days (and weeks) they span. Running entries are counted up to
+    `now`.
+    """
+
+    def __init__(self, now: datetime.datetime = None):
+        """Create empty aggregation."""
+        self.now = now or datetime.datetime.now(datetime.timezone.utc)
+        self.total = datetime.timedelta()
+        self.by_day: Dict[datetime.date, datetime.timedelta] = collections.defaultdict(datetime.timedelta)
+        self.by_week: Dict[Tuple[int, int], datetime.timedelta] = collections.defaultdict(datetime.timedelta)
+        self.by_project: Dict[int, datetime.timedelta] = collections.defaultdict(datetime.timedelta)
+        self.entries = 0
+
+    def add(self, entry: TimeEntry) -> None:
+        """Add the time of an entry to every bucket."""
+        stop = self.now if entry.is_running else entry.start + entry.duration
+        for day, worked in split_by_local_day(entry.start, stop):
+            self.by_day[day] += worked
+            self.by_week[day.isocalendar()[:2]] += worked
+        worked = stop - entry.start
+        self.by_project[entry.pid] += worked
+        self.total += worked
+        self.entries += 1
+
+    def consume(self, entries: Iterable[TimeEntry]) -> 'Aggregator':
+        """Add every entry of an iterable and return the aggregator."""
+        for entry in entries:
+            self.add(entry)
+        return self
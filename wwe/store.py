@@ -0,0 +1,404 @@
+import click
+import contextlib
+import datetime
+import itertools
+import json
+import sqlite3
+from typing import Callable, Iterable, Iterator, List, Optional, Set, Tuple, TYPE_CHECKING
+import wwe.log as log
+import wwe.trace as trace
+from wwe.cache import get_cache_path
+from wwe.entry import TimeEntry
+from wwe.filters import EntryFilter
+
+if TYPE_CHECKING:
+    from wwe.toggl_api import TogglAPI  # noqa: F401, imported lazily to keep the HTTP stack out of startup
+
+# Entries whose start falls within this window before the last sync are downloaded again on every sync, so that
+# edits, deletions and running entries that stopped since the last run are picked up. Older entries changed in
+# Toggl are found through the changes feed of the ``me`` endpoint instead.
+RECHECK_WINDOW = datetime.timedelta(days=2)
+# Periods longer than this are downloaded in concurrent windows, sized after the density of their first page
+CONCURRENT_DOWNLOAD_THRESHOLD = datetime.timedelta(days=31)
+
+# Entries are written this many at a time, each batch in its own short transaction, so that the write lock is never
+# held while entries are downloaded and other processes can use the store meanwhile
+WRITE_BATCH_SIZE = 1000
+# Seconds to wait for another process to release the write lock before failing with "database is locked"
+BUSY_TIMEOUT = 30
+
+# Bump whenever SCHEMA or the sync state changes: stores with another version are rebuilt from scratch, as they are
+# only a cache
+SCHEMA_VERSION = 4
+SCHEMA = '''
+CREATE TABLE time_entries (
+    id INTEGER PRIMARY KEY,
+    wid INTEGER,
+    pid INTEGER,
+    start INTEGER NOT NULL,
+    stop INTEGER,
+    duration INTEGER NOT NULL,
+    description TEXT,
+    at INTEGER,
+    tags TEXT NOT NULL DEFAULT '[]',
+    billable INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX time_entries_start ON time_entries (start);
+CREATE TABLE sync_state (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+)
+'''
+
+
+def to_epoch(timestamp: datetime.datetime) -> int:
+    """Return the UNIX timestamp of a timezone aware datetime."""
+    return int(timestamp.timestamp())
+
+
+def from_epoch(seconds: int) -> datetime.datetime:
+    """Return a UTC datetime from a UNIX timestamp."""
+    return datetime.datetime.fromtimestamp(seconds, tz=datetime.timezone.utc)
+
+
+def entry_to_row(entry: TimeEntry) -> tuple:
+    """Return the `time_entries` row of a time entry."""
+    return (
+        entry.id,
+        entry.wid,
+        entry.pid,
+        to_epoch(entry.start),
+        to_epoch(entry.stop) if entry.stop else None,
+        int(entry.duration.total_seconds()),
+        entry.description,
+        to_epoch(entry.at) if entry.at else None,
+        json.dumps(entry.tags) if entry.tags else '[]',
+        int(entry.billable),
+    )
+
+
+def row_to_entry(row: tuple) -> TimeEntry:
+    """Return the time entry stored in a `time_entries` row."""
+    id, wid, pid, start, stop, duration, description, at, tags, billable = row
+    return TimeEntry(
+        id=id,
+        wid=wid,
+        pid=pid,
+        start=from_epoch(start),
+        stop=from_epoch(stop) if stop is not None else None,
+        duration=datetime.timedelta(seconds=duration),
+        description=description,
+        at=from_epoch(at) if at is not None else None,
+        tags=tuple(json.loads(tags)) if tags != '[]' else (),
+        billable=bool(billable),
+    )
+
+
+class EntryStore:
+    """Local SQLite copy of the Toggl time entries.
+
+    The store remembers which period has already been downloaded (``synced_from`` to ``synced_until``), so that a
+    sync only needs to download the entries older than the oldest synced one plus the recheck window. Entries of
+    any age created, edited or deleted since the previous sync are applied from the Toggl changes feed, from the
+    ``changes_since`` cursor on.
+    """
+
+    def __init__(self, path: str, recheck_window: datetime.timedelta = RECHECK_WINDOW):
+        """Open (and create if needed) the store in `path`."""
+        self.path = path
+        self.recheck_window = recheck_window
+        self.connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+        # readers never block the writer (nor the other way round) in write-ahead logging mode
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        if self._schema_version() != SCHEMA_VERSION:
+            self._create_schema()
+        # UNIX timestamp of the oldest start of the entries changed by the last sync, or None if none changed
+        self.changed_from: Optional[int] = None
+
+    def _schema_version(self) -> int:
+        (version,) = self.connection.execute('PRAGMA user_version').fetchone()
+        return version
+
+    def _create_schema(self) -> None:
+        """Create the tables, dropping those of another schema version.
+
+        Another process may be creating them at the same time: the version is checked again once the write lock is
+        held, and set in the same transaction as the tables, so that a store is never seen versioned but empty.
+        """
+        self.connection.execute('BEGIN IMMEDIATE')
+        with self.connection:
+            if self._schema_version() != SCHEMA_VERSION:
+                self.connection.execute('DROP TABLE IF EXISTS time_entries')
+                self.connection.execute('DROP TABLE IF EXISTS sync_state')
+                for statement in SCHEMA.split(';'):
+                    self.connection.execute(statement)
+                self.connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        self.connection.close()
+
+    def _get_state(self, key: str) -> Optional[int]:
+        row = self.connection.execute('SELECT value FROM sync_state WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value: int) -> None:
+        self.connection.execute('INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)', (key, value))
+
+    @property
+    def synced_from(self) -> Optional[int]:
+        """Return the UNIX timestamp from which the store holds every entry."""
+        return self._get_state('synced_from')
+
+    @property
+    def synced_until(self) -> Optional[int]:
+        """Return the UNIX timestamp of the last successful sync."""
+        return self._get_state('synced_until')
+
+    @property
+    def changes_since(self) -> Optional[int]:
+        """Return the timestamp to ask Toggl the time entries changed from, or None if the store was never synced."""
+        return self._get_state('changes_since')
+
+    def clear(self) -> None:
+        """Forget every stored entry, so that the next sync downloads the whole history again."""
+        with self.connection:
+            self.connection.execute('DELETE FROM time_entries')
+            self.connection.execute('DELETE FROM sync_state')
+
+    def _upsert(self, entry: TimeEntry) -> int:
+        cursor = self.connection.execute(
+            'INSERT INTO time_entries (id, wid, pid, start, stop, duration, description, at, tags, billable) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (id) DO UPDATE SET wid = excluded.wid, pid = excluded.pid, start = excluded.start, '
+            'stop = excluded.stop, duration = excluded.duration, description = excluded.description, '
+            'at = excluded.at, tags = excluded.tags, billable = excluded.billable '
+            'WHERE time_entries.at IS NOT excluded.at',
+            entry_to_row(entry),
+        )
+        return cursor.rowcount
+
+    def replace_range(self, start: int, end: Optional[int], entries) -> Tuple[int, Optional[int]]:
+        """Replace every stored entry starting within [start, end) with `entries`.
+
+        Stored entries that are not in `entries` anymore were deleted in Toggl and are removed. Entries whose ``at``
+        (last update) timestamp did not change are not rewritten. Return how many entries were added, updated or
+        removed, and the oldest start among them (None if none changed).
+
+        `entries` are read (and so downloaded, if they are streamed) outside of any transaction, and written
+        `WRITE_BATCH_SIZE` at a time.
+        """
+        with self.connection:
+            self.connection.execute('CREATE TEMP TABLE IF NOT EXISTS fetched_ids (id INTEGER PRIMARY KEY)')
+            self.connection.execute('DELETE FROM fetched_ids')
+        changed, changed_from = 0, None
+        entries = iter(entries)
+        while True:
+            batch = list(itertools.islice(entries, WRITE_BATCH_SIZE))
+            if not batch:
+                break
+            with self.connection:
+                for entry in batch:
+                    if self._upsert(entry):
+                        changed += 1
+                        start_epoch = to_epoch(entry.start)
+                        changed_from = start_epoch if changed_from is None else min(changed_from, start_epoch)
+                    self.connection.execute('INSERT OR IGNORE INTO fetched_ids (id) VALUES (?)', (entry.id,))
+        condition = 'start >= ? AND id NOT IN (SELECT id FROM fetched_ids)'
+        parameters = [start]
+        if end is not None:
+            condition += ' AND start < ?'
+            parameters.append(end)
+        deleted, deleted_from = self.connection.execute(
+            f'SELECT COUNT(*), MIN(start) FROM time_entries WHERE {condition}', parameters).fetchone()
+        if deleted:
+            with self.connection:
+                self.connection.execute(f'DELETE FROM time_entries WHERE {condition}', parameters)
+            changed += deleted
+            changed_from = deleted_from if changed_from is None else min(changed_from, deleted_from)
+        return changed, changed_from
+
+    def apply_changes(self, entries: Iterable[TimeEntry], deleted_ids: Iterable[int]) -> Tuple[int, Optional[int]]:
+        """Add or update changed entries and remove deleted ones, whatever their start.
+
+        Entries started before ``synced_from`` are left out (or removed, if they were moved there), as the store
+        does not hold that period. Return how many entries changed, and the oldest start among them (None if none
+        changed).
+        """
+        synced_from = self.synced_from
+        changed_starts = []
+        for entry in entries:
+            start = to_epoch(entry.start)
+            # an entry moved to another start changes both its old and new days
+            row = self.connection.execute('SELECT start FROM time_entries WHERE id = ?', (entry.id,)).fetchone()
+            if start < synced_from:
+                if row is not None:
+                    self.connection.execute('DELETE FROM time_entries WHERE id = ?', (entry.id,))
+                    changed_starts.append(row[0])
+            elif self._upsert(entry):
+                changed_starts.append(start if row is None else min(start, row[0]))
+        for entry_id in deleted_ids:
+            row = self.connection.execute('SELECT start FROM time_entries WHERE id = ?', (entry_id,)).fetchone()
+            if row is not None:
+                self.connection.execute('DELETE FROM time_entries WHERE id = ?', (entry_id,))
+                changed_starts.append(row[0])
+        return len(changed_starts), min(changed_starts, default=None)
+
+    def is_fresh(self, start: datetime.datetime, max_age: datetime.timedelta, now: datetime.datetime = None) -> bool:
+        """Return true if the store holds every entry since `start` and was synced less than `max_age` ago."""
+        synced_from, synced_until = self.synced_from, self.synced_until
+        if synced_from is None or synced_from > to_epoch(start):
+            return False
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        return to_epoch(now) - synced_until <= max_age.total_seconds()
+
+    def _oldest_running_start(self) -> Optional[int]:
+        row = self.connection.execute('SELECT MIN(start) FROM time_entries WHERE duration < 0').fetchone()
+        return row[0]
+
+    def plan_sync(self, start: datetime.datetime) -> List[Tuple[int, Optional[int]]]:
+        """Return the periods that must be downloaded to sync the store from `start`.
+
+        Periods are (from, until) UNIX timestamps, with until excluded, or None for "until now". A cold store needs
+        the whole history from `start`. A warm store only needs the entries started within the recheck window before
+        the last sync (or since the oldest running entry, if older), plus the period between `start` and the oldest
+        synced entry if `start` is earlier than any previous sync.
+        """
+        assert start.tzinfo is not None
+        synced_from = self.synced_from
+        requested_from = to_epoch(start)
+        if synced_from is None:
+            if log.verbose:
+                click.echo('Local time entry store is empty, downloading full history...')
+            return [(requested_from, None)]
+
+        periods = []
+        if requested_from < synced_from:
+            if log.verbose:
+                click.echo(f'Backfilling local time entry store from {start}...')
+            periods.append((requested_from, synced_from))
+        recheck_from = self.synced_until - int(self.recheck_window.total_seconds())
+        oldest_running = self._oldest_running_start()
+        if oldest_running is not None:
+            recheck_from = min(recheck_from, oldest_running)
+        recheck_from = max(recheck_from, synced_from)
+        if log.verbose:
+            click.echo(f'Syncing time entries changed since {from_epoch(recheck_from)}...')
+        periods.append((recheck_from, None))
+        return periods
+
+    @contextlib.contextmanager
+    def sync_session(self, start: datetime.datetime, now: datetime.datetime = None,
+                     changes: Tuple[int, Iterable[TimeEntry], Iterable[int]] = None,
+                     ) -> Iterator[Callable[[int, Optional[int], Iterable[TimeEntry]], None]]:
+        """Run a sync, yielding a function replacing a period with its downloaded entries.
+
+        The yielded function takes the (from, until, entries) of a period planned by `plan_sync`, or of consecutive
+        windows covering it, so that each window can be written as soon as it is downloaded. `changes` is the
+        (since, changed entries, deleted IDs) feed of the entries changed after ``changes_since``, as returned by
+        `TogglAPI.get_time_entry_changes`. ``changed_from`` is set to the oldest start of the changed entries.
+
+        Entries are written in short transactions (see `replace_range`) rather than one for the whole sync, so the
+        store stays usable by other processes while it downloads. The synced period is only recorded when the block
+        ends: if it raises, the periods already written hold entries as up to date as Toggl returned them, and the
+        next sync downloads them again.
+        """
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        results = []
+
+        def replace(period_from: int, period_until: Optional[int], entries: Iterable[TimeEntry]) -> None:
+            results.append(self.replace_range(period_from, period_until, entries))
+
+        with trace.span('store write'):
+            if changes is not None:
+                since, changed_entries, deleted_ids = changes
+                with self.connection:
+                    results.append(self.apply_changes(changed_entries, deleted_ids))
+                    self._set_state('changes_since', since)
+            yield replace
+            with self.connection:
+                if self.changes_since is None:
+                    # nothing changed before the first sync
+                    self._set_state('changes_since', to_epoch(now))
+                synced_from = self.synced_from
+                requested_from = to_epoch(start)
+                self._set_state('synced_from',
+                                requested_from if synced_from is None else min(synced_from, requested_from))
+                self._set_state('synced_until', to_epoch(now))
+        changed = sum(count for count, _ in results)
+        self.changed_from = min((oldest for _, oldest in results if oldest is not None), default=None)
+        if log.verbose:
+            click.echo(f'{changed} time entries added, updated or removed in the local store')
+
+    def commit_sync(self, start: datetime.datetime,
+                    downloads: Iterable[Tuple[int, Optional[int], Iterable[TimeEntry]]],
+                    now: datetime.datetime = None,
+                    changes: Tuple[int, Iterable[TimeEntry], Iterable[int]] = None) -> None:
+        """Replace the periods planned by `plan_sync` with their downloaded entries, and record the sync.
+
+        Every item of `downloads` is a (from, until, entries) tuple, written as in `sync_session`.
+        """
+        with self.sync_session(start, now=now, changes=changes) as replace:
+            for period_from, period_until, entries in downloads:
+                replace(period_from, period_until, entries)
+
+    def sync(self, api: 'TogglAPI', start: datetime.datetime, now: datetime.datetime = None) -> None:
+        """Bring the store up to date with Toggl for every entry started after `start`.
+
+        Long periods (like a whole history) are downloaded in concurrent windows, see
+        `TogglAPI.get_time_entries_concurrently`.
+        """
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+
+        def download(period_from: int, period_until: Optional[int]):
+            start_date = from_epoch(period_from)
+            end_date = from_epoch(period_until) if period_until is not None else None
+            if ((end_date or now) - start_date) > CONCURRENT_DOWNLOAD_THRESHOLD:
+                entries = api.get_time_entries_concurrently(start_date=start_date, end_date=end_date)
+            else:
+                entries = api.get_time_entries(start_date=start_date, end_date=end_date)
+            return period_from, period_until, entries
+
+        changes_since = self.changes_since
+        changes = api.get_time_entry_changes(since=changes_since) if changes_since is not None else None
+        downloads = (download(*period) for period in self.plan_sync(start))
+        self.commit_sync(start, downloads, now=now, changes=changes)
+
+    def project_ids(self, start: int = None) -> Set[int]:
+        """Return the IDs of the projects of the stored entries started from the UNIX timestamp `start`, or ever."""
+        rows = self.connection.execute('SELECT DISTINCT pid FROM time_entries WHERE pid IS NOT NULL AND start >= ?',
+                                       (start if start is not None else -2 ** 63,))
+        return {pid for (pid,) in rows}
+
+    def entries(self, start: datetime.datetime, end: datetime.datetime = None,
+                entry_filter: EntryFilter = None) -> Iterator[TimeEntry]:
+        """Yield stored entries started within [start, end), sorted by start time.
+
+        If an `entry_filter` is given, it is evaluated by SQLite so that entries not meeting it are never decoded.
+        """
+        query = ('SELECT id, wid, pid, start, stop, duration, description, at, tags, billable FROM time_entries '
+                 'WHERE start >= ?')
+        parameters = [to_epoch(start)]
+        if end is not None:
+            query += ' AND start < ?'
+            parameters.append(to_epoch(end))
+        if entry_filter is not None:
+            condition, filter_parameters = entry_filter.to_sql()
+            query += f' AND {condition}'
+            parameters.extend(filter_parameters)
+        query += ' ORDER BY start, id'
+        for row in self.connection.execute(query, parameters):
+            yield row_to_entry(row)
+
+
+def get_default_store_path(token: str) -> str:
+    """Return the path of the local time entry store for a given Toggl token."""
+    return get_cache_path('entries.sqlite3', token=token)
+
+
+def open_store(token: str) -> EntryStore:
+    """Open the local time entry store that belongs to a given Toggl token."""
+    path = get_default_store_path(token)
+    if log.verbose:
+        click.echo(f'Opening local time entry store "{path}"...')
+    return EntryStore(path)
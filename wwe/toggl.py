@@ -1,8 +1,12 @@
 import click
-from datetime import datetime, date
-from tzlocal import get_localzone
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
+from typing import Dict, Set
 import wwe.log as log
-from wwe.toggl_api import TogglAPI
+import wwe.trace as trace
+from wwe.catalog import Catalog, CATALOG_TTL, load_catalog, save_catalog, sync_catalog
+from wwe.filters import EntryFilter
+from wwe.store import EntryStore
 
 
 def filter_entries(entries, filters):
@@ -23,6 +27,8 @@ def ensure_datetime_timezone(timestamp):
     """Ensure timezone is set."""
     if timestamp is None:
         return
+    from tzlocal import get_localzone
+
     current_tz = timestamp.tzinfo
     local_tz = get_localzone()
     if current_tz == local_tz:
@@ -33,93 +39,149 @@ def ensure_datetime_timezone(timestamp):
 class TogglWrap:
     """Toggl Client wrapper."""
 
-    def __init__(self, token=""):
-        """Instantiate TogglAPI client if there a token is passed."""
+    def __init__(self, token="", store: EntryStore = None):
+        """Instantiate TogglAPI client if there a token is passed.
+
+        If a `store` is passed, time entries are read from it after syncing it with Toggl, instead of being
+        downloaded from Toggl on every call.
+
+        The TogglAPI client (and with it the whole HTTP stack) is only created when a request is needed.
+        """
         assert token
         if log.verbose:
             click.echo('Instantiating Toggle API wrapper...')
-        self.toggl = TogglAPI(api_token=token)
-
-    def get_filtered_entries(self, filters, start: datetime = None, end: datetime = None):
-        """Return only the entries between two given dates which pass the passed `filters`."""
+        self.token = token
+        self.store = store
+        self._toggl = None
+        self._catalog = None
+        self._synced_from = None
+
+    @property
+    def toggl(self):
+        """Return the TogglAPI client, creating it on first use."""
+        if self._toggl is None:
+            from wwe.toggl_api import TogglAPI
+
+            self._toggl = TogglAPI(api_token=self.token)
+        return self._toggl
+
+    @toggl.setter
+    def toggl(self, value):
+        self._toggl = value
+
+    def get_filtered_entries(self, filters=(), start: datetime = None, end: datetime = None,
+                             max_age: timedelta = None, entry_filter: EntryFilter = None):
+        """Return only the entries between two given dates which pass the passed `filters` and `entry_filter`.
+
+        If the store was synced less than `max_age` ago, it is used as it is without contacting Toggl. The
+        `entry_filter` is evaluated by the store, so entries it discards are never decoded, and `filters` (any
+        functions) are applied afterwards.
+        """
         if start is None:
             start = datetime.combine(date.today(), datetime.min.utctime())
         start, end = (ensure_datetime_timezone(x) for x in (start, end))
-        entries = self.toggl.get_time_entries(start_date=start, end_date=end)
-        for entry in filter_entries(entries, filters):
-            yield entry
+        if self.store is None:
+            entries = self.toggl.get_time_entries(start_date=start, end_date=end)
+            if entry_filter is not None:
+                entries = entry_filter.apply(entries)
+        else:
+            self.sync_store(start=start, max_age=max_age)
+            entries = self.store.entries(start=start, end=end, entry_filter=entry_filter)
+        if trace.enabled:
+            entries = trace.count_items(entries, 'entries read')
+        if filters:
+            entries = filter_entries(entries, filters)
+        yield from entries
+
+    def sync_store(self, start: datetime, max_age: timedelta = None) -> None:
+        """Sync the local store with Toggl for every entry started after `start`, unless it is recent enough.
+
+        The store is used as it is if it was synced less than `max_age` ago, or already synced from `start` by this
+        wrapper, e.g. before looking up the client projects.
+        """
+        start = ensure_datetime_timezone(start)
+        if self._synced_from is not None and self._synced_from <= start:
+            return
+        if max_age is None or not self.store.is_fresh(start=start, max_age=max_age):
+            trace.count('store cache misses')
+            with trace.span('sync'):
+                self.store.sync(self.toggl, start=start)
+        else:
+            trace.count('store cache hits')
+            if log.verbose:
+                click.echo('Local time entry store is recent enough, not syncing it')
+        self._synced_from = start
+
+    def expire_sync(self) -> None:
+        """Forget that the store was synced by this wrapper, so that the next read syncs it again.
+
+        Long running processes keeping a wrapper call this before every refresh.
+        """
+        self._synced_from = None
+
+    def get_catalog(self, refresh: bool = False, ttl: float = CATALOG_TTL) -> Catalog:
+        """Return the workspaces, clients and projects of every workspace, indexed.
+
+        The catalog is persisted, and only the changes since the last sync are downloaded once it is older than
+        `ttl` seconds. With `refresh`, the whole catalog is downloaded again.
+        """
+        catalog = None if refresh else self._catalog or load_catalog(self.token)
+        if catalog is not None and not catalog.is_stale(ttl=ttl):
+            trace.count('catalog cache hits')
+        else:
+            trace.count('catalog cache misses')
+            with trace.span('catalog sync'):
+                since = catalog.since if catalog is not None else None
+                catalog = sync_catalog(catalog, self.toggl.get_me(related_data=True, since=since))
+            save_catalog(self.token, catalog)
+        self._catalog = catalog
+        return catalog
+
+    def get_client_project_ids(self, refresh: bool = False) -> Dict[str, Set[int]]:
+        """Return the IDs of the projects of every client across all workspaces, by client name."""
+        return self.get_catalog(refresh=refresh).client_project_ids()
+
+    def get_client_summary_time(self, client_name: str, since: date, until: date) -> timedelta:
+        """Return the time tracked for a client between two dates (both included), totalled by Toggl.
+
+        One summary report is requested per workspace and per year, as reports cannot span longer periods, all of
+        them at once. Running entries are not counted by Toggl reports.
+        """
+        from wwe.toggl_api import MAX_CONNECTIONS, split_years
+
+        workspace_ids = sorted(self.get_catalog().workspaces)
+        periods = [(workspace_id, period) for workspace_id in workspace_ids for period in split_years(since, until)]
+        if log.verbose:
+            click.echo(f'Fetching {len(periods)} summary reports...')
+        with ThreadPoolExecutor(max_workers=min(MAX_CONNECTIONS, len(periods) or 1)) as pool:
+            reports = [pool.submit(self.toggl.get_summary, workspace_id, *period) for workspace_id, period in periods]
+            milliseconds = sum(group['time'] or 0 for future in reports for group in future.result()['data']
+                               if (group.get('title') or {}).get('client') == client_name)
+        return timedelta(milliseconds=milliseconds)
 
     def _client_by_id(self, client_id: int):
-        if not hasattr(self, "_clients"):
-            self.clients()
-        if not hasattr(self, "_clients"):
-            raise Exception('cannot fetch clients from Toggl')
-
-        for c in self._clients:
-            if c["id"] == client_id:
-                return c
-
-        raise Exception(f"client {client_id} not found!")
+        client = self.get_catalog().clients.get(client_id)
+        if client is None:
+            raise Exception(f"client {client_id} not found!")
+        return client
 
     def _project_by_client(self, client_name: str):
-        if not hasattr(self, "_clients"):
-            self.clients()
-        if not hasattr(self, "_clients"):
-            raise Exception('cannot fetch clients from Toggl')
-        if not hasattr(self, "_projects"):
-            self.projects()
-        if not hasattr(self, "_projects"):
-            raise Exception('cannot fetch projects from Toggl')
-
-        result = []
-        for p in self._projects:
-            if "cid" in p:
-                for c in self._clients:
-                    if c["name"] == client_name and p["cid"] == c["id"]:
-                        new_p = p
-                        new_p["client"] = c["name"]
-                        result.append(new_p)
-        return result
+        catalog = self.get_catalog()
+        return [dict(catalog.projects[id], client=client_name) for id in sorted(catalog.project_ids(client_name))]
 
     def clients(self):
         """Return all clients in all workspaces."""
-        w = self.toggl.workspaces()
-        id = w[0]["id"]
-        if log.verbose:
-            click.echo(f"Fetching all clients in the workspace {id}...")
-        clients = self.toggl.clients(workspace_id=id)
-
-        result = []
-        for p in clients:
-            result.append({
-                "id": p["id"],
-                "name": p["name"],
-            })
-
-        if len(result) > 0:
-            self._clients = result
+        result = [{"id": c["id"], "name": c["name"]} for c in self.get_catalog().clients.values()]
         if log.verbose:
             click.echo(f"{len(result)} clients found")
         return result
 
     def projects(self):
         """Return all projects in all workspaces."""
-        w = self.toggl.workspaces()
-        id = w[0]["id"]
-        if log.verbose:
-            click.echo(f"Fetching all projects in the workspace {id}...")
-        projects = self.toggl.projects(workspace_id=id)
-
-        result = []
-        for p in projects:
-            result.append({
-                "id": p.get("id"),
-                "name": p.get("name"),
-                "cid": p.get("cid", "none"),
-            })
-
-        if len(result) > 0:
-            self._projects = result
+        result = [
+            {"id": p["id"], "name": p.get("name"), "cid": p.get("cid", "none")}
+            for p in self.get_catalog().projects.values()
+        ]
         if log.verbose:
-            click.echo(f"{len(result)} clients found")
+            click.echo(f"{len(result)} projects found")
         return result
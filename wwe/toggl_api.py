@@ -2,12 +2,33 @@
 
 import requests
 import click
+import collections
 import datetime
+import itertools
 import wwe.log as log
+import wwe.trace as trace
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
 
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from wwe.entry import decode_time_entry, TimeEntry
+from wwe.jsonstream import iter_json_array, STREAM_CHUNK_SIZE
+from wwe.pagination import TimeEntryCursor
+from wwe.ratelimit import parse_retry_after, TokenBucket
 
+TOGGL_API_URL = 'https://www.toggl.com/api/v8'
+TOGGL_REPORTS_API_URL = 'https://toggl.com/reports/api/v2'
+# The reports API asks every client to identify itself
+TOGGL_REPORTS_USER_AGENT = 'wwe'
 TOGGL_TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S'
+# Maximum amount of keep-alive connections kept open against Toggl, shared by all threads using a client
+MAX_CONNECTIONS = 8
+# Toggl allows roughly one request per second per token, with short bursts
+TOGGL_REQUESTS_PER_SECOND = 1.0
+TOGGL_REQUEST_BURST = 4
+# How many times a request is retried after Toggl answers 429 Too Many Requests
+MAX_RETRIES = 5
 
 
 def write_toggl_timestamp(ts: datetime.datetime):
@@ -53,6 +74,43 @@ def deserialize_toggl(obj):
     return new_obj
 
 
+def split_years(since: datetime.date, until: datetime.date) -> List[Tuple[datetime.date, datetime.date]]:
+    """Split the days between two dates (both included) into consecutive ranges of one year at most.
+
+    The Toggl reports API does not accept longer ranges.
+
+    Input> 2018-02-05 - 2019-06-01
+    Would return:
+    [(2018-02-05, 2019-02-04),
+     (2019-02-05, 2019-06-01)]
+    """
+    ranges = []
+    range_start = since
+    while range_start <= until:
+        try:
+            next_start = range_start.replace(year=range_start.year + 1)
+        except ValueError:  # 29th of February
+            next_start = range_start.replace(year=range_start.year + 1, day=28) + datetime.timedelta(days=1)
+        range_end = min(until, next_start - datetime.timedelta(days=1))
+        ranges.append((range_start, range_end))
+        range_start = range_end + datetime.timedelta(days=1)
+    return ranges
+
+
+def parse_time_entry_changes(me: dict) -> Tuple[int, List[TimeEntry], List[int]]:
+    """Return the (since, changed entries, deleted entry IDs) of a ``me`` response with related data.
+
+    `since` is the timestamp to ask the next changes from.
+    """
+    changed, deleted = [], []
+    for data in (me.get('data') or {}).get('time_entries') or ():
+        if data.get('server_deleted_at'):
+            deleted.append(data['id'])
+        else:
+            changed.append(decode_time_entry(data))
+    return me['since'], changed, deleted
+
+
 class TogglAPI(object):
     """A wrapper for Toggl API."""
 
@@ -60,20 +118,55 @@ class TogglAPI(object):
         """Initialize client."""
         if log.verbose:
             click.echo('Instantiating Toggle API...')
+        # shared by every thread using this client, so that together they never exceed Toggl's rate limit
+        self.rate_limiter = TokenBucket(rate=TOGGL_REQUESTS_PER_SECOND, capacity=TOGGL_REQUEST_BURST)
         self.session = requests.Session()
         self.session.auth = HTTPBasicAuth(api_token, 'api_token')
         self.session.headers = {'content-type': 'application/json'}
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONNECTIONS))
 
-    def get(self, section, params=None):
-        """Request resources Toggl API endpoint."""
-        response = self.session.get(
-            f'https://www.toggl.com/api/v8/{section}', params=params)
+    def _request(self, section, params=None, stream=False, base_url=None) -> requests.Response:
+        """Send a GET request to a Toggl API endpoint and return the successful response.
+
+        Requests are throttled by the client rate limiter, and retried when Toggl answers 429 Too Many Requests. The
+        endpoint is relative to the main API unless another `base_url` (e.g. the reports API) is given.
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            self.rate_limiter.acquire()
+            with trace.span('http request', section=section):
+                url = f'{base_url or TOGGL_API_URL}/{section}'
+                response = self.session.get(url, params=params, stream=stream)
+            trace.count('requests')
+            if response.status_code != 429 or attempt == MAX_RETRIES:
+                break
+            response.close()
+            delay = parse_retry_after(response.headers.get('Retry-After'), default=2 ** attempt)
+            if log.verbose:
+                click.echo(f'Toggl API: rate limited, retrying in {delay:.1f}s...')
+            self.rate_limiter.pause(delay)
         if not response.ok:
             raise ValueError(response.text)
+        return response
+
+    def get(self, section, params=None):
+        """Request resources Toggl API endpoint."""
+        response = self._request(section, params=params)
+        trace.count('bytes received', len(response.content))
         return response.json()
 
+    def get_items(self, section, params=None):
+        """Request a list of resources from a Toggl API endpoint, yielding each one as soon as it is received.
+
+        The response is parsed while it is downloaded, so memory usage does not grow with the length of the list.
+        """
+        with self._request(section, params=params, stream=True) as response:
+            chunks = response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+            yield from iter_json_array(trace.count_bytes(chunks) if trace.enabled else chunks)
+
     def get_time_entries(self, start_date: datetime.datetime, end_date: datetime.datetime = None):
-        """Get Time Entries JSON object from Toggl within a given start_date and an end_date with a given timezone.
+        """Get Time Entries from Toggl within a given start_date and an end_date with a given timezone.
+
+        Entries are yielded as `TimeEntry` objects, decoded from JSON objects like:
 
         {'at': '2018-05-23T15:04:45+00:00',
          'billable': False,
@@ -88,31 +181,63 @@ class TogglAPI(object):
          'tags': ['software imaging'],
          'uid': 2626092,
          'wid': 1819588},
+
+        Pages are requested until a short one, see `TimeEntryCursor`.
         """
-        assert start_date.tzinfo is not None
-        if end_date:
-            assert end_date.tzinfo is not None
-        request_parameters = {
-            'start_date': write_toggl_timestamp(start_date),
-            'end_date': write_toggl_timestamp(end_date),
-        }
+        cursor = TimeEntryCursor(start_date, end_date)
+        yield from self._paginate(cursor)
 
-        last_entry_date = datetime.datetime(datetime.MINYEAR, 1, 1, tzinfo=start_date.tzinfo)
-        if end_date is None:
-            end_date = datetime.datetime(datetime.MAXYEAR, 1, 1, tzinfo=start_date.tzinfo)
+    def _paginate(self, cursor: TimeEntryCursor):
         if log.verbose:
-            click.echo(f'Fetching time entries from {start_date} to {end_date}...')
-        while last_entry_date < end_date:
-            response = self.get(section='time_entries', params=request_parameters)
-            entries = deserialize_toggl(response)
-            if not entries:
-                break
-            for entry in entries:
-                yield entry
-                last_entry_date = entry['start']
+            click.echo(f'Fetching time entries from {cursor.start_date} to {cursor.end_date or "now"}...')
+        while not cursor.done:
+            params = cursor.params()
+            for entry in map(decode_time_entry, self.get_items(section='time_entries', params=params)):
+                if cursor.accept(entry):
+                    yield entry
+            cursor.end_page()
             if log.verbose:
-                click.echo(f"  >> {request_parameters['start_date']} - {last_entry_date}")
-            request_parameters['start_date'] = write_toggl_timestamp(last_entry_date + datetime.timedelta(seconds=1))
+                click.echo(f"  >> {params['start_date']} - {cursor.position}")
+
+    def get_time_entries_concurrently(self, start_date: datetime.datetime, end_date: datetime.datetime = None,
+                                      workers: int = MAX_CONNECTIONS):
+        """Get Time Entries like `get_time_entries`, downloading windows of the period concurrently.
+
+        The first page is downloaded alone: if it is the last one, nothing else is requested. Otherwise the rest of
+        the period is split into windows sized after the density of that page, expected to hold a page each.
+        Entries are yielded sorted by window, and entries returned by two adjacent windows are only yielded once.
+        """
+        if end_date is None:
+            end_date = datetime.datetime.now(start_date.tzinfo)
+        cursor = TimeEntryCursor(start_date, end_date)
+        params = cursor.params()
+        first_page = [entry for entry in map(decode_time_entry, self.get_items(section='time_entries', params=params))
+                      if cursor.accept(entry)]
+        cursor.end_page()
+        yield from first_page
+        if cursor.done:
+            return
+        windows = cursor.remaining_windows(end_date)
+        if log.verbose:
+            click.echo(f'Fetching time entries from {start_date} to {end_date} in {len(windows)} windows...')
+
+        def fetch(window):
+            return list(self.get_time_entries(start_date=window[0], end_date=window[1]))
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # only a few windows are downloaded ahead of the one being yielded, to bound memory usage
+            windows = iter(windows)
+            pending = collections.deque(pool.submit(fetch, w) for w in itertools.islice(windows, 2 * workers))
+            previous_ids = {entry.id for entry in first_page}
+            while pending:
+                entries = pending.popleft().result()
+                for window in itertools.islice(windows, 1):
+                    pending.append(pool.submit(fetch, window))
+                # an entry starting right at a window boundary is returned by both adjacent windows
+                for entry in entries:
+                    if entry.id not in previous_ids:
+                        yield entry
+                previous_ids = {entry.id for entry in entries}
 
     def get_clients(self, workspace_id):
         """Get Projects by Workspace ID."""
@@ -166,6 +291,64 @@ class TogglAPI(object):
             click.echo('Toggl API: fetching workspaces...')
         return self.get(section='workspaces')
 
-    def get_me(self):
-        """Request resources Toggl API endpoint with the 'me' section."""
-        return self.get(section='me')
+    def get_me(self, related_data: bool = False, since: int = None):
+        """Request resources Toggl API endpoint with the 'me' section.
+
+        With `related_data`, the workspaces, clients, projects (and more) of every workspace are returned too, only
+        those changed after the `since` UNIX timestamp if given:
+
+        {'since': 1361780172,
+         'data': {'id': 2626092,
+                  'default_wid': 1819588,
+                  'workspaces': [{'id': 1819588, 'name': 'ACME', 'at': '2016-12-28T02:26:24+00:00'}],
+                  'clients': [{'id': 38084455, 'wid': 1819588, 'name': 'ACME', 'at': '...'}],
+                  'projects': [{'id': 97990398, 'wid': 1819588, 'cid': 38084455, 'name': 'Software Imaging',
+                                'active': True, 'at': '...'}],
+                  'time_entries': [...]}}
+
+        Objects deleted since then have a `server_deleted_at` timestamp.
+        """
+        params = {}
+        if related_data:
+            params['with_related_data'] = 'true'
+            if since is not None:
+                params['since'] = since
+        return self.get(section='me', params=params or None)
+
+    def get_time_entry_changes(self, since: int) -> Tuple[int, List[TimeEntry], List[int]]:
+        """Return the time entries created, updated or deleted after the `since` UNIX timestamp, whatever their start.
+
+        See `parse_time_entry_changes`.
+        """
+        return parse_time_entry_changes(self.get_me(related_data=True, since=since))
+
+    def get_current_time_entry(self) -> Optional[TimeEntry]:
+        """Return the running time entry, or None if no entry is running."""
+        data = self.get(section='time_entries/current').get('data')
+        return decode_time_entry(data) if data else None
+
+    def get_summary(self, workspace_id: int, since: datetime.date, until: datetime.date,
+                    grouping: str = 'clients', subgrouping: str = 'projects') -> dict:
+        """Get the time tracked in a workspace between two dates (both included, one year at most), in totals.
+
+        Running entries are not included. Times are in milliseconds:
+
+        {'total_grand': 36004000,
+         'data': [{'id': 38084455,
+                   'title': {'client': 'ACME'},
+                   'time': 36004000,
+                   'items': [{'title': {'project': 'Software Imaging'}, 'time': 36004000}]}]}
+        """
+        if log.verbose:
+            click.echo(f'Toggl reports API: fetching summary of workspace {workspace_id} from {since} to {until}...')
+        params = {
+            'workspace_id': workspace_id,
+            'since': since.isoformat(),
+            'until': until.isoformat(),
+            'grouping': grouping,
+            'subgrouping': subgrouping,
+            'user_agent': TOGGL_REPORTS_USER_AGENT,
+        }
+        response = self._request('summary', params=params, base_url=TOGGL_REPORTS_API_URL)
+        trace.count('bytes received', len(response.content))
+        return response.json()
@@ -0,0 +1,241 @@
+import asyncio
+import base64
+import click
+import collections
+import contextlib
+import datetime
+import itertools
+import json
+from typing import Any, AsyncIterator, List, Optional, Tuple
+import wwe.log as log
+import wwe.trace as trace
+import wwe.toggl_api as toggl_api
+from wwe.entry import decode_time_entry, TimeEntry
+from wwe.catalog import Catalog, load_catalog, save_catalog, sync_catalog
+from wwe.gov import load_bank_holidays_async
+from wwe.jsonstream import JsonArrayParser, STREAM_CHUNK_SIZE
+from wwe.pagination import TimeEntryCursor
+from wwe.ratelimit import parse_retry_after, TokenBucket
+from wwe.store import EntryStore, from_epoch, to_epoch
+from wwe.toggl_api import (
+    MAX_CONNECTIONS,
+    MAX_RETRIES,
+    parse_time_entry_changes,
+    TOGGL_REQUEST_BURST,
+    TOGGL_REQUESTS_PER_SECOND,
+)
+
+try:
+    import aiohttp
+except ImportError:  # optional dependency, see the 'async' extra
+    aiohttp = None
+
+
+class AsyncTogglAPI:
+    """Asyncio variant of `TogglAPI`.
+
+    Every request goes through one aiohttp session, which keeps up to `max_connections` keep-alive connections, and
+    at most `max_connections` requests are in flight at once. Use it as an async context manager:
+
+        async with AsyncTogglAPI(api_token=token) as toggl:
+            workspaces = await toggl.get_workspaces()
+    """
+
+    def __init__(self, api_token: str, max_connections: int = MAX_CONNECTIONS):
+        """Initialize client."""
+        if aiohttp is None:
+            raise RuntimeError('AsyncTogglAPI requires aiohttp, install it with: pip install wwe[async]')
+        if log.verbose:
+            click.echo('Instantiating asynchronous Toggle API...')
+        self.rate_limiter = TokenBucket(rate=TOGGL_REQUESTS_PER_SECOND, capacity=TOGGL_REQUEST_BURST)
+        self.semaphore = asyncio.Semaphore(max_connections)
+        credentials = base64.b64encode(f'{api_token}:api_token'.encode()).decode()
+        self.session = aiohttp.ClientSession(
+            headers={'content-type': 'application/json', 'Authorization': f'Basic {credentials}'},
+            connector=aiohttp.TCPConnector(limit=max_connections),
+        )
+
+    async def __aenter__(self) -> 'AsyncTogglAPI':
+        """Return client."""
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        """Close the connections."""
+        await self.close()
+
+    async def close(self) -> None:
+        """Close the connections."""
+        await self.session.close()
+
+    @contextlib.asynccontextmanager
+    async def _request(self, section: str, params: dict = None) -> AsyncIterator['aiohttp.ClientResponse']:
+        """Send a GET request to a Toggl API endpoint, yielding the successful response like `TogglAPI._request`.
+
+        Requests are throttled by the client rate limiter, and retried when Toggl answers 429 Too Many Requests.
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            await self.rate_limiter.acquire_async()
+            async with self.semaphore:
+                url = f'{toggl_api.TOGGL_API_URL}/{section}'
+                async with self.session.get(url, params=params) as response:
+                    trace.count('requests')
+                    if response.status == 429 and attempt < MAX_RETRIES:
+                        delay = parse_retry_after(response.headers.get('Retry-After'), default=2 ** attempt)
+                    elif response.status >= 400:
+                        raise ValueError(await response.text())
+                    else:
+                        yield response
+                        return
+            if log.verbose:
+                click.echo(f'Toggl API: rate limited, retrying in {delay:.1f}s...')
+            self.rate_limiter.pause(delay)
+
+    async def get(self, section: str, params: dict = None):
+        """Request resources Toggl API endpoint."""
+        async with self._request(section, params=params) as response:
+            body = await response.read()
+        trace.count('bytes received', len(body))
+        return json.loads(body) if body else None
+
+    async def get_items(self, section: str, params: dict = None) -> AsyncIterator[Any]:
+        """Request a list of resources like `get`, yielding each one as soon as it is received."""
+        async with self._request(section, params=params) as response:
+            parser = JsonArrayParser()
+            async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                trace.count('bytes received', len(chunk))
+                for item in parser.feed(chunk):
+                    yield item
+            for item in parser.close():
+                yield item
+
+    async def get_time_entries(self, start_date: datetime.datetime,
+                               end_date: datetime.datetime = None) -> AsyncIterator[TimeEntry]:
+        """Get Time Entries from Toggl within a given start_date and an end_date, like `TogglAPI.get_time_entries`."""
+        cursor = TimeEntryCursor(start_date, end_date)
+        while not cursor.done:
+            async for item in self.get_items(section='time_entries', params=cursor.params()):
+                entry = decode_time_entry(item)
+                if cursor.accept(entry):
+                    yield entry
+            cursor.end_page()
+
+    async def get_time_entry_windows(
+            self, start_date: datetime.datetime, end_date: datetime.datetime,
+    ) -> AsyncIterator[Tuple[datetime.datetime, datetime.datetime, List[TimeEntry]]]:
+        """Yield the (from, until, entries) of consecutive windows covering [start_date, end_date), in order.
+
+        The first page is downloaded alone, and the rest of the period split into windows after its density, as in
+        `TogglAPI.get_time_entries_concurrently`. Only a few windows are downloaded ahead of the one being yielded,
+        so that memory usage does not grow with the length of the period. An entry starting right at a window
+        boundary is returned by both adjacent windows.
+        """
+        cursor = TimeEntryCursor(start_date, end_date)
+        first_page = []
+        async for item in self.get_items(section='time_entries', params=cursor.params()):
+            entry = decode_time_entry(item)
+            if cursor.accept(entry):
+                first_page.append(entry)
+        cursor.end_page()
+        if cursor.done:
+            yield start_date, end_date, first_page
+            return
+        yield start_date, cursor.position, first_page
+
+        async def fetch(window):
+            return [entry async for entry in self.get_time_entries(start_date=window[0], end_date=window[1])]
+
+        windows = iter(cursor.remaining_windows(end_date))
+        pending = collections.deque((window, asyncio.ensure_future(fetch(window)))
+                                    for window in itertools.islice(windows, 2 * MAX_CONNECTIONS))
+        try:
+            while pending:
+                window, task = pending.popleft()
+                entries = await task
+                for next_window in itertools.islice(windows, 1):
+                    pending.append((next_window, asyncio.ensure_future(fetch(next_window))))
+                yield window[0], window[1], entries
+        finally:
+            for _, task in pending:
+                task.cancel()
+
+    async def get_time_entries_concurrently(self, start_date: datetime.datetime,
+                                            end_date: datetime.datetime = None) -> AsyncIterator[TimeEntry]:
+        """Get Time Entries like `TogglAPI.get_time_entries_concurrently`, downloading windows concurrently."""
+        if end_date is None:
+            end_date = datetime.datetime.now(start_date.tzinfo)
+        previous_ids = set()
+        async for _, _, entries in self.get_time_entry_windows(start_date, end_date):
+            # an entry starting right at a window boundary is returned by both adjacent windows
+            for entry in entries:
+                if entry.id not in previous_ids:
+                    yield entry
+            previous_ids = {entry.id for entry in entries}
+
+    async def get_clients(self, workspace_id):
+        """Get Clients by Workspace ID."""
+        return await self.get(section=f'workspaces/{workspace_id}/clients')
+
+    async def get_projects(self, workspace_id):
+        """Get Projects by Workspace ID."""
+        return await self.get(section=f'workspaces/{workspace_id}/projects')
+
+    async def get_workspaces(self):
+        """Get Workspaces."""
+        return await self.get(section='workspaces')
+
+    async def get_me(self, related_data: bool = False, since: int = None):
+        """Request resources Toggl API endpoint with the 'me' section, like `TogglAPI.get_me`."""
+        params = {}
+        if related_data:
+            params['with_related_data'] = 'true'
+            if since is not None:
+                params['since'] = since
+        return await self.get(section='me', params=params or None)
+
+    async def get_time_entry_changes(self, since: int) -> Tuple[int, List[TimeEntry], List[int]]:
+        """Return the time entries changed after `since`, like `TogglAPI.get_time_entry_changes`."""
+        return parse_time_entry_changes(await self.get_me(related_data=True, since=since))
+
+    async def sync_catalog(self, catalog: Optional[Catalog]) -> Catalog:
+        """Return the catalog updated with the changes since its last sync, or a full catalog if it is None."""
+        return sync_catalog(catalog, await self.get_me(related_data=True, since=catalog.since if catalog else None))
+
+    async def sync_store(self, store: EntryStore, start: datetime.datetime) -> None:
+        """Bring the local store up to date like `EntryStore.sync`, downloading every planned period at once.
+
+        Every window of a period is written to the store as soon as it is downloaded, so the history is never held
+        in memory as a whole.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        changes_since = store.changes_since
+        changes = await self.get_time_entry_changes(since=changes_since) if changes_since is not None else None
+
+        async def download(replace, period_from: int, period_until: Optional[int]):
+            end_date = from_epoch(period_until) if period_until is not None else now
+            windows = self.get_time_entry_windows(start_date=from_epoch(period_from), end_date=end_date)
+            async for window_from, window_until, entries in windows:
+                # the last window of a period open until now also holds the entries started since
+                until = None if period_until is None and window_until == end_date else to_epoch(window_until)
+                replace(to_epoch(window_from), until, entries)
+
+        with store.sync_session(start, now=now, changes=changes) as replace:
+            await asyncio.gather(*(download(replace, *period) for period in store.plan_sync(start)))
+
+
+async def prefetch(token: str, store: EntryStore, start: datetime.datetime, refresh: bool = False) -> None:
+    """Download everything needed to compute a balance in one event loop, leaving it in the local caches.
+
+    Clients and projects, time entries and bank holidays are downloaded concurrently. Afterwards the balance can be
+    computed from the local caches without sending any request.
+    """
+    async def cache_catalog(toggl: AsyncTogglAPI):
+        catalog = None if refresh else load_catalog(token)
+        if catalog is None or catalog.is_stale():
+            save_catalog(token, await toggl.sync_catalog(catalog))
+
+    async with AsyncTogglAPI(api_token=token) as toggl:
+        await asyncio.gather(
+            cache_catalog(toggl),
+            toggl.sync_store(store, start=start),
+            load_bank_holidays_async(),
+        )
@@ -0,0 +1,163 @@
+import collections
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List
+
+# true while spans and counters are recorded, or passed to an observer
+enabled = False
+# true while spans and counters are recorded as trace events
+recording = False
+events: List[Dict[str, Any]] = []
+counters: Dict[str, float] = collections.defaultdict(float)
+started_at = 0.0
+_lock = threading.Lock()
+_observers: List[Any] = []
+
+
+class _NoSpan:
+    """Span returned while tracing is disabled, which does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NO_SPAN = _NoSpan()
+
+
+class Span:
+    """Timed phase, recorded as a Chrome trace "complete" event when it ends."""
+
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name: str, args: Dict[str, Any]):
+        """Create span, which starts when entered."""
+        self.name = name
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self) -> 'Span':
+        """Start timing."""
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        """Record the span, and pass it to the observers."""
+        end = time.perf_counter()
+        if recording:
+            events.append({
+                'name': self.name,
+                'cat': 'wwe',
+                'ph': 'X',
+                'ts': (self.start - started_at) * 1e6,
+                'dur': (end - self.start) * 1e6,
+                'pid': os.getpid(),
+                'tid': threading.get_ident(),
+                'args': self.args,
+            })
+        for observer in _observers:
+            observer.span(self.name, end - self.start, self.args)
+        return False
+
+
+def enable() -> None:
+    """Start recording spans and counters, discarding anything recorded before."""
+    global enabled, recording, started_at
+    events.clear()
+    counters.clear()
+    started_at = time.perf_counter()
+    enabled = recording = True
+
+
+def disable() -> None:
+    """Stop recording spans and counters."""
+    global enabled, recording
+    recording = False
+    enabled = bool(_observers)
+
+
+def add_observer(observer) -> None:
+    """Pass every finished span and counter increment to `observer`, whether they are recorded or not.
+
+    The observer has a ``span(name, seconds, args)`` and a ``count(name, value)`` method, called from any thread.
+    Nothing is kept in memory for it, so it can observe a long running process.
+    """
+    global enabled
+    _observers.append(observer)
+    enabled = True
+
+
+def remove_observer(observer) -> None:
+    """Stop passing spans and counters to `observer`."""
+    global enabled
+    _observers.remove(observer)
+    enabled = recording or bool(_observers)
+
+
+def span(name: str, **args):
+    """Return a context manager timing the phase `name`.
+
+    Use it as ``with trace.span('sync'):``. While tracing is disabled this returns a shared object which does
+    nothing, so spans can stay in hot code.
+    """
+    if not enabled:
+        return NO_SPAN
+    return Span(name, args)
+
+
+def count(name: str, value: float = 1) -> None:
+    """Add `value` to a counter, e.g. requests sent or bytes received. Does nothing while tracing is disabled."""
+    if not enabled:
+        return
+    if recording:
+        with _lock:
+            counters[name] += value
+            total = counters[name]
+        events.append({
+            'name': name,
+            'cat': 'wwe',
+            'ph': 'C',
+            'ts': (time.perf_counter() - started_at) * 1e6,
+            'pid': os.getpid(),
+            'args': {name: total},
+        })
+    for observer in _observers:
+        observer.count(name, value)
+
+
+def summary() -> Dict[str, Any]:
+    """Return the total duration of every phase, in seconds, and the final value of every counter."""
+    phases = collections.defaultdict(float)
+    for event in list(events):
+        if event['ph'] == 'X':
+            phases[event['name']] += event['dur'] / 1e6
+    return {'phases': dict(phases), 'counters': dict(counters)}
+
+
+def write_trace(path: str) -> None:
+    """Write everything recorded so far as a Chrome trace file, which chrome://tracing or Perfetto can open.
+
+    The per-phase totals and the counters are also written under ``otherData``.
+    """
+    with open(path, 'w') as fd:
+        json.dump({'traceEvents': list(events), 'displayTimeUnit': 'ms', 'otherData': summary()}, fd)
+
+
+def count_bytes(chunks, name: str = 'bytes received'):
+    """Yield the chunks of a download, counting their size."""
+    for chunk in chunks:
+        count(name, len(chunk))
+        yield chunk
+
+
+def count_items(items, name: str):
+    """Yield the items of an iterable, counting them once it is exhausted."""
+    total = 0
+    for item in items:
+        total += 1
+        yield item
+    count(name, total)
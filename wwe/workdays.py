@@ -0,0 +1,67 @@
+import bisect
+import datetime
+from typing import Iterable, Tuple, Union
+
+HOLIDAY_DATE_FORMAT = '%Y-%m-%d'
+
+
+def weekend_days_until(ordinal: int) -> int:
+    """Return the number of Saturdays and Sundays from 0001-01-01 to the day `ordinal` (included).
+
+    Ordinal 1 (0001-01-01) is a Monday, so every block of 7 ordinals is a full week and the count has a closed form.
+    """
+    full_weeks, remainder = divmod(ordinal, 7)
+    # the remainder days are Monday, Tuesday... so only the 6th and 7th ones are weekend days
+    return 2 * full_weeks + max(0, remainder - 5)
+
+
+def count_weekend_days(start: datetime.date, end: datetime.date) -> int:
+    """Return the number of weekend days between two dates, both included."""
+    if end < start:
+        return 0
+    return weekend_days_until(end.toordinal()) - weekend_days_until(start.toordinal() - 1)
+
+
+def first_midnight_ordinal(moment: Union[datetime.date, datetime.datetime]) -> int:
+    """Return the ordinal of the first day whose midnight is not earlier than `moment`."""
+    if isinstance(moment, datetime.datetime) and moment.time() != datetime.time():
+        return moment.toordinal() + 1
+    return moment.toordinal()
+
+
+class HolidayIndex:
+    """Days off, possibly partial (e.g. half days), indexed for O(log n) range sums.
+
+    The fractions of the days are kept as prefix sums over their sorted ordinals, so the amount of days off within
+    any range costs two bisections. A day listed more than once adds up all its fractions, which is how personal,
+    company and bank holidays falling on the same day have always been counted.
+    """
+
+    def __init__(self, days: Iterable[Tuple[Union[int, str, datetime.date], float]] = ()):
+        """Index (day, fraction) pairs, where a day is an ordinal, a date or a YYYY-MM-DD string."""
+        fractions = {}
+        for day, fraction in days:
+            if isinstance(day, str):
+                day = datetime.datetime.strptime(day, HOLIDAY_DATE_FORMAT)
+            ordinal = day if isinstance(day, int) else day.toordinal()
+            fractions[ordinal] = fractions.get(ordinal, 0.0) + float(fraction)
+        self.ordinals = sorted(fractions)
+        self.prefix_sums = [0.0]
+        for ordinal in self.ordinals:
+            self.prefix_sums.append(self.prefix_sums[-1] + fractions[ordinal])
+
+    def __len__(self) -> int:
+        """Return the number of distinct days off."""
+        return len(self.ordinals)
+
+    def amount_until(self, ordinal: int) -> float:
+        """Return the amount of days off up to the day `ordinal` (included)."""
+        return self.prefix_sums[bisect.bisect_right(self.ordinals, ordinal)]
+
+    def between(self, start: Union[datetime.date, datetime.datetime],
+                end: Union[datetime.date, datetime.datetime]) -> float:
+        """Return the amount of days off whose midnight falls within [start, end]."""
+        first, last = first_midnight_ordinal(start), end.toordinal()
+        if last < first:
+            return 0.0
+        return self.amount_until(last) - self.amount_until(first - 1)